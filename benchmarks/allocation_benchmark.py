@@ -0,0 +1,92 @@
+"""
+Micro-benchmark of the allocation policies in `logic.allocation_policies`.
+
+For every policy and fleet size it times one `allocate` call on random requests that
+exceed the available energy by `--demand-ratio`, and reports how many of the cars that
+could finish in this tick (their remaining energy fits in their request) actually get
+their full request.
+
+Usage (from the repository root):
+    python -m benchmarks.allocation_benchmark --cars 100 1000 10000 100000
+"""
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from logic.allocation_policies import POLICIES, ChargingState, get_policy
+
+STEP_NS = 15 * 60 * 10 ** 9
+
+
+def make_state(n_cars: int, rng: np.random.Generator) -> tuple:
+    """Random requests and charge state of `n_cars` cars on 11 kW chargers, a quarter of them almost done."""
+    max_charging_kwh = np.full(n_cars, 11 * 0.25)
+    remaining_kwh = np.where(rng.random(n_cars) < 0.25, rng.uniform(0.1, 2.75, n_cars), rng.uniform(2.75, 60, n_cars))
+    requested_kwh = np.minimum(remaining_kwh, max_charging_kwh)
+    state = ChargingState(car_id=np.array([f"CAR-{i}" for i in range(n_cars)], dtype=object),
+                          end_ns=rng.integers(1, 40, n_cars) * STEP_NS,
+                          remaining_kwh=remaining_kwh,
+                          max_charging_kwh=max_charging_kwh,
+                          current_ns=0,
+                          step_ns=STEP_NS)
+    return requested_kwh, state
+
+
+def run_case(policy_name: str,
+             n_cars: int,
+             demand_ratio: float,
+             repeats: int,
+             seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    requested_kwh, state = make_state(n_cars, rng)
+    available_energy_kwh = requested_kwh.sum() / demand_ratio
+    kwargs = {}
+    if policy_name == "priority":
+        # One car in ten in a higher tier
+        kwargs["priorities"] = dict.fromkeys(state.car_id[::10].tolist(), 1)
+    policy = get_policy(policy_name, **kwargs)
+
+    out = np.empty(n_cars)
+    policy.allocate(requested_kwh, available_energy_kwh, state, out)  # warm-up
+    timings = []
+    for _ in range(repeats):
+        started = perf_counter()
+        policy.allocate(requested_kwh, available_energy_kwh, state, out)
+        timings.append(perf_counter() - started)
+
+    can_finish = state.remaining_kwh <= requested_kwh
+    return {
+        "policy": policy_name,
+        "cars": n_cars,
+        "median_us": float(np.median(timings) * 1e6),
+        "us_per_car": float(np.median(timings) * 1e6 / n_cars),
+        "finished_share": float(np.isclose(out[can_finish], requested_kwh[can_finish]).mean()),
+        "allocated_share": float(out.sum() / available_energy_kwh),
+    }
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cars", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--policies", nargs="+", choices=list(POLICIES), default=list(POLICIES))
+    parser.add_argument("--demand-ratio", type=float, default=2.0, help="Requested energy over available energy.")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    for n_cars in args.cars:
+        for policy_name in args.policies:
+            result = run_case(policy_name, n_cars, args.demand_ratio, args.repeats, args.seed)
+            print(f"cars={n_cars:>7} policy={policy_name:<13} median={result['median_us']:>10.1f}us "
+                  f"per car={result['us_per_car']:>7.3f}us finished={result['finished_share']:>6.1%} "
+                  f"allocated={result['allocated_share']:>6.1%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
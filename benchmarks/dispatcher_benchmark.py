@@ -0,0 +1,249 @@
+"""
+End-to-end benchmark of `Dispatcher.run` on dummy data.
+
+Sweeps fleet size, horizon length, timestep and run mode, and reports per case the wall
+time, ticks per second, peak RSS and the time spent in each simulator component. Results
+are written as JSON and compared against the stored baseline in `baseline.json`, which
+was recorded with the default sweep; refresh it with `--save-baseline` after an intended
+change or on other hardware.
+
+Usage (from the repository root):
+    python -m benchmarks.dispatcher_benchmark --cars 10 100 1000 --days 7 30
+    python -m benchmarks.dispatcher_benchmark --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from itertools import product
+from multiprocessing import get_context
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from logic.dispatcher import Dispatcher
+from logic.simulation import build_dispatcher, session_period
+from data.energy_forecast_reader import EnergyForecastReader
+from data.session_reader import SessionReader
+from data.meter_value_reader import MeterValueReader
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "results.json")
+START_DT_UTC = datetime(2024, 1, 1, tzinfo=timezone.utc)
+METER_RESOLUTION = timedelta(minutes=15)
+
+
+class UncontrolledOptimizer:
+    """Reference policy: every car asks for its full remaining energy until its session ends."""
+    def optimize_sessions(self,
+                          current_time: datetime,
+                          charging_cars: pd.DataFrame
+                          ) -> pd.DataFrame:
+        return pd.DataFrame({
+            "car_id": charging_cars["car_id"],
+            "energy_kwh": charging_cars["target_energy_kwh"] - charging_cars["charged_energy_kwh"],
+            "end_dt_utc": charging_cars["end_dt_utc"],
+        })
+
+
+OPTIMIZERS = ("uncontrolled", "lp")
+
+
+class ComponentTimer:
+    """Accumulates wall time and call counts of wrapped instance methods per component."""
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.calls = Counter()
+
+    def wrap(self, obj: object, method_name: str, component: str):
+        method = getattr(obj, method_name)
+
+        def timed(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.seconds[component] += perf_counter() - started
+                self.calls[component] += 1
+
+        setattr(obj, method_name, timed)
+
+    def report(self) -> dict:
+        return {component: {"seconds": round(self.seconds[component], 6), "calls": self.calls[component]}
+                for component in sorted(self.seconds)}
+
+
+def run_case(cars: int,
+             days: int,
+             timestep_minutes: int,
+             mode: str,
+             optimizer: str = "lp",
+             sessions_per_car_per_day: float = 0.5,
+             seed: int = 0) -> dict:
+    """Builds the dummy inputs for one case, runs the dispatcher and returns its measurements."""
+    os.environ["USE_DUMMY_DATA"] = "true"
+    os.environ["DEBUG_MODE"] = "false"
+    rng = np.random.default_rng(seed)
+    timestep = timedelta(minutes=timestep_minutes)
+    end_dt_utc = START_DT_UTC + timedelta(days=days)
+
+    setup_started = perf_counter()
+    sessions = SessionReader(None,
+                             number_of_sessions=max(1, int(cars * days * sessions_per_car_per_day)),
+                             number_of_unique_cars=cars,
+                             rng=rng).read(start_dt_utc=START_DT_UTC, end_dt_utc=end_dt_utc)
+    energy_forecast = EnergyForecastReader(None, rng=rng).read(start_dt_utc=START_DT_UTC,
+                                                                end_dt_utc=end_dt_utc + timedelta(days=1))
+    meter_values = MeterValueReader(None, rng=rng).read(energy_forecast=energy_forecast)
+
+    dispatcher = build_dispatcher(sessions, meter_values, energy_forecast, timestep,
+                                  optimizer=UncontrolledOptimizer() if optimizer == "uncontrolled" else None)
+    trigger_checker, charging_hub = dispatcher.trigger_checker, dispatcher.charging_hub
+    smart_meter, charging_logger = charging_hub.smart_meter, dispatcher.charging_logger
+    setup_seconds = perf_counter() - setup_started
+
+    timer = ComponentTimer()
+    timer.wrap(trigger_checker, "is_triggered", "TriggerChecker.is_triggered")
+    timer.wrap(charging_hub, "get_charging_cars", "ChargingHub.get_charging_cars")
+    timer.wrap(charging_hub, "charge", "ChargingHub.charge")
+    timer.wrap(charging_hub, "charge_block", "ChargingHub.charge_block")
+    timer.wrap(smart_meter, "get_range", "SmartMeter.get_range")
+    timer.wrap(dispatcher.optimizer, "optimize_sessions", "Optimizer.optimize_sessions")
+    for method_name in ("log", "log_block", "flush"):
+        timer.wrap(charging_logger, method_name, "ChargingLogger")
+
+    start_time, end_time = session_period(sessions, timestep)
+    ticks = int((end_time - start_time) / timestep) + 1
+
+    run_started = perf_counter()
+    dispatcher.run(start_time, end_time, timestep, mode=mode)
+    wall_seconds = perf_counter() - run_started
+
+    return {
+        "cars": cars,
+        "days": days,
+        "timestep_minutes": timestep_minutes,
+        "mode": mode,
+        "optimizer": optimizer,
+        "sessions": len(sessions),
+        "ticks": ticks,
+        "setup_seconds": round(setup_seconds, 6),
+        "wall_seconds": round(wall_seconds, 6),
+        "ticks_per_second": round(ticks / wall_seconds, 2) if wall_seconds > 0 else None,
+        "peak_rss_mb": round(peak_rss_mb(), 2),
+        "log_rows": len(charging_logger),
+        "components": timer.report(),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the current process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB on Linux
+
+
+def case_key(case: dict) -> tuple:
+    return case["cars"], case["days"], case["timestep_minutes"], case["mode"], case["optimizer"]
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Returns a line per case that is slower than the baseline by more than `tolerance`."""
+    baseline_cases = {case_key(case): case for case in baseline["cases"]}
+    regressions = []
+    for case in results["cases"]:
+        reference = baseline_cases.get(case_key(case))
+        if reference is None:
+            continue
+        ratio = case["wall_seconds"] / reference["wall_seconds"] if reference["wall_seconds"] else float("inf")
+        case["baseline_wall_seconds"] = reference["wall_seconds"]
+        case["wall_time_ratio"] = round(ratio, 3)
+        if ratio > 1 + tolerance:
+            regressions.append(f"{case_key(case)}: {case['wall_seconds']:.3f}s vs baseline "
+                               f"{reference['wall_seconds']:.3f}s ({ratio:.2f}x)")
+    return regressions
+
+
+def run_benchmarks(cars: list,
+                   days: list,
+                   timestep_minutes: list,
+                   modes: list,
+                   optimizer: str = "lp",
+                   seed: int = 0,
+                   in_process: bool = False) -> dict:
+    """Runs every combination of the sweep. Each case gets a fresh process so peak RSS is per case."""
+    cases = []
+    for n_cars, n_days, minutes, mode in product(cars, days, timestep_minutes, modes):
+        if timedelta(minutes=minutes) % METER_RESOLUTION:
+            raise ValueError(f"Error: timestep of {minutes} minutes is not a multiple of the meter resolution.")
+        kwargs = dict(cars=n_cars, days=n_days, timestep_minutes=minutes, mode=mode, optimizer=optimizer, seed=seed)
+        if in_process:
+            case = run_case(**kwargs)
+        else:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                case = executor.submit(run_case, **kwargs).result()
+        print(f"cars={n_cars:>6} days={n_days:>4} step={minutes:>3}min mode={mode:<5} "
+              f"wall={case['wall_seconds']:8.3f}s ticks/s={case['ticks_per_second']:>10} "
+              f"rss={case['peak_rss_mb']:8.1f}MB")
+        cases.append(case)
+
+    return {
+        "created_at_utc": datetime.now(timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+        },
+        "cases": cases,
+    }
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cars", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--days", type=int, nargs="+", default=[7, 30])
+    parser.add_argument("--timestep-minutes", type=int, nargs="+", default=[15, 60])
+    parser.add_argument("--modes", nargs="+", choices=Dispatcher.RUN_MODES, default=list(Dispatcher.RUN_MODES))
+    parser.add_argument("--optimizer", choices=OPTIMIZERS, default="lp",
+                        help="'lp' runs the Optimizer, 'uncontrolled' skips the LP to time the rest of the loop.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a case counts as a regression.")
+    parser.add_argument("--in-process", action="store_true", help="Run all cases in this process (peak RSS is then cumulative).")
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.cars, args.days, args.timestep_minutes, args.modes,
+                             optimizer=args.optimizer, seed=args.seed, in_process=args.in_process)
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+    else:
+        print(f"No baseline found at {args.baseline}; run with --save-baseline to create one.")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
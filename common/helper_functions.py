@@ -1,8 +1,39 @@
 import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+UTC_NS = pd.DatetimeTZDtype(unit="ns", tz="UTC")
 
 def run_local() -> str:
     """Detects if the environment is local or running on a cloud platform."""
     if os.getenv("GOOGLE_CLOUD_PROJECT") or os.path.exists("/etc/google-cloud-ops-agent"):
         return False
     else:
-        return True
\ No newline at end of file
+        return True
+
+
+def to_utc_ns(dt: datetime) -> int:
+    """Converts a datetime to epoch nanoseconds in UTC. Naive datetimes are taken as UTC."""
+    ts = pd.Timestamp(dt)
+    if ts.tz is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.value)
+
+
+def series_to_utc_ns(values) -> np.ndarray:
+    """Converts a datetime Series (or array-like) to an int64 array of epoch nanoseconds in UTC."""
+    if isinstance(values, pd.Series) and values.dtype == UTC_NS:
+        # Already stored as UTC epoch nanoseconds (see common/schemas.py): a zero-copy view
+        return values.array.asi8
+    series = pd.to_datetime(pd.Series(values))
+    if series.dt.tz is None:
+        series = series.dt.tz_localize("UTC")
+    series = series.dt.tz_convert("UTC").dt.tz_localize(None)
+    return series.to_numpy(dtype="datetime64[ns]").view("int64")
+
+
+def ns_to_utc_timestamp(ns: int) -> pd.Timestamp:
+    """Converts epoch nanoseconds back to a tz-aware UTC timestamp."""
+    return pd.Timestamp(int(ns), tz="UTC")
@@ -1,26 +1,77 @@
+import numpy as np
+import pandas as pd
+
+# Datetimes are int64 epoch nanoseconds in UTC underneath, see `series_to_utc_ns`
+from common.helper_functions import UTC_NS
 
 session = {
-    "car_id": "string",
-    "session_id": "string",
-    "start_dt_utc": "datetime64[ns]",
-    "end_dt_utc": "datetime64[ns]",
-    "charging_speed_kw": "float64",
-    "charged_energy_kwh": "float64",
-    "target_energy_kwh": "float64",
+    "car_id": "category",
+    "session_id": "int64",  # integer-coded, unique per row
+    "start_dt_utc": UTC_NS,
+    "end_dt_utc": UTC_NS,
+    "charging_speed_kw": "float32",
+    "charged_energy_kwh": "float64",  # accumulated while charging
+    "target_energy_kwh": "float32",
     }
 
-meter_value = {'start_dt_utc': "datetime64[ns]",
-               'end_dt_utc': "datetime64[ns]",
-               'meter_energy_kwh': "float64"
+meter_value = {'start_dt_utc': UTC_NS,
+               'end_dt_utc': UTC_NS,
+               'energy_kwh': "float32"
                }
 
-energy_forecast = {'start_dt_utc': "datetime64[ns]",
-                   'end_dt_utc': "datetime64[ns]",
-                   'forecasted_energy_kwh': "float64"
+energy_forecast = {'start_dt_utc': UTC_NS,
+                   'end_dt_utc': UTC_NS,
+                   'energy_kwh': "float32"
                    }
 signal = {
-    "car_id": "string",
-    'start_dt_utc': "datetime64[ns]",
-    'end_dt_utc': "datetime64[ns]",
-    'signal_energy_kwh': "float64"
-    }
\ No newline at end of file
+    "car_id": "category",
+    'start_dt_utc': UTC_NS,
+    'end_dt_utc': UTC_NS,
+    'energy_kwh': "float64"
+    }
+
+
+def apply_schema(frame: pd.DataFrame, schema: dict, name: str) -> pd.DataFrame:
+    """
+    Casts the columns of `frame` to `schema` and checks them, column by column.
+
+    Naive datetimes are taken as UTC and integer datetimes as epoch nanoseconds. Raises a
+    ValueError on missing columns, missing values, or rows that end before they start.
+    Columns outside the schema are kept as they are. A frame without columns (no data)
+    is returned unchanged.
+    """
+    if frame.columns.empty:
+        return frame
+    missing = [column for column in schema if column not in frame.columns]
+    if missing:
+        raise ValueError(f"Error: {name} data is missing the columns {missing}.")
+
+    columns = {}
+    for column, dtype in schema.items():
+        values = frame[column]
+        if values.dtype == dtype:
+            columns[column] = values
+        elif dtype == UTC_NS:
+            columns[column] = _to_utc_ns(values)
+        else:
+            columns[column] = values.astype(dtype)
+
+        n_missing = int(columns[column].isna().sum())
+        if n_missing:
+            raise ValueError(f"Error: {name} column '{column}' has {n_missing} missing values.")
+
+    if "start_dt_utc" in columns and "end_dt_utc" in columns:
+        n_reversed = int((columns["end_dt_utc"].array.asi8 < columns["start_dt_utc"].array.asi8).sum())
+        if n_reversed:
+            raise ValueError(f"Error: {name} data has {n_reversed} rows with end_dt_utc before start_dt_utc.")
+
+    return frame.assign(**columns)
+
+
+def _to_utc_ns(values: pd.Series) -> pd.Series:
+    if pd.api.types.is_integer_dtype(values):
+        return pd.Series(pd.to_datetime(values.to_numpy(dtype=np.int64), unit="ns", utc=True), index=values.index)
+    values = pd.to_datetime(values)
+    if values.dt.tz is None:
+        values = values.dt.tz_localize("UTC")
+    return values.dt.tz_convert("UTC").dt.as_unit("ns")
@@ -1,17 +1,91 @@
 from abc import ABC, abstractmethod
 import os
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Iterator
 import pandas as pd
 
+from data.db_connector import DBConnector
+
 
 class DataReader(ABC):
+    TABLE = None
+
     def __init__(self,
                  db_connector: object):
         self.db_connector = db_connector
-        
+
     @abstractmethod
     def _generate_dummy_data(self,
                                  start_dt_utc: datetime,
                                  end_dt_utc: datetime):
         pass
 
+    def _read_from_db(self,
+                      start_dt_utc: datetime = None,
+                      end_dt_utc: datetime = None) -> pd.DataFrame:
+        """Reads the reader's table for the time range; empty without a `DBConnector`."""
+        if not isinstance(self.db_connector, DBConnector) or self.TABLE is None:
+            return pd.DataFrame()
+        return self.db_connector.read_range(self.TABLE, start_dt_utc, end_dt_utc)
+
+    def iter_windows(self,
+                     start_dt_utc: datetime,
+                     end_dt_utc: datetime,
+                     window: timedelta,
+                     prefetch: int = 1,
+                     **kwargs) -> Iterator[pd.DataFrame]:
+        """
+        Yields the data as time-ordered chunks, one per window of `window` length from
+        `start_dt_utc` up to `end_dt_utc`. A row belongs to the window its `start_dt_utc`
+        falls in.
+
+        The next `prefetch` windows are read in a background thread while the caller works
+        on the current one, so only those windows are held in memory. Extra keyword
+        arguments are passed on to the reader's `_read_window`.
+        """
+        if window <= timedelta(0):
+            raise ValueError(f"Error: window ({window}) must be positive.")
+        windows = self._iter_windows(start_dt_utc, end_dt_utc, window, **kwargs)
+        if prefetch <= 0:
+            yield from windows
+            return
+
+        done = object()
+        # A single worker advances the generator, so reads never run concurrently
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            pending = deque(executor.submit(next, windows, done) for _ in range(prefetch))
+            try:
+                while True:
+                    chunk = pending.popleft().result()
+                    if chunk is done:
+                        return
+                    pending.append(executor.submit(next, windows, done))
+                    yield chunk
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _iter_windows(self,
+                      start_dt_utc: datetime,
+                      end_dt_utc: datetime,
+                      window: timedelta,
+                      **kwargs) -> Iterator[pd.DataFrame]:
+        window_start = pd.Timestamp(start_dt_utc)
+        end_dt_utc = pd.Timestamp(end_dt_utc)
+        while window_start < end_dt_utc:
+            window_end = min(window_start + window, end_dt_utc)
+            yield self._read_window(window_start, window_end, **kwargs)
+            window_start = window_end
+
+    def _read_window(self,
+                     start_dt_utc: datetime,
+                     end_dt_utc: datetime,
+                     **kwargs) -> pd.DataFrame:
+        """Reads the rows that start within [start_dt_utc, end_dt_utc)."""
+        data = self.read(start_dt_utc=start_dt_utc, end_dt_utc=end_dt_utc, **kwargs)
+        if data.empty:
+            return data
+        in_window = (data["start_dt_utc"] >= start_dt_utc) & (data["start_dt_utc"] < end_dt_utc)
+        return data[in_window].reset_index(drop=True)
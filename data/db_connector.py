@@ -0,0 +1,173 @@
+import os
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from common.helper_functions import to_utc_ns, series_to_utc_ns
+
+
+class DBConnector(ABC):
+    """
+    Database access shared by all readers.
+
+    Tables hold one row per record with datetimes stored as int64 epoch nanoseconds in
+    UTC; by convention those columns end in `_dt_utc` and are converted back to tz-aware
+    datetimes when read. Queries return whole NumPy columns instead of row objects.
+    Connectors set `url`, which identifies the database they read from.
+    """
+    url = None
+
+    @abstractmethod
+    def query_columns(self, sql: str, params: tuple = ()) -> dict:
+        """Runs a query and returns its result as {column name: np.ndarray}."""
+
+    @abstractmethod
+    def write_frame(self, table: str, frame: pd.DataFrame, replace: bool = False):
+        """Appends a frame to a table, creating the table when it does not exist."""
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def from_url(url: str) -> "DBConnector":
+        """Creates a connector from a url: `sqlite:///relative.sqlite`, `sqlite:////absolute.sqlite` or `sqlite:///:memory:`."""
+        scheme, _, location = url.partition("://")
+        if scheme == "sqlite":
+            return SQLiteConnector(location[1:] if location.startswith("/") else location)
+        raise ValueError(f"Error: unsupported database url scheme '{scheme}'.")
+
+    def read_range(self,
+                   table: str,
+                   start_dt_utc: datetime = None,
+                   end_dt_utc: datetime = None,
+                   columns: list = None,
+                   time_column: str = "start_dt_utc") -> pd.DataFrame:
+        """Reads the rows with `time_column` in [start_dt_utc, end_dt_utc), ordered by it."""
+        conditions, params = [], []
+        if start_dt_utc is not None:
+            conditions.append(f'"{time_column}" >= ?')
+            params.append(to_utc_ns(start_dt_utc))
+        if end_dt_utc is not None:
+            conditions.append(f'"{time_column}" < ?')
+            params.append(to_utc_ns(end_dt_utc))
+        selected = ", ".join(f'"{column}"' for column in columns) if columns else "*"
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        result = self.query_columns(f'SELECT {selected} FROM "{table}"{where} ORDER BY "{time_column}"', tuple(params))
+        return self.to_frame(result)
+
+    def query_arrow(self, sql: str, params: tuple = ()):
+        """Runs a query and returns its result as a `pyarrow.Table`."""
+        import pyarrow as pa
+        return pa.table(self.query_columns(sql, params))
+
+    @staticmethod
+    def to_frame(columns: dict) -> pd.DataFrame:
+        return pd.DataFrame({name: pd.to_datetime(values, utc=True) if name.endswith("_dt_utc") else values
+                             for name, values in columns.items()})
+
+
+class SQLiteConnector(DBConnector):
+    """
+    SQLite backend with a pool of connections, usable from several threads at once.
+
+    Parameters:
+        path (str): Database file, or ":memory:" for a shared in-memory database.
+        pool_size (int): Number of pooled connections.
+        timeout (float): Seconds to wait for a free connection or a database lock.
+    """
+    def __init__(self,
+                 path: str,
+                 pool_size: int = 4,
+                 timeout: float = 30):
+        if path == ":memory:":
+            # Named shared cache, so every pooled connection sees the same in-memory database
+            path, uri = f"file:memdb_{id(self)}?mode=memory&cache=shared", True
+        else:
+            uri = False
+        self.path = path
+        self.url = f"sqlite:///{path if uri else os.path.abspath(path)}"
+        self.timeout = timeout
+        self._pool = queue.Queue(maxsize=pool_size)
+        for _ in range(pool_size):
+            connection = sqlite3.connect(path, uri=uri, timeout=timeout, check_same_thread=False)
+            self._pool.put(connection)
+        self._write_lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection from the pool."""
+        try:
+            connection = self._pool.get(timeout=self.timeout)
+        except queue.Empty as e:
+            raise TimeoutError(f"Error: no database connection available within {self.timeout} seconds.") from e
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    def query_columns(self, sql: str, params: tuple = ()) -> dict:
+        with self.connection() as connection:
+            cursor = connection.execute(sql, params)
+            names = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        values = list(zip(*rows)) if rows else [()] * len(names)
+        return {name: self._to_array(column) for name, column in zip(names, values)}
+
+    def write_frame(self, table: str, frame: pd.DataFrame, replace: bool = False):
+        columns, types = [], []
+        for name in frame.columns:
+            values = frame[name]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                columns.append(series_to_utc_ns(values).tolist())
+                types.append("INTEGER")
+            elif pd.api.types.is_integer_dtype(values) or pd.api.types.is_bool_dtype(values):
+                columns.append(values.astype("int64").tolist())
+                types.append("INTEGER")
+            elif pd.api.types.is_float_dtype(values):
+                columns.append(values.astype("float64").tolist())
+                types.append("REAL")
+            else:
+                columns.append(values.astype(str).tolist())
+                types.append("TEXT")
+
+        definition = ", ".join(f'"{name}" {sql_type}' for name, sql_type in zip(frame.columns, types))
+        placeholders = ", ".join("?" for _ in frame.columns)
+        with self._write_lock, self.connection() as connection, connection:
+            if replace:
+                connection.execute(f'DROP TABLE IF EXISTS "{table}"')
+            connection.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({definition})')
+            if "start_dt_utc" in frame.columns:
+                connection.execute(f'CREATE INDEX IF NOT EXISTS "{table}_start_dt_utc" ON "{table}" ("start_dt_utc")')
+            connection.executemany(f'INSERT INTO "{table}" VALUES ({placeholders})', zip(*columns))
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+    @staticmethod
+    def _to_array(column: tuple) -> np.ndarray:
+        if column and isinstance(column[0], str):
+            return np.array(column, dtype=object)
+        if column and isinstance(column[0], int) and all(value is not None for value in column):
+            return np.array(column, dtype=np.int64)
+        return np.array(column, dtype=np.float64) if column else np.empty(0)
+
+
+def read_concurrently(reads: dict, max_workers: int = None) -> dict:
+    """
+    Runs independent reads in a thread pool and returns their results by name.
+
+    Parameters:
+        reads (dict): {name: callable without arguments}, for example
+            `{"sessions": session_reader.read, "energy_forecast": energy_forecast_reader.read}`.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers or len(reads) or 1) as executor:
+        futures = {name: executor.submit(read) for name, read in reads.items()}
+        return {name: future.result() for name, future in futures.items()}
@@ -4,6 +4,7 @@ import os
 from datetime import datetime, timedelta, timezone
 
 from data.data_reader import DataReader
+from common import schemas
 
 class EnergyForecastReader(DataReader):
     """
@@ -56,7 +57,9 @@ class EnergyForecastReader(DataReader):
         }
     }
 
-    def __init__(self, db_connector, config=None):
+    TABLE = "energy_forecasts"
+
+    def __init__(self, db_connector, config=None, rng: np.random.Generator = None):
         """
         Initializes the EnergyForecastReader with optional custom configuration.
         
@@ -64,9 +67,13 @@ class EnergyForecastReader(DataReader):
             db_connector: The database connection object.
             config (dict, optional): Custom configuration for the solar and consumption profiles.
                 If not provided, defaults are used.
+            rng (np.random.Generator, optional): Random generator for the dummy data. Pass a
+                seeded generator (e.g. `np.random.default_rng(42)`) for reproducible runs.
         """
         super().__init__(db_connector)
         self.config = config or self.DEFAULT_PARAMS
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.seeded = rng is not None
 
     def read(self, 
              path: str = None, 
@@ -77,7 +84,8 @@ class EnergyForecastReader(DataReader):
         if os.getenv("USE_DUMMY_DATA", "False").lower() == "true":
             energy_forecast = self._generate_dummy_data(start_dt_utc, end_dt_utc)
         else:
-            energy_forecast = pd.DataFrame()
+            energy_forecast = self._read_from_db(start_dt_utc, end_dt_utc)
+        energy_forecast = schemas.apply_schema(energy_forecast, schemas.energy_forecast, "energy forecast")
 
         if os.getenv("DEBUG_MODE", "False").lower() == "true":
             print("Energy forecast data:")
@@ -112,13 +120,14 @@ class EnergyForecastReader(DataReader):
         start_dt_range = pd.date_range(start=start_dt_utc, end=end_dt_utc, freq='15min')
         end_dt_range = start_dt_range + timedelta(minutes=15)
 
-        energy_kwh = [(self._solar_production(dt) - self._office_consumption(dt)) for dt in start_dt_range]
+        hour = start_dt_range.hour.to_numpy() + start_dt_range.minute.to_numpy() / 60
+        energy_kwh = self._solar_production(hour) - self._office_consumption(hour)
 
         return pd.DataFrame({'start_dt_utc': start_dt_range,
                               'end_dt_utc': end_dt_range,
                               'energy_kwh': energy_kwh})
 
-    def _solar_production(self, dt: datetime) -> float:
+    def _solar_production(self, hour: np.ndarray) -> np.ndarray:
         """
         Generates a smooth Gaussian-based solar production curve.
 
@@ -132,8 +141,11 @@ class EnergyForecastReader(DataReader):
             - sunset (int): Hour of the day when solar production stops.
             - peak_hour (int): Hour of the day when solar production is at its highest.
 
+        Parameters:
+            hour (np.ndarray): Hour of day as a float (e.g. 13.25 for 13:15).
+
         Returns:
-            float: Solar energy production in kWh.
+            np.ndarray: Solar energy production in kWh.
         """
         P_max = self.config['P_max']
         sigma = self.config['sigma']
@@ -141,19 +153,14 @@ class EnergyForecastReader(DataReader):
         sunset = self.config['sunset']
         peak_hour = self.config['peak_hour']
 
-        # Convert to hour of day as a float
-        hour = dt.hour + dt.minute / 60
-
-        # No production before sunrise or after sunset
-        if hour < sunrise or hour > sunset:
-            return 0
-
         # Gaussian curve centered at peak_hour
         production = P_max * np.exp(-((hour - peak_hour) ** 2) / (2 * sigma ** 2))
 
-        return max(0, production)  # Ensure no negative values
+        # No production before sunrise or after sunset
+        daylight = (hour >= sunrise) & (hour <= sunset)
+        return np.where(daylight, np.maximum(production, 0), 0.0)  # Ensure no negative values
 
-    def _office_consumption(self, dt: datetime) -> float:
+    def _office_consumption(self, hour: np.ndarray) -> np.ndarray:
         """
         Calculates office consumption based on time of day.
 
@@ -164,15 +171,21 @@ class EnergyForecastReader(DataReader):
                 - day (tuple): Energy consumption during the peak daytime hours.
                 - evening (tuple): Energy consumption during the evening decline.
 
+        Parameters:
+            hour (np.ndarray): Hour of day as a float (e.g. 13.25 for 13:15).
+
         Returns:
-            float: Randomized energy consumption within the given time-of-day range.
+            np.ndarray: Randomized energy consumption within the time-of-day range.
         """
         consumption = self.config['consumption']
-        if dt.hour < 6 or dt.hour > 20:
-            return np.random.uniform(*consumption['night'])
-        elif 6 <= dt.hour < 9:
-            return np.random.uniform(*consumption['morning'])
-        elif 9 <= dt.hour < 17:
-            return np.random.uniform(*consumption['day'])
-        elif 17 <= dt.hour <= 20:
-            return np.random.uniform(*consumption['evening'])
+        whole_hour = np.floor(hour)
+        bands = [
+            (whole_hour < 6) | (whole_hour > 20),
+            (whole_hour >= 6) & (whole_hour < 9),
+            (whole_hour >= 9) & (whole_hour < 17),
+            (whole_hour >= 17) & (whole_hour <= 20),
+        ]
+        profiles = [consumption['night'], consumption['morning'], consumption['day'], consumption['evening']]
+        low = np.select(bands, [profile[0] for profile in profiles])
+        high = np.select(bands, [profile[1] for profile in profiles])
+        return self.rng.uniform(low, high)
@@ -4,10 +4,15 @@ import os
 from datetime import datetime, timedelta, timezone
 from data.data_reader import DataReader
 from data.energy_forecast_reader import EnergyForecastReader
+from common import schemas
 
 class MeterValueReader(DataReader):
-    def __init__(self, db_connector: object):
+    TABLE = "meter_values"
+
+    def __init__(self, db_connector: object, rng: np.random.Generator = None):
         super().__init__(db_connector)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.seeded = rng is not None
 
     def read(self, 
              path: str = None,
@@ -17,9 +22,14 @@ class MeterValueReader(DataReader):
              ) -> pd.DataFrame:
         """Reads the energy data, either from a database or generates dummy data."""
         if os.getenv("USE_DUMMY_DATA", "False").lower() == "true":
+            if energy_forecast is None:
+                # Dummy values deviate from a forecast, so generate one for the same range
+                energy_forecast = EnergyForecastReader(self.db_connector, rng=self.rng).read(
+                    start_dt_utc=start_dt_utc, end_dt_utc=end_dt_utc)
             meter_values = self._generate_dummy_data(energy_forecast)
         else:
-            meter_values = pd.DataFrame()
+            meter_values = self._read_from_db(start_dt_utc, end_dt_utc)
+        meter_values = schemas.apply_schema(meter_values, schemas.meter_value, "meter value")
         if os.getenv("DEBUG_MODE", "False").lower() == "true":
             print("Metervalue data:")
             print(f"Start datetime (UTC): {meter_values['start_dt_utc'].min()}")
@@ -31,26 +41,36 @@ class MeterValueReader(DataReader):
         """Generate meter values as deviations of forecast data."""
         
         meter_values = energy_forecast.copy()
-        
-        # Apply deviations while passing the timestamp
-        meter_values['energy_kwh'] = meter_values.apply(
-            lambda row: self._apply_deviations(row['energy_kwh'], row['start_dt_utc']), axis=1
-        )
+        meter_values['energy_kwh'] = self._apply_deviations(meter_values['energy_kwh'].to_numpy(dtype="float64"),
+                                                            meter_values['start_dt_utc'].dt.hour.to_numpy())
 
         return meter_values
 
-    def _apply_deviations(self, energy_kwh: float, timestamp: datetime) -> float:
+    def _read_window(self,
+                     start_dt_utc: datetime,
+                     end_dt_utc: datetime,
+                     energy_forecast: pd.DataFrame = None,
+                     energy_forecast_reader: EnergyForecastReader = None
+                     ) -> pd.DataFrame:
+        """
+        Reads the meter values of one window. Dummy values are derived from the forecast of
+        the same window, read with `energy_forecast_reader`, sliced from `energy_forecast`
+        or, without either, generated with this reader's generator.
+        """
+        if energy_forecast_reader is not None:
+            energy_forecast = energy_forecast_reader._read_window(start_dt_utc, end_dt_utc)
+        elif energy_forecast is not None:
+            in_window = (energy_forecast["start_dt_utc"] >= start_dt_utc) & (energy_forecast["start_dt_utc"] < end_dt_utc)
+            energy_forecast = energy_forecast[in_window]
+        return super()._read_window(start_dt_utc, end_dt_utc, energy_forecast=energy_forecast)
+
+    def _apply_deviations(self, energy_kwh: np.ndarray, hour: np.ndarray) -> np.ndarray:
         """Apply frequent small white noise variations and occasional spikes during the day."""
-        deviation = energy_kwh
-        if np.random.random() < 0.8:
-            noise = np.random.uniform(-2, 2)
-            deviation += noise    
+        n = len(energy_kwh)
+        noise = np.where(self.rng.random(n) < 0.8, self.rng.uniform(-2, 2, n), 0.0)
 
         # Apply spikes only between 06:00 and 18:00
-        if 6 <= timestamp.hour <= 18 and np.random.random() < 0.3:
-            spike = np.random.uniform(-15, 15)
-            deviation += spike
-
-        return deviation
-
+        spike_mask = (hour >= 6) & (hour <= 18) & (self.rng.random(n) < 0.3)
+        spikes = np.where(spike_mask, self.rng.uniform(-15, 15, n), 0.0)
 
+        return energy_kwh + noise + spikes
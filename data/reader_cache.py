@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from data.data_reader import DataReader
+
+
+class ReaderCache:
+    """
+    Local on-disk cache for the frames returned by `DataReader.read`.
+
+    Frames are stored as Feather (Arrow IPC, loaded memory-mapped) or Parquet files in
+    `cache_dir`. Database reads are keyed on the connector url, the reader's table and
+    the time range. Dummy reads are keyed on the reader class, its settings (such as
+    `config` and the number of sessions), the state of its generator and the read
+    arguments (time range, input frames). The generator state after a read is stored and
+    restored on a hit, so a cached run draws the same numbers afterwards as an uncached
+    one. When the cache grows beyond `max_bytes` the least recently used files are
+    evicted. Requires `pyarrow`.
+
+    Only reads with a fixed result are cached (see `cacheable`): reads without a start or
+    end default to a window around the current time or the whole table, and dummy reads
+    from a reader without an explicit `rng` are random on every run. Those go straight
+    to the reader.
+
+    Parameters:
+        cache_dir (str): Directory of the cache files, created when missing.
+        max_bytes (int): Size bound of the cache on disk.
+        cache_format (str): "feather" or "parquet".
+        enabled (bool): Without the cache every read goes straight to the reader.
+    """
+    CACHE_FORMATS = ("feather", "parquet")
+
+    def __init__(self,
+                 cache_dir: str = ".cache/readers",
+                 max_bytes: int = 2 * 1024 ** 3,
+                 cache_format: str = "feather",
+                 enabled: bool = True):
+        if cache_format not in self.CACHE_FORMATS:
+            raise ValueError(f"Error: unknown cache format '{cache_format}', expected one of {self.CACHE_FORMATS}.")
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.cache_format = cache_format
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, reader: DataReader, **kwargs) -> pd.DataFrame:
+        """Returns `reader.read(**kwargs)`, from the cache when the same read was done before."""
+        if not self.enabled or not self.cacheable(reader, **kwargs):
+            return reader.read(**kwargs)
+
+        key = self.key(reader, **kwargs)
+        data_path = os.path.join(self.cache_dir, f"{key}.{self.cache_format}")
+        meta_path = os.path.join(self.cache_dir, f"{key}.json")
+        if os.path.exists(data_path) and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            data = self._load(data_path)
+            if meta["rng_state"] is not None:
+                reader.rng.bit_generator.state = meta["rng_state"]
+            os.utime(data_path)
+            self.hits += 1
+            return data
+
+        self.misses += 1
+        data = reader.read(**kwargs)
+        if data.empty:
+            return data
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._store(data, data_path)
+        with open(meta_path, "w") as f:
+            json.dump({"reader": type(reader).__qualname__, "rng_state": self._rng_state(reader)}, f)
+        self._evict()
+        return data
+
+    @staticmethod
+    def cacheable(reader: DataReader, **kwargs) -> bool:
+        """
+        True for reads with a bounded time range, or dummy reads derived from an input
+        frame (meter values from a forecast), that are not random on every run.
+        """
+        use_dummy_data = os.getenv("USE_DUMMY_DATA", "False").lower() == "true"
+        if use_dummy_data and not getattr(reader, "seeded", False):
+            return False
+        bounded = kwargs.get("start_dt_utc") is not None and kwargs.get("end_dt_utc") is not None
+        derived = use_dummy_data and any(isinstance(value, pd.DataFrame) for value in kwargs.values())
+        return bounded or derived
+
+    def key(self, reader: DataReader, **kwargs) -> str:
+        if os.getenv("USE_DUMMY_DATA", "False").lower() == "true":
+            settings = {name: value for name, value in vars(reader).items() if name not in ("db_connector", "rng")}
+            fingerprint = {
+                "reader": f"{type(reader).__module__}.{type(reader).__qualname__}",
+                "settings": settings,
+                "rng_state": self._rng_state(reader),
+                "read": kwargs,
+            }
+        else:
+            fingerprint = {
+                "database": getattr(reader.db_connector, "url", None) or type(reader.db_connector).__name__,
+                "table": reader.TABLE,
+                "time_range": [kwargs.get("start_dt_utc"), kwargs.get("end_dt_utc")],
+            }
+        digest = hashlib.sha256(json.dumps(fingerprint, sort_keys=True, default=self._fingerprint).encode())
+        return digest.hexdigest()[:32]
+
+    def clear(self):
+        for path in self._cache_files():
+            os.remove(path)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(os.path.getsize(path) for path in self._cache_files())
+
+    @staticmethod
+    def _rng_state(reader: DataReader):
+        """State of the reader's generator for dummy reads, None for database reads."""
+        rng = getattr(reader, "rng", None)
+        if rng is None or os.getenv("USE_DUMMY_DATA", "False").lower() != "true":
+            return None
+        return rng.bit_generator.state
+
+    @staticmethod
+    def _fingerprint(value):
+        """JSON stand-in for values json cannot encode."""
+        if isinstance(value, pd.DataFrame):
+            hashed = pd.util.hash_pandas_object(value, index=True).to_numpy()
+            return {"frame": hashlib.sha256(hashed.tobytes()).hexdigest(), "columns": list(map(str, value.columns))}
+        if isinstance(value, (datetime, date, pd.Timestamp)):
+            return pd.Timestamp(value).isoformat()
+        if isinstance(value, timedelta):
+            return value.total_seconds()
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, (set, frozenset, tuple)):
+            return sorted(value) if isinstance(value, (set, frozenset)) else list(value)
+        return repr(value)
+
+    def _store(self, data: pd.DataFrame, path: str):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("Error: the reader cache requires 'pyarrow'.") from e
+
+        table = pa.Table.from_pandas(data, preserve_index=False)
+        temporary_path = f"{path}.tmp"
+        if self.cache_format == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(table, temporary_path)
+        else:
+            import pyarrow.feather as feather
+            feather.write_feather(table, temporary_path, compression="uncompressed")
+        os.replace(temporary_path, path)
+
+    def _load(self, path: str) -> pd.DataFrame:
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            return pq.read_table(path, memory_map=True).to_pandas()
+        import pyarrow.feather as feather
+        return feather.read_table(path, memory_map=True).to_pandas()
+
+    def _evict(self):
+        """Removes the least recently used entries until the cache fits in `max_bytes`."""
+        entries = sorted((os.path.getmtime(path), os.path.getsize(path), path) for path in self._cache_files()
+                         if not path.endswith(".json"))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            meta_path = os.path.splitext(path)[0] + ".json"
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+            total -= size
+
+    def _cache_files(self) -> list:
+        if not os.path.isdir(self.cache_dir):
+            return []
+        extensions = tuple(f".{extension}" for extension in (*self.CACHE_FORMATS, "json"))
+        return [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(extensions)]
@@ -1,97 +1,212 @@
-import random
+import numpy as np
 import pandas as pd
 import os
-from datetime import datetime, timezone, timedelta, date
+from datetime import datetime, timezone, timedelta
+from typing import Iterator
 
 from data.data_reader import DataReader
+from common.helper_functions import to_utc_ns
+from common import schemas
+
+NS_PER_MINUTE = 60 * 10 ** 9
+NS_PER_HOUR = 60 * NS_PER_MINUTE
+NS_PER_DAY = 24 * NS_PER_HOUR
 
 class SessionReader(DataReader):
-    def __init__(self, db_connector: object):
+    """
+    A reader class for charging sessions, either from a database or generated dummy data.
+
+    The dummy generator draws the sessions of all cars for a day at once as NumPy arrays,
+    so fleets of 100k+ cars over a year are practical. Sessions of one car never overlap.
+
+    Parameters:
+        db_connector: The database connection object.
+        number_of_sessions (int): Expected number of dummy sessions over the whole period.
+        number_of_unique_cars (int): Number of cars in the dummy fleet.
+        rng (np.random.Generator, optional): Random generator for the dummy data.
+    """
+    TABLE = "sessions"
+
+    def __init__(self,
+                 db_connector: object,
+                 number_of_sessions: int = 20,
+                 number_of_unique_cars: int = 5,
+                 rng: np.random.Generator = None):
         super().__init__(db_connector)
-
-    def read(self, 
-             path: str = None, 
-             start_dt_utc: datetime = None, 
+        self.number_of_sessions = number_of_sessions
+        self.number_of_unique_cars = number_of_unique_cars
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.seeded = rng is not None
+
+    def read(self,
+             path: str = None,
+             start_dt_utc: datetime = None,
              end_dt_utc: datetime = None
              ) -> pd.DataFrame:
         """Reads the energy data, either from a database or generates dummy data."""
         if os.getenv("USE_DUMMY_DATA", "False").lower() == "true":
             sessions = self._generate_dummy_data(start_dt_utc, end_dt_utc)
         else:
-            sessions = pd.DataFrame()
+            sessions = self._read_from_db(start_dt_utc, end_dt_utc)
+        sessions = schemas.apply_schema(sessions, schemas.session, "session")
         if os.getenv("DEBUG_MODE", "False").lower() == "true":
             print("Session data:")
             print(f"Start datetime (UTC): {sessions['start_dt_utc'].min()}")
             print(f"Last start datetime (UTC): {sessions['start_dt_utc'].max()}")
             print(f"Number of unique cars: {sessions['car_id'].nunique()}")
-            print(f"Total number of sessions: {len(sessions)}")            
-        return sessions 
-            
-
-    def _generate_dummy_data(self, 
-                            start_dt_utc: datetime = None, 
-                            end_dt_utc: datetime = None, 
-                            number_of_sessions: int = 20,
-                            number_of_unique_cars: int = 5
+            print(f"Total number of sessions: {len(sessions)}")
+        return sessions
+
+    def read_chunks(self,
+                    path: str = None,
+                    start_dt_utc: datetime = None,
+                    end_dt_utc: datetime = None,
+                    chunk_days: int = 7
+                    ) -> Iterator[pd.DataFrame]:
+        """Yields the sessions as chunks ordered by start time, each covering `chunk_days` days."""
+        if os.getenv("USE_DUMMY_DATA", "False").lower() == "true":
+            for chunk in self._generate_dummy_chunks(start_dt_utc, end_dt_utc, chunk_days=chunk_days):
+                yield schemas.apply_schema(chunk, schemas.session, "session")
+        else:
+            yield from super()._iter_windows(start_dt_utc, end_dt_utc, timedelta(days=chunk_days))
+
+    def _iter_windows(self,
+                      start_dt_utc: datetime,
+                      end_dt_utc: datetime,
+                      window: timedelta,
+                      **kwargs) -> Iterator[pd.DataFrame]:
+        """
+        Dummy sessions are generated day by day, so a dummy window must span whole days.
+        Windows without sessions yield an empty frame.
+        """
+        if os.getenv("USE_DUMMY_DATA", "False").lower() != "true":
+            yield from super()._iter_windows(start_dt_utc, end_dt_utc, window, **kwargs)
+            return
+        if window % timedelta(days=1):
+            raise ValueError(f"Error: session windows must span whole days, got {window}.")
+
+        chunks = self.read_chunks(start_dt_utc=start_dt_utc, end_dt_utc=end_dt_utc, chunk_days=window.days)
+        # Sessions pushed past the last midnight can start in a trailing partial window
+        pending = self._empty_sessions()
+        window_start = pd.Timestamp(start_dt_utc)
+        end_dt_utc = pd.Timestamp(end_dt_utc)
+        while window_start < end_dt_utc:
+            window_end = min(window_start + window, end_dt_utc)
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending = pd.concat([pending, chunk], ignore_index=True) if len(pending) else chunk
+            in_window = pending["start_dt_utc"] < window_end
+            yield pending[in_window].reset_index(drop=True)
+            pending = pending[~in_window]
+            window_start = window_end
+
+    @staticmethod
+    def _empty_sessions() -> pd.DataFrame:
+        return pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in schemas.session.items()})
+
+    def _generate_dummy_data(self,
+                            start_dt_utc: datetime = None,
+                            end_dt_utc: datetime = None,
+                            number_of_sessions: int = None,
+                            number_of_unique_cars: int = None
                             ) -> pd.DataFrame:
+        chunks = [chunk for chunk in self._generate_dummy_chunks(start_dt_utc, end_dt_utc, number_of_sessions,
+                                                                 number_of_unique_cars) if len(chunk)]
+        if not chunks:
+            return pd.DataFrame()
+        return pd.concat(chunks, ignore_index=True)
+
+    def _generate_dummy_chunks(self,
+                               start_dt_utc: datetime = None,
+                               end_dt_utc: datetime = None,
+                               number_of_sessions: int = None,
+                               number_of_unique_cars: int = None,
+                               chunk_days: int = 1
+                               ) -> Iterator[pd.DataFrame]:
+        """
+        Generates dummy sessions day by day and yields them in start-time order, one
+        (possibly empty) chunk per `chunk_days` days.
+
+        A session can be pushed past midnight when it would overlap with the previous
+        session of the same car, so sessions are only emitted once no later day can
+        produce an earlier start.
+        """
         if not start_dt_utc:
             start_dt_utc = datetime.now(timezone.utc) - timedelta(days=7)
         if not end_dt_utc:
             end_dt_utc = datetime.now(timezone.utc)
+        number_of_sessions = number_of_sessions or self.number_of_sessions
+        number_of_unique_cars = number_of_unique_cars or self.number_of_unique_cars
 
         total_days = (end_dt_utc - start_dt_utc).days
+        if total_days <= 0:
+            return
         max_sessions = min(number_of_sessions, number_of_unique_cars * total_days)
         if number_of_sessions > max_sessions:
             print(f'number of sessions higher than allowed. It is reduced to {max_sessions}')
 
         prob_of_session_per_day = (number_of_sessions / (number_of_unique_cars * total_days))
-        car_ids = [f"CAR-{i}" for i in range(1, number_of_unique_cars + 1)]
-        car_last_sessions = {}  # Track last session per car
+        start_ns = to_utc_ns(start_dt_utc)
+        end_ns = to_utc_ns(end_dt_utc)
+        car_last_end_ns = np.full(number_of_unique_cars, np.iinfo(np.int64).min, dtype=np.int64)
+        session_counter = 0
 
-        data = []
+        pending = []
         for day in range(total_days):
-            session_start_day = start_dt_utc + timedelta(days=day)
-            for car_id in car_ids:
-                if self.session_today(prob_of_session_per_day):  # Should car charge today?
-                    session_start = self._get_biased_session_start(session_start_day)
-
-                    # Ensure no overlapping sessions
-                    last_session = car_last_sessions.get(car_id)
-                    if last_session and last_session["end_dt_utc"] > session_start:
-                        session_start = last_session["end_dt_utc"] + timedelta(minutes=random.randint(15, 60))
-
-                    session_end = session_start + timedelta(hours=random.uniform(3, 8))  # Sessions last between 3-8 hours
-                    if session_end > end_dt_utc:
-                        session_end = end_dt_utc
-
-                    charged_kwh = round(random.uniform(10, 80), 2)  # Random energy charged
-
-                    session = {
-                        "car_id": car_id,
-                        "session_id": f"SESSION-{random.randint(100000, 999999)}",
-                        "start_dt_utc": session_start,
-                        "end_dt_utc": session_end,
-                        "charging_speed_kw": 11, #hardcoded, later calculated
-                        "charged_energy_kwh": 0,
-                        "target_energy_kwh": charged_kwh
-                    }
-
-                    data.append(session)
-                    car_last_sessions[car_id] = session  # Update last session per car
-
-        return pd.DataFrame(data)
-
-    def session_today(self, prob: float) -> bool:
-        """Returns True with probability `prob` (e.g., 0.2 for 20% chance)."""
-        return random.random() < prob
-
-    def _get_biased_session_start(self, start_day: date) -> datetime:
-        """Generates a session start time with 75% probability between 08:00-20:00."""
-        if random.random() < 0.75:
-            hour = random.randint(8, 19)  # 08:00-19:59 (75% chance)
-        else:
-            hour = random.choice(list(range(0, 8)) + list(range(20, 24)))  # 00:00-07:59 or 20:00-23:59 (25% chance)
-
-        return datetime.combine(start_day, datetime.min.time(), tzinfo=timezone.utc) + timedelta(
-            hours=hour, minutes=random.randint(0, 59)
-        )
+            day_ns = start_ns + day * NS_PER_DAY
+            cars = np.flatnonzero(self.rng.random(number_of_unique_cars) < prob_of_session_per_day)  # Should car charge today?
+            session_start_ns = day_ns + self._get_biased_session_start_offsets(len(cars))
+
+            # Ensure no overlapping sessions
+            overlapping = car_last_end_ns[cars] > session_start_ns
+            session_start_ns[overlapping] = (car_last_end_ns[cars][overlapping]
+                                             + self.rng.integers(15, 61, overlapping.sum()) * NS_PER_MINUTE)
+
+            duration_ns = (self.rng.uniform(3, 8, len(cars)) * NS_PER_HOUR).astype(np.int64)  # Sessions last between 3-8 hours
+            session_end_ns = np.minimum(session_start_ns + duration_ns, end_ns)
+            car_last_end_ns[cars] = session_end_ns
+            charged_kwh = np.round(self.rng.uniform(10, 80, len(cars)), 2)  # Random energy charged
+
+            keep = session_start_ns < end_ns
+            pending.append((cars[keep], session_start_ns[keep], session_end_ns[keep], charged_kwh[keep]))
+
+            if (day + 1) % chunk_days == 0 or day == total_days - 1:
+                # Later days only produce starts from the next midnight onwards
+                chunk, pending, session_counter = self._emit_chunk(pending, day_ns + NS_PER_DAY, session_counter,
+                                                                   flush=day == total_days - 1)
+                yield chunk
+
+    def _emit_chunk(self,
+                    pending: list,
+                    emit_before_ns: int,
+                    session_counter: int,
+                    flush: bool) -> tuple:
+        """Splits the pending sessions into a time-ordered chunk and the ones that start later."""
+        cars, start_ns, end_ns, target_kwh = (np.concatenate(column) for column in zip(*pending))
+        order = np.argsort(start_ns, kind="stable")
+        cars, start_ns, end_ns, target_kwh = cars[order], start_ns[order], end_ns[order], target_kwh[order]
+
+        n_emit = len(start_ns) if flush else int(np.searchsorted(start_ns, emit_before_ns, side="left"))
+        remaining = [(cars[n_emit:], start_ns[n_emit:], end_ns[n_emit:], target_kwh[n_emit:])]
+
+        session_numbers = np.arange(session_counter, session_counter + n_emit) + 1
+        chunk = pd.DataFrame({
+            "car_id": np.char.add("CAR-", (cars[:n_emit] + 1).astype(str)),
+            "session_id": session_numbers,
+            "start_dt_utc": pd.to_datetime(start_ns[:n_emit], utc=True),
+            "end_dt_utc": pd.to_datetime(end_ns[:n_emit], utc=True),
+            "charging_speed_kw": np.full(n_emit, 11.0), #hardcoded, later calculated
+            "charged_energy_kwh": np.zeros(n_emit),
+            "target_energy_kwh": target_kwh[:n_emit],
+        })
+        return chunk, remaining, session_counter + n_emit
+
+    def _get_biased_session_start_offsets(self, n: int) -> np.ndarray:
+        """Draws `n` session start offsets from midnight (ns), 75% of them between 08:00-20:00."""
+        daytime = self.rng.random(n) < 0.75
+        daytime_hour = self.rng.integers(8, 20, n)  # 08:00-19:59 (75% chance)
+        off_hours = np.array(list(range(0, 8)) + list(range(20, 24)))
+        off_hour = off_hours[self.rng.integers(0, len(off_hours), n)]  # 00:00-07:59 or 20:00-23:59 (25% chance)
+
+        hour = np.where(daytime, daytime_hour, off_hour)
+        return hour * NS_PER_HOUR + self.rng.integers(0, 60, n) * NS_PER_MINUTE
@@ -0,0 +1,191 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+
+class ChargingState:
+    """
+    Per-car inputs of an allocation policy, aligned with the requests along the last axis.
+
+    Parameters:
+        car_id (np.ndarray): Car ids, (cars,).
+        end_ns (np.ndarray): Session ends in epoch nanoseconds, (cars,).
+        remaining_kwh (np.ndarray): Energy still needed to reach the target, (cars,) or
+            (scenarios x cars).
+        max_charging_kwh (np.ndarray): Charging speed times the tick length, (cars,).
+        current_ns (int): Start of the tick in epoch nanoseconds.
+        step_ns (int): Length of the tick in nanoseconds.
+    """
+    def __init__(self,
+                 car_id: np.ndarray,
+                 end_ns: np.ndarray,
+                 remaining_kwh: np.ndarray,
+                 max_charging_kwh: np.ndarray,
+                 current_ns: int,
+                 step_ns: int):
+        self.car_id = car_id
+        self.end_ns = end_ns
+        self.remaining_kwh = remaining_kwh
+        self.max_charging_kwh = max_charging_kwh
+        self.current_ns = current_ns
+        self.step_ns = step_ns
+
+
+class AllocationPolicy(ABC):
+    """
+    Splits the energy available in a tick over the (already capped) requests of the cars.
+
+    `allocate` writes the delivered energy into `out`, never more than a car requests and
+    in total never more than is available. Arrays are (cars,) for one hub or
+    (scenarios x cars) with `available_energy_kwh` shaped (scenarios,). All policies are
+    vectorized and run in O(n log n) per tick or better.
+    """
+    @abstractmethod
+    def allocate(self,
+                 requested_kwh: np.ndarray,
+                 available_energy_kwh,
+                 state: ChargingState,
+                 out: np.ndarray) -> np.ndarray:
+        pass
+
+    @staticmethod
+    def _serve_in_order(requested_kwh: np.ndarray,
+                        available_energy_kwh,
+                        key: np.ndarray,
+                        out: np.ndarray) -> np.ndarray:
+        """Serves the requests fully in ascending `key` order (ties keep their position) until the energy runs out."""
+        order = np.broadcast_to(np.argsort(key, axis=-1, kind="stable"), requested_kwh.shape)
+        sorted_kwh = np.take_along_axis(requested_kwh, order, axis=-1)
+        served_before_kwh = np.cumsum(sorted_kwh, axis=-1) - sorted_kwh
+        left_kwh = np.subtract(np.asarray(available_energy_kwh)[..., None], served_before_kwh)
+        np.put_along_axis(out, order, np.clip(left_kwh, 0, sorted_kwh), axis=-1)
+        return out
+
+
+class ProportionalPolicy(AllocationPolicy):
+    """Scales every request by the same factor when the requests exceed the available energy."""
+    def allocate(self,
+                 requested_kwh: np.ndarray,
+                 available_energy_kwh,
+                 state: ChargingState,
+                 out: np.ndarray) -> np.ndarray:
+        total_kwh = requested_kwh.sum(axis=-1)
+        scaling_factor = np.divide(available_energy_kwh, np.maximum(np.maximum(total_kwh, available_energy_kwh),
+                                                                    np.finfo(np.float64).tiny))
+        return np.multiply(requested_kwh, np.asarray(scaling_factor)[..., None], out=out)
+
+
+class EarliestDeadlineFirstPolicy(AllocationPolicy):
+    """Serves the cars that leave first in full, then the next ones, until the energy runs out."""
+    def allocate(self,
+                 requested_kwh: np.ndarray,
+                 available_energy_kwh,
+                 state: ChargingState,
+                 out: np.ndarray) -> np.ndarray:
+        return self._serve_in_order(requested_kwh, available_energy_kwh, state.end_ns, out)
+
+
+class LeastLaxityFirstPolicy(AllocationPolicy):
+    """
+    Serves the cars with the least slack first. Laxity is the number of ticks until the
+    car leaves minus the ticks it needs at full speed to reach its target.
+    """
+    def allocate(self,
+                 requested_kwh: np.ndarray,
+                 available_energy_kwh,
+                 state: ChargingState,
+                 out: np.ndarray) -> np.ndarray:
+        ticks_left = (np.asarray(state.end_ns) - state.current_ns) / state.step_ns
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ticks_needed = np.where(state.max_charging_kwh > 0, state.remaining_kwh / state.max_charging_kwh, np.inf)
+        return self._serve_in_order(requested_kwh, available_energy_kwh, ticks_left - ticks_needed, out)
+
+
+class PriorityPolicy(AllocationPolicy):
+    """
+    Serves the cars tier by tier, highest priority first. Within the tier where the
+    energy runs out the requests are scaled proportionally.
+
+    Parameters:
+        priorities (dict): {car_id: priority}; a higher number is served earlier.
+        default_priority (float): Priority of cars that are not in `priorities`.
+    """
+    def __init__(self,
+                 priorities: dict = None,
+                 default_priority: float = 0):
+        priorities = priorities or {}
+        self._priority_by_car = pd.Series(list(priorities.values()), index=list(priorities.keys()), dtype=np.float64)
+        self.default_priority = default_priority
+
+    def priority_of(self, car_id: np.ndarray) -> np.ndarray:
+        if self._priority_by_car.empty:
+            return np.full(len(car_id), self.default_priority, dtype=np.float64)
+        return self._priority_by_car.reindex(car_id, fill_value=self.default_priority).to_numpy(dtype=np.float64)
+
+    def allocate(self,
+                 requested_kwh: np.ndarray,
+                 available_energy_kwh,
+                 state: ChargingState,
+                 out: np.ndarray) -> np.ndarray:
+        if requested_kwh.shape[-1] == 0:
+            return out
+        priority = self.priority_of(np.asarray(state.car_id))
+        order = np.argsort(-priority, kind="stable")
+        sorted_priority = priority[order]
+        tier_starts = np.flatnonzero(np.r_[True, sorted_priority[1:] != sorted_priority[:-1]])
+        tier_sizes = np.diff(np.r_[tier_starts, len(order)])
+
+        sorted_kwh = requested_kwh[..., order]
+        tier_kwh = np.add.reduceat(sorted_kwh, tier_starts, axis=-1)
+        served_before_kwh = np.cumsum(tier_kwh, axis=-1) - tier_kwh
+        left_kwh = np.asarray(available_energy_kwh)[..., None] - served_before_kwh
+        with np.errstate(divide="ignore", invalid="ignore"):
+            tier_scaling = np.clip(np.where(tier_kwh > 0, left_kwh / tier_kwh, 1), 0, 1)
+        out[..., order] = sorted_kwh * np.repeat(tier_scaling, tier_sizes, axis=-1)
+        return out
+
+
+class WaterFillingPolicy(AllocationPolicy):
+    """
+    Max-min fair split: every car gets the same amount, capped by its own request, at the
+    highest level the available energy allows. Small requests, such as cars that are
+    almost done, are served in full and their share goes to the others.
+    """
+    def allocate(self,
+                 requested_kwh: np.ndarray,
+                 available_energy_kwh,
+                 state: ChargingState,
+                 out: np.ndarray) -> np.ndarray:
+        n_cars = requested_kwh.shape[-1]
+        if n_cars == 0:
+            return out
+        sorted_kwh = np.sort(requested_kwh, axis=-1)
+        served_below_kwh = np.cumsum(sorted_kwh, axis=-1) - sorted_kwh
+        n_at_level = n_cars - np.arange(n_cars)
+        # Energy used when the level equals the k-th smallest request
+        used_kwh = served_below_kwh + sorted_kwh * n_at_level
+        available_energy_kwh = np.asarray(available_energy_kwh)
+
+        saturated = used_kwh >= available_energy_kwh[..., None]
+        first = np.argmax(saturated, axis=-1)[..., None]
+        level = ((available_energy_kwh[..., None] - np.take_along_axis(served_below_kwh, first, axis=-1))
+                 / np.take_along_axis(np.broadcast_to(n_at_level, used_kwh.shape), first, axis=-1))
+        level = np.where(saturated.any(axis=-1, keepdims=True), level, np.inf)
+        return np.minimum(requested_kwh, level, out=out)
+
+
+POLICIES = {
+    "proportional": ProportionalPolicy,
+    "edf": EarliestDeadlineFirstPolicy,
+    "llf": LeastLaxityFirstPolicy,
+    "priority": PriorityPolicy,
+    "water_filling": WaterFillingPolicy,
+}
+
+
+def get_policy(name: str, **kwargs) -> AllocationPolicy:
+    """Creates a policy by name, for example `get_policy("priority", priorities={"CAR-1": 1})`."""
+    if name not in POLICIES:
+        raise ValueError(f"Error: unknown allocation policy '{name}', expected one of {list(POLICIES)}.")
+    return POLICIES[name](**kwargs)
@@ -1,52 +1,235 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
+from common.helper_functions import to_utc_ns
+from logic.allocation_policies import AllocationPolicy, ChargingState
 from logic.smart_meter import SmartMeter
+from logic.session_store import SessionStore
 
 
 class ChargingHub:
+    """
+    Charges the plugged-in cars with their signals, within the grid limit plus the local surplus.
+
+    Parameters:
+        session_store (SessionStore): Sessions and their charge state.
+        smart_meter (SmartMeter): Meter values of the site.
+        max_gridpower_kw (float): Grid connection limit.
+        allocation_policy (AllocationPolicy, optional): How the available energy is split
+            when the requests exceed it, see `logic.allocation_policies`. By default every
+            request is scaled down by the same factor.
+    """
     def __init__(self,
-                 sessions: pd.DataFrame,
+                 session_store: SessionStore,
                  smart_meter: SmartMeter,
-                 max_gridpower_kw: int = 100):
-        self.sessions = sessions
+                 max_gridpower_kw: int = 100,
+                 allocation_policy: AllocationPolicy = None):
+        self.session_store = session_store
         self.smart_meter = smart_meter
         self.max_gridpower_kw = max_gridpower_kw
+        self.allocation_policy = allocation_policy
+        self._buffers = np.empty((6, 0))
+        self._total_kwh = np.empty(())
 
     def charge(self,
                signals: pd.DataFrame,
                current_dt_utc: datetime,
-               timestep: timedelta) -> pd.DataFrame:
-        meter_values = self.smart_meter.get_meter_values(current_dt_utc, current_dt_utc + timestep)
-        available_energy_kwh = (self.max_gridpower_kw * timestep.total_seconds() / 3600) + meter_values["energy_kwh"]
-                                   
-        charging_cars = self.get_charging_cars(current_dt_utc) #called twice now, not efficient. maybe pass as parameter or store?
-
-        selected_columns = ["card_id", "charging_speed_kw", "charged_energy_kwh", "target_energy_kwh"]
-        active_signals = signals.merge(charging_cars[selected_columns], on="car_id", how="inner")
-
-        max_requested_energy_kwh = (active_signals["target_energy_kwh"] - active_signals["charged_energy_kwh"])
-        max_charging_kwh = active_signals["charging_speed_kw"] * (timestep.seconds / 3600)
-        active_signals["max_requested_energy_kwh"] = max_requested_energy_kwh.combine(max_charging_kwh, min)
-
-        # Final energy request, limited by available energy
-        active_signals["energy_request_kwh"] = active_signals[["energy_kwh", "max_requested_energy_kwh"]].min(axis=1)
-
-        total_requested = active_signals["energy_request_kwh"].sum()
-        if total_requested > available_energy_kwh:
-            scaling_factor = available_energy_kwh / total_requested
-            active_signals["charged_energy_kwh"] = active_signals["energy_request_kwh"] * scaling_factor
-        else:
-            active_signals["charged_energy_kwh"] = active_signals["energy_request_kwh"]
+               timestep: timedelta,
+               charging_cars: pd.DataFrame = None) -> pd.DataFrame:
+        meter_energy_kwh = self.smart_meter.get_range(current_dt_utc, current_dt_utc + timestep).sum()
+        available_energy_kwh = self.available_energy(self.max_gridpower_kw, meter_energy_kwh, timestep)
+
+        if charging_cars is None:
+            charging_cars = self.get_charging_cars(current_dt_utc)
+
+        # Signal rows of the charging cars, in signal order
+        rows = pd.Index(charging_cars["car_id"]).get_indexer(signals["car_id"]) if len(signals) else np.empty(0, dtype=np.int64)
+        has_car = rows >= 0
+        slots = charging_cars["session_idx"].to_numpy()[rows[has_car]]
+
+        store = self.session_store
+        signal_kwh, charged_kwh, target_kwh, max_charging_kwh, requested_kwh, delivered_kwh = self._workspace(len(slots))
+        np.compress(has_car, signals["energy_kwh"].to_numpy(dtype="float64"), out=signal_kwh)
+        np.take(store.charged_energy_kwh, slots, out=charged_kwh)
+        np.take(store.target_energy_kwh, slots, out=target_kwh)
+        np.take(store.charging_speed_kw, slots, out=max_charging_kwh)
+        np.multiply(max_charging_kwh, timestep.total_seconds() / 3600, out=max_charging_kwh)
+        state = None
+        if self.allocation_policy is not None:
+            state = ChargingState(store.car_id_of(slots), store.end_ns[slots], target_kwh - charged_kwh, max_charging_kwh,
+                                  to_utc_ns(current_dt_utc), int(timestep.total_seconds() * 1e9))
+        self.charge_kernel(signal_kwh, charged_kwh, target_kwh, max_charging_kwh, available_energy_kwh,
+                           requested_kwh, delivered_kwh, self._total_kwh, self.allocation_policy, state)
 
         # Update session records
-        self.sessions.loc[self.sessions["car_id"].isin(active_signals["car_id"]),
-                          "charged_energy_kwh"] += active_signals["charged_energy_kwh"]
+        store.set_energy(slots, charged_kwh)
+
+        return pd.DataFrame({
+            "session_idx": slots,
+            "car_id": store.car_id_of(slots),
+            "energy_request_kwh": requested_kwh.copy(),
+            "charged_energy_kwh": delivered_kwh.copy(),
+        })
+
+    @staticmethod
+    def charge_kernel(signal_kwh: np.ndarray,
+                      charged_energy_kwh: np.ndarray,
+                      target_energy_kwh: np.ndarray,
+                      max_charging_kwh: np.ndarray,
+                      available_energy_kwh,
+                      requested_kwh: np.ndarray,
+                      delivered_kwh: np.ndarray,
+                      total_kwh: np.ndarray,
+                      allocation_policy: AllocationPolicy = None,
+                      state: ChargingState = None):
+        """
+        Fused charge step that only writes into the arrays it is given, so a caller that
+        keeps its buffers allocates nothing per tick.
+
+        Each car's signal is capped by its charging energy per tick and its remaining
+        energy. When the requests exceed the available energy they are scaled down
+        proportionally, or split by `allocation_policy` (which gets `state`); the delivered
+        energy is then added to `charged_energy_kwh` in place. Arrays are shaped (cars,) for one hub or (scenarios x cars) for a batch of
+        scenarios, with the car properties broadcasting against them.
+
+        Parameters:
+            signal_kwh (np.ndarray): Signal energy per car.
+            charged_energy_kwh (np.ndarray): Energy charged so far, updated in place.
+            target_energy_kwh (np.ndarray): Target energy per car.
+            max_charging_kwh (np.ndarray): Charging speed times the tick length per car.
+            available_energy_kwh: Energy available in this tick (per scenario), see
+                `available_energy`.
+            requested_kwh (np.ndarray): Output, the capped requests.
+            delivered_kwh (np.ndarray): Output, the energy charged in this tick.
+            total_kwh (np.ndarray): Scratch array for the per-scenario totals, shaped like
+                `available_energy_kwh` (0-d for one hub).
+            allocation_policy (AllocationPolicy, optional): Replaces the proportional split.
+            state (ChargingState, optional): Per-car inputs of `allocation_policy`.
+        """
+        np.subtract(target_energy_kwh, charged_energy_kwh, out=requested_kwh)
+        np.minimum(requested_kwh, max_charging_kwh, out=requested_kwh)
+        np.fmin(signal_kwh, requested_kwh, out=requested_kwh)
+
+        if allocation_policy is None:
+            # scaling = available / max(total, available): 1 unless the requests exceed the available energy
+            np.sum(requested_kwh, axis=-1, out=total_kwh)
+            np.maximum(total_kwh, available_energy_kwh, out=total_kwh)
+            np.maximum(total_kwh, np.finfo(np.float64).tiny, out=total_kwh)
+            np.divide(available_energy_kwh, total_kwh, out=total_kwh)
+            np.multiply(requested_kwh, total_kwh[..., None], out=delivered_kwh)
+        else:
+            allocation_policy.allocate(requested_kwh, available_energy_kwh, state, out=delivered_kwh)
+        np.add(charged_energy_kwh, delivered_kwh, out=charged_energy_kwh)
+
+    @staticmethod
+    def charge_batch(energy_kwh: np.ndarray,
+                     charged_energy_kwh: np.ndarray,
+                     target_energy_kwh: np.ndarray,
+                     charging_speed_kw: np.ndarray,
+                     available_energy_kwh: np.ndarray,
+                     timestep: timedelta,
+                     allocation_policy: AllocationPolicy = None,
+                     state: ChargingState = None) -> tuple:
+        """
+        Allocating wrapper around `charge_kernel` for many scenarios at once, on arrays
+        shaped (scenarios x cars). Car arrays shared by all scenarios can be 1-D; the
+        inputs are left unchanged. `allocation_policy` and `state` are passed on to the kernel.
+
+        Returns:
+            tuple: The capped requests and the charged energy, both (scenarios x cars).
+        """
+        available_energy_kwh = np.asarray(available_energy_kwh, dtype=np.float64)
+        shape = np.broadcast_shapes(np.shape(energy_kwh), np.shape(charged_energy_kwh), np.shape(target_energy_kwh),
+                                    np.shape(charging_speed_kw), available_energy_kwh.shape + (1,))
+        charged_kwh = np.array(np.broadcast_to(charged_energy_kwh, shape), dtype=np.float64)
+        max_charging_kwh = np.asarray(charging_speed_kw, dtype=np.float64) * (timestep.total_seconds() / 3600)
+        requested_kwh = np.empty(shape)
+        delivered_kwh = np.empty(shape)
+        ChargingHub.charge_kernel(energy_kwh, charged_kwh, target_energy_kwh, max_charging_kwh, available_energy_kwh,
+                                  requested_kwh, delivered_kwh, np.empty(shape[:-1]), allocation_policy, state)
+        return requested_kwh, delivered_kwh
+
+    @staticmethod
+    def available_energy(max_gridpower_kw,
+                         meter_energy_kwh,
+                         timestep: timedelta):
+        """Energy the hub can hand out in a tick: grid capacity plus the local surplus (scalars or arrays)."""
+        return np.maximum(np.multiply(max_gridpower_kw, timestep.total_seconds() / 3600) + meter_energy_kwh, 0)
+
+    def charge_block(self,
+                     result: pd.DataFrame,
+                     start_dt_utc: datetime,
+                     n_ticks: int,
+                     timestep: timedelta) -> np.ndarray:
+        """
+        Charges the cars of `result` for up to `n_ticks` ticks from `start_dt_utc` with their
+        requests held, as `charge` would tick by tick, and returns the charged energy as a
+        (ticks x cars) array. The block stops early before a tick on which a car could reach
+        its target, and after a tick on which a car that requests energy gets none, because
+        both make the trigger checker fire.
+        """
+        slots = result["session_idx"].to_numpy()
+        requests_kwh = result["energy_request_kwh"].to_numpy(dtype="float64")
+        total_requested = requests_kwh.sum()
+
+        meter_energy_kwh = self.smart_meter.get_tick_energy(start_dt_utc, n_ticks, timestep)
+        available_energy_kwh = self.available_energy(self.max_gridpower_kw, meter_energy_kwh, timestep)
+        store = self.session_store
+        remaining_kwh = store.target_energy_kwh[slots] - store.charged_energy_kwh[slots]
+        if self.allocation_policy is None:
+            scaling_factor = np.minimum(available_energy_kwh / total_requested, 1) if total_requested > 0 else np.ones(n_ticks)
+            charged_kwh = scaling_factor[:, None] * requests_kwh[None, :]
+        else:
+            charged_kwh = self._allocate_ticks(slots, requests_kwh, remaining_kwh, available_energy_kwh, start_dt_utc, timestep)
+
+        charged_before_kwh = np.cumsum(charged_kwh, axis=0) - charged_kwh
+        uncapped = (charged_before_kwh + requests_kwh < remaining_kwh).all(axis=1)
+        n_done = int(uncapped.argmin()) if not uncapped.all() else len(charged_kwh)
+        zero_charge = ((charged_kwh[:n_done] == 0) & (requests_kwh > 0)).any(axis=1)
+        if zero_charge.any():
+            n_done = int(zero_charge.argmax()) + 1
+
+        charged_kwh = charged_kwh[:n_done]
+        store.add_energy(slots, charged_kwh.sum(axis=0))
+        return charged_kwh
+
+    def _allocate_ticks(self,
+                        slots: np.ndarray,
+                        requests_kwh: np.ndarray,
+                        remaining_kwh: np.ndarray,
+                        available_energy_kwh: np.ndarray,
+                        start_dt_utc: datetime,
+                        timestep: timedelta) -> np.ndarray:
+        """
+        Splits the energy of each tick of a block with the allocation policy. The policy may
+        depend on the charge state, so the ticks are allocated in turn, up to the first tick
+        on which the block has to stop.
+        """
+        store = self.session_store
+        step_ns = int(timestep.total_seconds() * 1e9)
+        start_ns = to_utc_ns(start_dt_utc)
+        car_id, end_ns = store.car_id_of(slots), store.end_ns[slots]
+        max_charging_kwh = store.charging_speed_kw[slots] * (timestep.total_seconds() / 3600)
+
+        charged_kwh = np.zeros((len(available_energy_kwh), len(slots)))
+        charged_so_far_kwh = np.zeros(len(slots))
+        for tick in range(len(available_energy_kwh)):
+            if not (charged_so_far_kwh + requests_kwh < remaining_kwh).all():
+                return charged_kwh[:tick]
+            state = ChargingState(car_id, end_ns, remaining_kwh - charged_so_far_kwh, max_charging_kwh,
+                                  start_ns + tick * step_ns, step_ns)
+            self.allocation_policy.allocate(requests_kwh, available_energy_kwh[tick], state, out=charged_kwh[tick])
+            charged_so_far_kwh += charged_kwh[tick]
+            if ((charged_kwh[tick] == 0) & (requests_kwh > 0)).any():
+                return charged_kwh[:tick + 1]
+        return charged_kwh
 
-        return active_signals[["car_id", "charged_energy_kwh"]]
+    def _workspace(self, n_cars: int) -> np.ndarray:
+        """Per-car buffers of `charge` (six rows), grown by doubling and reused between ticks."""
+        if self._buffers.shape[1] < n_cars:
+            self._buffers = np.empty((6, max(n_cars, 2 * self._buffers.shape[1])))
+        return self._buffers[:, :n_cars]
 
     def get_charging_cars(self, current_time: datetime) -> pd.DataFrame:
-        return self.sessions[
-            (self.sessions["start_dt_utc"] <= current_time) &
-            (self.sessions["end_dt_utc"] > current_time) &
-            (self.sessions["charged_energy_kwh"] < self.sessions["target_energy_kwh"])
-        ]
+        self.session_store.advance(current_time)
+        return self.session_store.get_active_frame()
@@ -1,27 +1,230 @@
+import os
+import shutil
+import tempfile
+import weakref
+import numpy as np
 import pandas as pd
 from datetime import datetime
 
+from common.helper_functions import to_utc_ns, series_to_utc_ns
+
+
 class ChargingLogger:
-    def __init__(self, batch_size=1000):
-        """Initialize a list for batching and an empty DataFrame for storage."""
-        self.records = pd.DataFrame(columns=["timestamp", "charging_data"])
-        self.buffer = []  
-        self.batch_size = batch_size  
-
-    def log(self, 
-            timestamp: datetime, 
+    """
+    Columnar log of the energy charged per car per tick.
+
+    Rows of (timestamp, car_id, charged_energy_kwh) are written into preallocated NumPy
+    buffers that double in size when full. Car ids are stored as integer codes. When the
+    buffered rows exceed `max_memory_bytes` they are spilled as a chunk to local
+    disk (Arrow IPC or Parquet, requires `pyarrow`) and the buffers are reused.
+
+    Parameters:
+        initial_capacity (int): Number of rows preallocated per buffer.
+        max_memory_bytes (int): Buffer size at which rows are spilled to disk.
+        spill_dir (str, optional): Directory for spilled chunks. A temporary directory is
+            created (and removed again with the logger) when not provided.
+        spill_format (str): "arrow" (memory-mapped on load) or "parquet".
+    """
+    ROW_BYTES = 8 + 4 + 8  # int64 timestamp, int32 car code, float64 energy
+    SPILL_FORMATS = ("arrow", "parquet")
+
+    def __init__(self,
+                 initial_capacity: int = 4096,
+                 max_memory_bytes: int = 256 * 1024 ** 2,
+                 spill_dir: str = None,
+                 spill_format: str = "arrow"):
+        if spill_format not in self.SPILL_FORMATS:
+            raise ValueError(f"Error: unknown spill format '{spill_format}', expected one of {self.SPILL_FORMATS}.")
+        self.max_memory_bytes = max_memory_bytes
+        self.spill_dir = spill_dir
+        self.spill_format = spill_format
+
+        self._timestamp_ns = np.empty(initial_capacity, dtype=np.int64)
+        self._car_code = np.empty(initial_capacity, dtype=np.int32)
+        self._energy_kwh = np.empty(initial_capacity, dtype=np.float64)
+        self._size = 0
+
+        self._car_ids = []
+        self._car_codes = {}
+        self._last_frame = None
+        self._last_frame_codes = None
+        self._last_frame_energy = None
+
+        self.spilled_chunks = []
+        self.n_spilled_rows = 0
+
+    def __len__(self) -> int:
+        return self.n_spilled_rows + self._size
+
+    @property
+    def memory_usage_bytes(self) -> int:
+        return self._timestamp_ns.nbytes + self._car_code.nbytes + self._energy_kwh.nbytes
+
+    def log(self,
+            timestamp: datetime,
             charging_data: pd.DataFrame):
-        self.buffer.append({"timestamp": timestamp, "charging_data": charging_data})
+        codes, energy_kwh = self._encode(charging_data)
+        n = len(codes)
+        if n == 0:
+            return
+        self._reserve(n)
+        self._timestamp_ns[self._size:self._size + n] = to_utc_ns(timestamp)
+        self._car_code[self._size:self._size + n] = codes
+        self._energy_kwh[self._size:self._size + n] = energy_kwh
+        self._size += n
+        self._spill_if_needed()
+
+    def log_block(self,
+                  timestamps: pd.DatetimeIndex,
+                  charging_data: pd.DataFrame,
+                  charged_energy_kwh: np.ndarray):
+        """Logs a block of ticks for the cars of `charging_data`, with a (ticks x cars) energy array."""
+        codes, _ = self._encode(charging_data)
+        n = len(codes) * len(timestamps)
+        if n == 0:
+            return
+        timestamps_ns = series_to_utc_ns(timestamps)
+        self._reserve(n)
+        self._timestamp_ns[self._size:self._size + n] = np.repeat(timestamps_ns, len(codes))
+        self._car_code[self._size:self._size + n] = np.tile(codes, len(timestamps))
+        self._energy_kwh[self._size:self._size + n] = np.asarray(charged_energy_kwh).ravel()
+        self._size += n
+        self._spill_if_needed()
+
+    def flush(self):
+        """Writes the buffered rows to disk when the log has already started spilling."""
+        if self.spilled_chunks and self._size:
+            self._spill()
+
+    def flush_to_dataframe(self) -> pd.DataFrame:
+        """Kept for existing callers: flushes and returns all logged rows, see `flush` and `get_logs`."""
+        self.flush()
+        return self.get_logs()
 
-        if len(self.buffer) >= self.batch_size:
-            self.flush_to_dataframe() 
+    def snapshot(self) -> dict:
+        """
+        Spills the buffered rows and returns the log position: the chunk files and the car
+        ids. Resuming from it needs the chunks to outlive the logger, so set `spill_dir`.
+        """
+        if self._size:
+            self._spill()
+        return {
+            "spilled_chunks": list(self.spilled_chunks),
+            "n_spilled_rows": self.n_spilled_rows,
+            "car_ids": list(self._car_ids),
+        }
 
-    def flush_to_dataframe(self):
-        if self.buffer:
-            new_entries = pd.DataFrame(self.buffer)
-            self.records = pd.concat([self.records, new_entries], ignore_index=True)
-            self.buffer = [] 
+    def restore(self, snapshot: dict):
+        """Continues the log from a position taken with `snapshot`; rows logged since are dropped."""
+        missing = [path for path in snapshot["spilled_chunks"] if not os.path.exists(path)]
+        if missing:
+            raise ValueError(f"Error: spilled log chunks are missing: {missing[:3]}.")
+        self.spilled_chunks = list(snapshot["spilled_chunks"])
+        self.n_spilled_rows = int(snapshot["n_spilled_rows"])
+        self._car_ids = list(snapshot["car_ids"])
+        self._car_codes = {car_id: code for code, car_id in enumerate(self._car_ids)}
+        self._size = 0
+        self._last_frame = None
+        self._last_frame_codes = None
+        self._last_frame_energy = None
 
     def get_logs(self) -> pd.DataFrame:
-        self.flush_to_dataframe()
-        return self.records
+        """Returns all logged rows as one flat frame; spilled chunks are read memory-mapped."""
+        if not self.spilled_chunks:
+            return self._to_frame(self._timestamp_ns[:self._size],
+                                  self._car_code[:self._size],
+                                  self._energy_kwh[:self._size])
+
+        import pyarrow as pa
+        tables = [self._read_chunk(path) for path in self.spilled_chunks]
+        if self._size:
+            tables.append(self._buffer_table())
+        table = pa.concat_tables(tables)
+        return self._to_frame(table.column("timestamp").to_numpy(),
+                              table.column("car_id").to_numpy(),
+                              table.column("charged_energy_kwh").to_numpy())
+
+    def _encode(self, charging_data: pd.DataFrame) -> tuple:
+        """Maps a result frame to car codes and energies; cached for the last frame seen."""
+        if charging_data is self._last_frame:
+            return self._last_frame_codes, self._last_frame_energy
+        if charging_data.empty:
+            codes, energy_kwh = np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+        else:
+            codes = np.fromiter((self._car_code_for(car_id) for car_id in charging_data["car_id"]),
+                                dtype=np.int32, count=len(charging_data))
+            energy_kwh = charging_data["charged_energy_kwh"].to_numpy(dtype=np.float64)
+        self._last_frame, self._last_frame_codes, self._last_frame_energy = charging_data, codes, energy_kwh
+        return codes, energy_kwh
+
+    def _car_code_for(self, car_id) -> int:
+        code = self._car_codes.get(car_id)
+        if code is None:
+            code = self._car_codes[car_id] = len(self._car_ids)
+            self._car_ids.append(car_id)
+        return code
+
+    def _reserve(self, n: int):
+        """Grows the buffers geometrically so that `n` more rows fit."""
+        required = self._size + n
+        capacity = len(self._timestamp_ns)
+        if required <= capacity:
+            return
+        while capacity < required:
+            capacity = max(2 * capacity, 1)
+        self._timestamp_ns = self._grow(self._timestamp_ns, capacity)
+        self._car_code = self._grow(self._car_code, capacity)
+        self._energy_kwh = self._grow(self._energy_kwh, capacity)
+
+    def _grow(self, buffer: np.ndarray, capacity: int) -> np.ndarray:
+        grown = np.empty(capacity, dtype=buffer.dtype)
+        grown[:self._size] = buffer[:self._size]
+        return grown
+
+    def _spill_if_needed(self):
+        if self._size * self.ROW_BYTES >= self.max_memory_bytes:
+            self._spill()
+
+    def _spill(self):
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise ImportError("Error: spilling the charging log to disk requires 'pyarrow'.") from e
+
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix="charging_logger_")
+            weakref.finalize(self, shutil.rmtree, self.spill_dir, True)
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+        table = self._buffer_table()
+        path = os.path.join(self.spill_dir, f"chunk_{len(self.spilled_chunks):06d}.{self.spill_format}")
+        if self.spill_format == "parquet":
+            import pyarrow.parquet as pq
+            pq.write_table(table, path)
+        else:
+            with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+        self.spilled_chunks.append(path)
+        self.n_spilled_rows += self._size
+        self._size = 0
+
+    def _buffer_table(self):
+        import pyarrow as pa
+        return pa.table({"timestamp": self._timestamp_ns[:self._size],
+                         "car_id": self._car_code[:self._size],
+                         "charged_energy_kwh": self._energy_kwh[:self._size]})
+
+    def _read_chunk(self, path: str):
+        import pyarrow as pa
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            return pq.read_table(path, memory_map=True)
+        return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+    def _to_frame(self, timestamp_ns: np.ndarray, car_code: np.ndarray, energy_kwh: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame({
+            "timestamp": pd.to_datetime(timestamp_ns, utc=True),
+            "car_id": pd.Categorical.from_codes(car_code, categories=pd.Index(self._car_ids, dtype=object)),
+            "charged_energy_kwh": energy_kwh,
+        })
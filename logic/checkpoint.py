@@ -0,0 +1,183 @@
+import glob
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from common.helper_functions import to_utc_ns, series_to_utc_ns, ns_to_utc_timestamp
+from logic.trigger_checker import TriggerReason
+
+
+class Checkpointer:
+    """
+    Periodic checkpoints of a `Dispatcher.run`, so a long run can resume after a failure.
+
+    A checkpoint holds the next tick to simulate, the session charge state, the last
+    signals and result, the trigger and optimizer state, the logger position and the
+    state of the given random generators. It is written as one `.npz` file (NumPy arrays
+    plus a JSON header, no pickle). The logged rows are not copied into it: the logger
+    spills them as chunks into `directory` and the checkpoint refers to those.
+
+    Parameters:
+        directory (str): Directory for the checkpoints and the spilled log chunks.
+        interval (timedelta): Simulated time between checkpoints.
+        keep (int): Number of most recent checkpoints kept on disk.
+        rngs (dict, optional): {name: np.random.Generator} whose states are saved and
+            restored, e.g. the generators of the readers.
+    """
+    def __init__(self,
+                 directory: str,
+                 interval: timedelta = timedelta(days=7),
+                 keep: int = 2,
+                 rngs: dict = None):
+        if interval <= timedelta(0):
+            raise ValueError(f"Error: checkpoint interval ({interval}) must be positive.")
+        if keep < 1:
+            raise ValueError(f"Error: keep ({keep}) must be at least 1, the latest checkpoint is needed to resume.")
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.rngs = rngs or {}
+        self._last_saved_ns = None
+
+    def prepare(self, dispatcher, start_dt_utc: datetime):
+        """Makes the logger spill into the checkpoint directory, so resumed runs can find the chunks."""
+        os.makedirs(self.directory, exist_ok=True)
+        if dispatcher.charging_logger.spill_dir is None:
+            dispatcher.charging_logger.spill_dir = os.path.join(self.directory, "log_chunks")
+        self._last_saved_ns = to_utc_ns(start_dt_utc)
+
+    def due(self, next_dt_utc: datetime) -> bool:
+        return to_utc_ns(next_dt_utc) - self._last_saved_ns >= self.interval.total_seconds() * 1e9
+
+    def save(self,
+             dispatcher,
+             run: dict,
+             next_dt_utc: datetime,
+             result: pd.DataFrame,
+             signals: pd.DataFrame) -> str:
+        """Writes a checkpoint from which the run continues at `next_dt_utc`; returns its path."""
+        next_ns = to_utc_ns(next_dt_utc)
+        optimizer_snapshot = getattr(dispatcher.optimizer, "snapshot", None)
+        state = {
+            "run": run,
+            "next_ns": next_ns,
+            "result": result,
+            "signals": signals,
+            "session_store": dispatcher.charging_hub.session_store.snapshot(),
+            "trigger_checker": dispatcher.trigger_checker.snapshot(),
+            "optimizer": optimizer_snapshot() if optimizer_snapshot else None,
+            "charging_logger": dispatcher.charging_logger.snapshot(),
+            "dispatcher": {
+                "trigger_counts": {reason.value: count for reason, count in dispatcher.trigger_counts.items()},
+                "last_trigger_reason": None if dispatcher.last_trigger_reason is None else dispatcher.last_trigger_reason.value,
+                "n_signals": dispatcher.n_signals,
+            },
+            "rngs": {name: rng.bit_generator.state for name, rng in self.rngs.items()},
+        }
+        arrays = {}
+        header = _encode(state, "state", arrays)
+
+        path = os.path.join(self.directory, f"checkpoint_{next_ns}.npz")
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "wb") as f:
+            np.savez(f, header=np.frombuffer(json.dumps(header).encode(), dtype=np.uint8), **arrays)
+        os.replace(temporary_path, path)
+        self._last_saved_ns = next_ns
+
+        checkpoints = self.checkpoints()
+        for old_path in checkpoints[:max(len(checkpoints) - self.keep, 0)]:
+            os.remove(old_path)
+        return path
+
+    def checkpoints(self) -> list:
+        """Checkpoint files, oldest first."""
+        paths = glob.glob(os.path.join(self.directory, "checkpoint_*.npz"))
+        return sorted(paths, key=lambda path: int(os.path.basename(path)[len("checkpoint_"):-len(".npz")]))
+
+    def latest(self) -> str:
+        paths = self.checkpoints()
+        return paths[-1] if paths else None
+
+    def load(self, path: str = None) -> dict:
+        """Reads a checkpoint (the latest by default)."""
+        path = path or self.latest()
+        if path is None:
+            raise ValueError(f"Error: no checkpoint found in {self.directory}.")
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(data["header"].tobytes().decode())
+            return _decode(header, data)
+
+    def restore(self, dispatcher, state: dict) -> tuple:
+        """Restores the components of `dispatcher`; returns the next tick, the result and the signals."""
+        dispatcher.charging_hub.session_store.restore(state["session_store"])
+        dispatcher.trigger_checker.restore(state["trigger_checker"])
+        if state["optimizer"] is not None:
+            dispatcher.optimizer.restore(state["optimizer"])
+        dispatcher.charging_logger.restore(state["charging_logger"])
+
+        dispatcher.trigger_counts.clear()
+        dispatcher.trigger_counts.update({TriggerReason(reason): count
+                                          for reason, count in state["dispatcher"]["trigger_counts"].items()})
+        last_reason = state["dispatcher"]["last_trigger_reason"]
+        dispatcher.last_trigger_reason = None if last_reason is None else TriggerReason(last_reason)
+        dispatcher.n_signals = state["dispatcher"]["n_signals"]
+        for name, rng_state in state["rngs"].items():
+            if name in self.rngs:
+                self.rngs[name].bit_generator.state = rng_state
+
+        self._last_saved_ns = state["next_ns"]
+        return ns_to_utc_timestamp(state["next_ns"]), state["result"], state["signals"]
+
+
+def _encode(value, key: str, arrays: dict):
+    """Replaces the arrays and frames in a nested state by references into `arrays`."""
+    if isinstance(value, pd.DataFrame):
+        columns = []
+        for position, column in enumerate(value.columns):
+            column_key = f"{key}/{position}"
+            values = value[column]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                arrays[column_key] = series_to_utc_ns(values)
+                columns.append([column, "datetime"])
+            elif pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+                arrays[column_key] = values.to_numpy()
+                columns.append([column, "number"])
+            else:
+                arrays[column_key] = values.to_numpy().astype(str)
+                columns.append([column, "string"])
+        return {"__frame__": columns, "key": key}
+    if isinstance(value, np.ndarray):
+        arrays[key] = value.astype(str) if value.dtype == object else value
+        return {"__array__": key, "object": value.dtype == object}
+    if isinstance(value, dict):
+        return {str(name): _encode(item, f"{key}/{name}", arrays) for name, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item, f"{key}/{position}", arrays) for position, item in enumerate(value)]
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _decode(value, data):
+    if isinstance(value, dict) and "__frame__" in value:
+        frame = {}
+        for position, (column, kind) in enumerate(value["__frame__"]):
+            values = data[f"{value['key']}/{position}"]
+            if kind == "datetime":
+                frame[column] = pd.to_datetime(values, utc=True)
+            elif kind == "string":
+                frame[column] = values.astype(object)
+            else:
+                frame[column] = values
+        return pd.DataFrame(frame)
+    if isinstance(value, dict) and "__array__" in value:
+        values = data[value["__array__"]]
+        return values.astype(object) if value["object"] else values
+    if isinstance(value, dict):
+        return {name: _decode(item, data) for name, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item, data) for item in value]
+    return value
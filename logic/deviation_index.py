@@ -0,0 +1,207 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+
+from common.helper_functions import to_utc_ns, series_to_utc_ns
+
+
+class DeviationIndex:
+    """
+    Forecast, meter values and their residual (meter - forecast) aligned on one time grid,
+    with precomputed aggregates for fast window queries.
+
+    Prefix sums answer range sums, mean absolute error and RMSE of any window in O(1).
+    Sparse tables (O(n log n) memory, built once) answer the largest positive and negative
+    residual of any window in O(1). Grid slots missing from either input are left out of
+    every aggregate. Windows follow `SmartMeter`: a slot counts when it lies fully inside
+    [start_dt_utc, end_dt_utc).
+
+    Parameters:
+        energy_forecast (pd.DataFrame): Forecast with `start_dt_utc` and `energy_kwh`.
+        meter_values (pd.DataFrame): Meter values with `start_dt_utc` and `energy_kwh`.
+        timestep (timedelta, optional): Grid step; by default the smallest step between
+            forecast rows.
+    """
+    COLUMNS = ("forecast", "meter", "residual")
+
+    def __init__(self,
+                 energy_forecast: pd.DataFrame,
+                 meter_values: pd.DataFrame,
+                 timestep: timedelta = None):
+        forecast_ns = series_to_utc_ns(energy_forecast["start_dt_utc"])
+        meter_ns = series_to_utc_ns(meter_values["start_dt_utc"])
+        if len(forecast_ns) == 0 or len(meter_ns) == 0:
+            raise ValueError("Error: the deviation index needs both forecast and meter values.")
+
+        if timestep is None:
+            steps = np.diff(np.unique(forecast_ns))
+            if len(steps) == 0:
+                raise ValueError("Error: cannot detect the grid step from a single forecast row, pass a timestep.")
+            self.step_ns = int(steps.min())
+        else:
+            self.step_ns = int(timestep.total_seconds() * 1e9)
+        self.origin_ns = int(min(forecast_ns.min(), meter_ns.min()))
+        n = int((max(forecast_ns.max(), meter_ns.max()) - self.origin_ns) // self.step_ns) + 1
+
+        self.forecast_kwh, forecast_valid = self._align(forecast_ns, energy_forecast["energy_kwh"], n)
+        self.meter_kwh, meter_valid = self._align(meter_ns, meter_values["energy_kwh"], n)
+        self.valid = forecast_valid & meter_valid
+        self.forecast_kwh[~self.valid] = 0.0
+        self.meter_kwh[~self.valid] = 0.0
+        self.residual_kwh = self.meter_kwh - self.forecast_kwh
+
+        self._cumsum = {
+            "forecast": self._prefix_sum(self.forecast_kwh),
+            "meter": self._prefix_sum(self.meter_kwh),
+            "residual": self._prefix_sum(self.residual_kwh),
+            "abs_residual": self._prefix_sum(np.abs(self.residual_kwh)),
+            "squared_residual": self._prefix_sum(self.residual_kwh ** 2),
+            "valid": self._prefix_sum(self.valid.astype(np.float64)),
+        }
+        self._max_table = self._sparse_table(np.where(self.valid, self.residual_kwh, -np.inf), np.maximum)
+        self._min_table = self._sparse_table(np.where(self.valid, self.residual_kwh, np.inf), np.minimum)
+
+    def __len__(self) -> int:
+        return len(self.residual_kwh)
+
+    @property
+    def timestep(self) -> timedelta:
+        return timedelta(microseconds=self.step_ns / 1e3)
+
+    def grid(self) -> pd.DatetimeIndex:
+        """Start datetimes of the grid slots."""
+        return pd.to_datetime(self.origin_ns + self.step_ns * np.arange(len(self)), utc=True)
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame({
+            "start_dt_utc": self.grid(),
+            "forecast_kwh": self.forecast_kwh,
+            "meter_kwh": self.meter_kwh,
+            "residual_kwh": self.residual_kwh,
+            "valid": self.valid,
+        })
+
+    def range_sum(self,
+                  start_dt_utc: datetime,
+                  end_dt_utc: datetime,
+                  column: str = "residual") -> float:
+        """Sum of `column` ("forecast", "meter" or "residual") over the window."""
+        if column not in self.COLUMNS:
+            raise ValueError(f"Error: unknown column '{column}', expected one of {self.COLUMNS}.")
+        lo, hi = self._locate(start_dt_utc, end_dt_utc)
+        return float(self._cumsum[column][hi] - self._cumsum[column][lo])
+
+    def max_deviation(self,
+                      start_dt_utc: datetime,
+                      end_dt_utc: datetime) -> float:
+        """Largest absolute residual in the window, NaN without valid slots."""
+        lo, hi = self._locate(start_dt_utc, end_dt_utc)
+        return max(self._query(self._max_table, np.maximum, lo, hi), -self._query(self._min_table, np.minimum, lo, hi))
+
+    def max_residual(self,
+                     start_dt_utc: datetime,
+                     end_dt_utc: datetime) -> float:
+        """Largest residual (meter above forecast) in the window, NaN without valid slots."""
+        return self._query(self._max_table, np.maximum, *self._locate(start_dt_utc, end_dt_utc))
+
+    def min_residual(self,
+                     start_dt_utc: datetime,
+                     end_dt_utc: datetime) -> float:
+        """Smallest residual (meter below forecast) in the window, NaN without valid slots."""
+        return self._query(self._min_table, np.minimum, *self._locate(start_dt_utc, end_dt_utc))
+
+    def mean_absolute_error(self,
+                            start_dt_utc: datetime,
+                            end_dt_utc: datetime) -> float:
+        return self._mean("abs_residual", *self._locate(start_dt_utc, end_dt_utc))
+
+    def rmse(self,
+             start_dt_utc: datetime,
+             end_dt_utc: datetime) -> float:
+        return float(np.sqrt(self._mean("squared_residual", *self._locate(start_dt_utc, end_dt_utc))))
+
+    def rolling_error(self,
+                      window: timedelta,
+                      metric: str = "mae") -> pd.Series:
+        """
+        Error of the window ending at every grid slot (trailing, including the slot), as a
+        Series on the grid. `metric` is "mae", "rmse", "bias" (mean residual) or
+        "max_deviation". Slots with fewer than `window` of history use what is there.
+        """
+        width = int(window.total_seconds() * 1e9) // self.step_ns
+        if width <= 0:
+            raise ValueError(f"Error: window ({window}) must span at least one grid step.")
+        hi = np.arange(1, len(self) + 1)
+        lo = np.maximum(hi - width, 0)
+
+        if metric == "max_deviation":
+            values = np.maximum(self._query(self._max_table, np.maximum, lo, hi),
+                                -self._query(self._min_table, np.minimum, lo, hi))
+        elif metric in ("mae", "rmse", "bias"):
+            column = {"mae": "abs_residual", "rmse": "squared_residual", "bias": "residual"}[metric]
+            values = self._mean(column, lo, hi)
+            if metric == "rmse":
+                values = np.sqrt(values)
+        else:
+            raise ValueError(f"Error: unknown metric '{metric}', expected 'mae', 'rmse', 'bias' or 'max_deviation'.")
+        return pd.Series(values, index=self.grid(), name=f"rolling_{metric}")
+
+    def _align(self, start_ns: np.ndarray, energy_kwh: pd.Series, n: int) -> tuple:
+        offsets = start_ns - self.origin_ns
+        on_grid = offsets % self.step_ns == 0
+        positions = offsets[on_grid] // self.step_ns
+        values = np.zeros(n)
+        valid = np.zeros(n, dtype=bool)
+        values[positions] = energy_kwh.to_numpy(dtype="float64")[on_grid]
+        valid[positions] = True
+        return values, valid
+
+    @staticmethod
+    def _prefix_sum(values: np.ndarray) -> np.ndarray:
+        return np.concatenate(([0.0], np.cumsum(values)))
+
+    @staticmethod
+    def _sparse_table(values: np.ndarray, combine) -> list:
+        """Level k holds `combine` over the 2**k slots starting at each position."""
+        table = [values]
+        span = 1
+        while 2 * span <= len(values):
+            previous = table[-1]
+            table.append(combine(previous[:-span], previous[span:]))
+            span *= 2
+        return table
+
+    @staticmethod
+    def _query(table: list, combine, lo, hi):
+        """Combines two overlapping power-of-two spans covering [lo, hi); works on arrays of windows."""
+        if np.ndim(lo) == 0 and np.ndim(hi) == 0:
+            if hi <= lo:
+                return float("nan")
+            k = (hi - lo).bit_length() - 1
+            value = float(combine(table[k][lo], table[k][hi - (1 << k)]))
+            return value if np.isfinite(value) else float("nan")
+        lo, hi = np.broadcast_arrays(np.atleast_1d(lo), np.atleast_1d(hi))
+        level = np.floor(np.log2(np.maximum(hi - lo, 1))).astype(int)
+        result = np.full(lo.shape, np.nan)
+        for k in np.unique(level):
+            mask = level == k
+            result[mask] = combine(table[k][lo[mask]], table[k][hi[mask] - (1 << k)])
+        result[(hi <= lo) | ~np.isfinite(result)] = np.nan
+        return result
+
+    def _mean(self, column: str, lo, hi):
+        count = self._cumsum["valid"][hi] - self._cumsum["valid"][lo]
+        total = self._cumsum[column][hi] - self._cumsum[column][lo]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+        return mean if mean.ndim else float(mean)
+
+    def _locate(self, start_dt_utc: datetime, end_dt_utc: datetime) -> tuple:
+        """Returns the grid slice of the slots that lie fully inside the window."""
+        start_ns = to_utc_ns(start_dt_utc)
+        end_ns = to_utc_ns(end_dt_utc)
+        lo = min(max(-((self.origin_ns - start_ns) // self.step_ns), 0), len(self))
+        hi = min(max((end_ns - self.origin_ns) // self.step_ns, 0), len(self))
+        if hi < lo:
+            raise ValueError(f"Error: end_dt_utc ({end_dt_utc}) is before start_dt_utc ({start_dt_utc}).")
+        return int(lo), int(hi)
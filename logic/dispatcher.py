@@ -3,9 +3,17 @@ from logic.optimizer import Optimizer
 from logic.trigger_checker import TriggerChecker
 from logic.charging_hub import ChargingHub
 from logic.charging_logger import ChargingLogger
+from logic.event_queue import EventQueue, EventType
+from logic.instrumentation import DispatcherHooks, StageTimer
+from logic.checkpoint import Checkpointer
+from common.helper_functions import to_utc_ns, series_to_utc_ns
+from collections import Counter
+from time import perf_counter
 import pandas as pd
 
 class Dispatcher:
+    RUN_MODES = ("fixed", "event")
+
     def __init__(self,
                  trigger_checker: TriggerChecker,
                  charging_hub: ChargingHub,
@@ -16,25 +24,202 @@ class Dispatcher:
         self.optimizer = optimizer
         self.charging_hub = charging_hub
         self.charging_logger = charging_logger
+        self.last_trigger_reason = None
+        self.trigger_counts = Counter()
+        self.hooks = []
+        self.current_dt_utc = None
+        self.n_signals = 0
+        self._bind_stages()
+
+    def add_hooks(self, hooks: DispatcherHooks):
+        """Registers instrumentation hooks; without hooks the run loop is not instrumented."""
+        self.hooks.append(hooks)
+
+    def remove_hooks(self, hooks: DispatcherHooks):
+        self.hooks.remove(hooks)
+
+    def cardinality(self) -> tuple:
+        """Number of active cars and of current signals."""
+        return self.charging_hub.session_store.n_active, self.n_signals
 
     def run(self,
             start_dt_utc: datetime,
             end_dt_utc: datetime,
-            timestep: timedelta) -> bool:
-        
-        result = pd.DataFrame()
-        current_dt_utc = start_dt_utc
-        signals = pd.DataFrame()
+            timestep: timedelta,
+            mode: str = "fixed",
+            checkpointer: Checkpointer = None,
+            resume: bool = False) -> bool:
+        """
+        Runs the simulation from `start_dt_utc` up to and including `end_dt_utc`.
+
+        Parameters:
+            mode (str): "fixed" evaluates every timestep. "event" only evaluates the ticks on
+                which a dispatch decision or the set of charging cars can change, and charges
+                and logs the ticks in between in bulk. Both modes produce the same logs.
+            checkpointer (Checkpointer, optional): Writes periodic checkpoints of the run.
+            resume (bool): Continue from the latest checkpoint of the same run, if any.
+
+        The plugged-in cars are charged on every tick with the current signals; the optimizer
+        only runs on the ticks on which the trigger checker fires.
+        """
+        if mode not in self.RUN_MODES:
+            raise ValueError(f"Error: unknown run mode '{mode}', expected one of {self.RUN_MODES}.")
+        self._bind_stages()
+        run_info = {"start_ns": to_utc_ns(start_dt_utc), "end_ns": to_utc_ns(end_dt_utc),
+                    "step_ns": int(timestep.total_seconds() * 1e9), "mode": mode}
+        current_dt_utc, result, signals = start_dt_utc, pd.DataFrame(), pd.DataFrame()
+        if checkpointer is not None:
+            checkpointer.prepare(self, start_dt_utc)
+            if resume and checkpointer.latest() is not None:
+                state = checkpointer.load()
+                if state["run"] != run_info:
+                    raise ValueError("Error: the latest checkpoint belongs to a run with other settings.")
+                current_dt_utc, result, signals = checkpointer.restore(self, state)
+
+        if mode == "event":
+            return self._run_event_driven(start_dt_utc, end_dt_utc, timestep, current_dt_utc, result, signals,
+                                          checkpointer, run_info)
+
+        instrumented = bool(self.hooks)
 
         while current_dt_utc <= end_dt_utc:
-            if self.trigger_checker.is_triggered(current_dt_utc, result, signals):
-                charging_cars = self.charging_hub.get_charging_cars(current_dt_utc)
-                if not charging_cars.empty:
-                    signals = self.optimizer.optimize_sessions(current_dt_utc, charging_cars)
-                    result = self.charging_hub.charge(signals, current_dt_utc, timestep)                    
-            self.charging_logger.log(current_dt_utc, result)
-            current_dt_utc += timestep        
-        self.charging_logger.flush_to_dataframe()
+            self.current_dt_utc = current_dt_utc
+            if instrumented:
+                tick_started = self._before_tick()
+            result, signals = self._step(current_dt_utc, timestep, result, signals)
+            self._log(current_dt_utc, result)
+            if instrumented:
+                self._after_tick(tick_started)
+            current_dt_utc += timestep
+            if checkpointer is not None and current_dt_utc <= end_dt_utc and checkpointer.due(current_dt_utc):
+                checkpointer.save(self, run_info, current_dt_utc, result, signals)
+        self.charging_logger.flush()
+
+    def _run_event_driven(self,
+                          start_dt_utc: datetime,
+                          end_dt_utc: datetime,
+                          timestep: timedelta,
+                          current_dt_utc: datetime,
+                          result: pd.DataFrame,
+                          signals: pd.DataFrame,
+                          checkpointer: Checkpointer,
+                          run_info: dict) -> bool:
+        session_store = self.charging_hub.session_store
+        event_queue = EventQueue(session_store, start_dt_utc, timestep)
+        end_ns = to_utc_ns(end_dt_utc)
+        if not signals.empty:
+            # Resumed run: the expiries of the restored signals are not in the fresh queue
+            event_queue.push_many(series_to_utc_ns(signals["end_dt_utc"]), EventType.SIGNAL_EXPIRY)
+        instrumented = bool(self.hooks)
+
+        while current_dt_utc <= end_dt_utc:
+            self.current_dt_utc = current_dt_utc
+            if instrumented:
+                tick_started = self._before_tick()
+            current_ns = to_utc_ns(current_dt_utc)
+            completed_before = session_store.n_completed
+            previous_signals = signals
+            result, signals = self._step(current_dt_utc, timestep, result, signals)
+            if signals is not previous_signals and not signals.empty:
+                event_queue.push_many(series_to_utc_ns(signals["end_dt_utc"]), EventType.SIGNAL_EXPIRY)
+            if session_store.n_completed != completed_before:
+                event_queue.push(current_ns + event_queue.step_ns, EventType.TARGET_REACHED)
+            self._log(current_dt_utc, result)
+            if instrumented:
+                self._after_tick(tick_started)
+
+            next_ns = self._next_evaluation_ns(event_queue, current_ns, result, signals)
+            if next_ns is None or next_ns > end_ns:
+                next_ns = end_ns + event_queue.step_ns - (end_ns - event_queue.origin_ns) % event_queue.step_ns
+            skipped_ticks = (next_ns - current_ns) // event_queue.step_ns - 1
+            if skipped_ticks > 0 and not result.empty:
+                result, skipped_ticks = self._charge_skipped_ticks(result, current_dt_utc + timestep, skipped_ticks, timestep)
+            current_dt_utc += timestep * (skipped_ticks + 1)
+            if checkpointer is not None and current_dt_utc <= end_dt_utc and checkpointer.due(current_dt_utc):
+                checkpointer.save(self, run_info, current_dt_utc, result, signals)
+        self.charging_logger.flush()
+
+    def _next_evaluation_ns(self,
+                            event_queue: EventQueue,
+                            current_ns: int,
+                            result: pd.DataFrame,
+                            signals: pd.DataFrame) -> int:
+        """Returns the next tick on which the trigger checker can fire (None if there is none)."""
+        if result.empty and self.charging_hub.session_store.n_active == 0:
+            # Idle: nothing can happen before the next car plugs in
+            return event_queue.next_session_start_tick_ns(current_ns)
+        if self.trigger_checker.fires_every_tick(result, signals):
+            return current_ns + event_queue.step_ns
+        return event_queue.next_event_ns(current_ns)
+
+    def evaluate_trigger(self,
+                         current_dt_utc: datetime,
+                         result: pd.DataFrame,
+                         signals: pd.DataFrame) -> tuple:
+        """
+        Runs the trigger check of a tick and records its reason. Returns the charging cars
+        and whether they have to be re-optimized before they are charged. Shared by the
+        run loops here and by `RealtimeDispatcher`.
+        """
+        reason = self._is_triggered(current_dt_utc, result, signals)
+        if reason:
+            self.last_trigger_reason = reason
+            self.trigger_counts[reason] += 1
+        charging_cars = self.charging_hub.get_charging_cars(current_dt_utc)
+        return charging_cars, bool(reason) and not charging_cars.empty
+
+    def _step(self,
+              current_dt_utc: datetime,
+              timestep: timedelta,
+              result: pd.DataFrame,
+              signals: pd.DataFrame) -> tuple:
+        """Evaluates one tick: re-optimizes when the trigger fires, then charges with the current signals."""
+        charging_cars, reoptimize = self.evaluate_trigger(current_dt_utc, result, signals)
+        if charging_cars.empty:
+            return pd.DataFrame(), signals
+        if reoptimize:
+            signals = self._optimize_sessions(current_dt_utc, charging_cars)
+            self.n_signals = len(signals)
+        result = self._charge(signals, current_dt_utc, timestep, charging_cars)
+        return result, signals
+
+    def _charge_skipped_ticks(self,
+                              result: pd.DataFrame,
+                              start_dt_utc: datetime,
+                              n_ticks: int,
+                              timestep: timedelta) -> tuple:
+        """
+        Charges and logs the ticks up to the next evaluation in one go. Returns the result of
+        the last charged tick and the number of ticks covered, which is less than `n_ticks`
+        when a tick on the way has to be evaluated after all.
+        """
+        charged_kwh = self._charge_block(result, start_dt_utc, n_ticks, timestep)
+        if len(charged_kwh):
+            timestamps = pd.date_range(start=start_dt_utc, periods=len(charged_kwh), freq=timestep)
+            self._log_block(timestamps, result, charged_kwh)
+            result = result.assign(charged_energy_kwh=charged_kwh[-1])
+        return result, len(charged_kwh)
+
+    def _bind_stages(self):
+        """Binds the stage calls of the run loop, wrapped in timers only when hooks are registered."""
+        stages = {
+            "_is_triggered": ("trigger", self.trigger_checker.is_triggered),
+            "_optimize_sessions": ("optimize", self.optimizer.optimize_sessions),
+            "_charge": ("charge", self.charging_hub.charge),
+            "_log": ("log", self.charging_logger.log),
+            "_charge_block": ("charge", self.charging_hub.charge_block),
+            "_log_block": ("log", self.charging_logger.log_block),
+        }
+        for attribute, (stage, method) in stages.items():
+            setattr(self, attribute, StageTimer(stage, method, self) if self.hooks else method)
 
-            
+    def _before_tick(self) -> float:
+        for hooks in self.hooks:
+            hooks.before("tick", self.current_dt_utc)
+        return perf_counter()
 
+    def _after_tick(self, tick_started: float):
+        elapsed = perf_counter() - tick_started
+        n_active_cars, n_signals = self.cardinality()
+        for hooks in self.hooks:
+            hooks.after("tick", self.current_dt_utc, elapsed, n_active_cars, n_signals)
@@ -0,0 +1,72 @@
+import heapq
+from datetime import datetime, timedelta
+from enum import Enum
+
+import numpy as np
+
+from common.helper_functions import to_utc_ns
+from logic.session_store import SessionStore
+
+
+class EventType(Enum):
+    SESSION_START = 0
+    SESSION_END = 1
+    SIGNAL_EXPIRY = 2
+    TARGET_REACHED = 3
+
+
+class EventQueue:
+    """
+    Merged, time-ordered queue of the ticks on which the charging of the active cars can change.
+
+    Session starts and ends are loaded once from the session store; signal expiries and
+    target-reached times are pushed while the simulation runs. Events are kept on the
+    dispatcher's tick grid (`start_dt_utc + k * timestep`); session starts and ends are
+    rounded up to the first tick on which the car is plugged in or gone.
+    """
+
+    def __init__(self,
+                 session_store: SessionStore,
+                 start_dt_utc: datetime,
+                 timestep: timedelta):
+        self.session_store = session_store
+        self.origin_ns = to_utc_ns(start_dt_utc)
+        self.step_ns = int(timestep.total_seconds() * 1e9)
+
+        self._heap = []
+        self._push_ticks(session_store.sorted_start_ns, EventType.SESSION_START)
+        self._push_ticks(session_store.sorted_end_ns, EventType.SESSION_END)
+        heapq.heapify(self._heap)
+
+    def push(self, event_ns: int, event_type: EventType):
+        if self.is_on_grid(event_ns):
+            heapq.heappush(self._heap, (event_ns, event_type.value))
+
+    def push_many(self, events_ns: np.ndarray, event_type: EventType):
+        for event_ns in np.unique(events_ns[self._on_grid(events_ns)]).tolist():
+            heapq.heappush(self._heap, (event_ns, event_type.value))
+
+    def next_event_ns(self, after_ns: int) -> int:
+        """Drops events at or before `after_ns` and returns the time of the next one (None if empty)."""
+        while self._heap and self._heap[0][0] <= after_ns:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def next_session_start_tick_ns(self, after_ns: int) -> int:
+        """First grid tick at which a session starting after `after_ns` is plugged in (None if none)."""
+        start_ns = self.session_store.next_start_ns(after_ns)
+        return None if start_ns is None else self.snap_up(start_ns)
+
+    def snap_up(self, event_ns):
+        """Rounds a time (or an array of times) up to the next tick on the grid."""
+        return self.origin_ns - ((self.origin_ns - event_ns) // self.step_ns) * self.step_ns
+
+    def is_on_grid(self, event_ns: int) -> bool:
+        return event_ns >= self.origin_ns and (event_ns - self.origin_ns) % self.step_ns == 0
+
+    def _on_grid(self, events_ns: np.ndarray) -> np.ndarray:
+        return (events_ns >= self.origin_ns) & ((events_ns - self.origin_ns) % self.step_ns == 0)
+
+    def _push_ticks(self, events_ns: np.ndarray, event_type: EventType):
+        ticks_ns = np.unique(self.snap_up(events_ns[events_ns >= self.origin_ns]))
+        self._heap.extend((event_ns, event_type.value) for event_ns in ticks_ns.tolist())
@@ -0,0 +1,167 @@
+import csv
+import marshal
+from collections import defaultdict
+from datetime import datetime
+from time import perf_counter
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+
+class DispatcherHooks:
+    """
+    Base class for opt-in dispatcher instrumentation.
+
+    Register an instance with `Dispatcher.add_hooks` and override the callbacks you need.
+    `stage` is one of `STAGES`. The after-callback receives the wall time of the stage and
+    the cardinality at that moment: the number of active cars and of current signals.
+    In event-driven runs only the evaluated ticks are reported.
+    """
+    STAGES = ("tick", "trigger", "optimize", "charge", "log")
+
+    def before(self,
+               stage: str,
+               current_dt_utc: datetime):
+        pass
+
+    def after(self,
+              stage: str,
+              current_dt_utc: datetime,
+              elapsed_seconds: float,
+              n_active_cars: int,
+              n_signals: int):
+        pass
+
+
+class StageTimer:
+    """Wraps a component method so that every call is reported to the dispatcher's hooks."""
+    def __init__(self,
+                 stage: str,
+                 method: Callable,
+                 dispatcher):
+        self.stage = stage
+        self.method = method
+        self.dispatcher = dispatcher
+
+    def __call__(self, *args, **kwargs):
+        hooks = self.dispatcher.hooks
+        current_dt_utc = self.dispatcher.current_dt_utc
+        for hook in hooks:
+            hook.before(self.stage, current_dt_utc)
+        started = perf_counter()
+        result = self.method(*args, **kwargs)
+        elapsed = perf_counter() - started
+        n_active_cars, n_signals = self.dispatcher.cardinality()
+        for hook in hooks:
+            hook.after(self.stage, current_dt_utc, elapsed, n_active_cars, n_signals)
+        return result
+
+
+class HistogramCollector(DispatcherHooks):
+    """
+    Aggregates stage timings into log-spaced histograms.
+
+    Parameters:
+        min_seconds (float): Lower edge of the first timing bin.
+        max_seconds (float): Upper edge of the last timing bin; slower calls land in it.
+        bins_per_decade (int): Resolution of the histogram.
+    """
+    def __init__(self,
+                 min_seconds: float = 1e-7,
+                 max_seconds: float = 1e2,
+                 bins_per_decade: int = 10):
+        decades = np.log10(max_seconds) - np.log10(min_seconds)
+        self.bin_edges = np.logspace(np.log10(min_seconds), np.log10(max_seconds),
+                                     int(round(decades * bins_per_decade)) + 1)
+        self.counts = defaultdict(lambda: np.zeros(len(self.bin_edges) - 1, dtype=np.int64))
+        self.total_seconds = defaultdict(float)
+        self.max_seconds = defaultdict(float)
+        self.active_cars = defaultdict(int)
+        self.signals = defaultdict(int)
+
+    def after(self,
+              stage: str,
+              current_dt_utc: datetime,
+              elapsed_seconds: float,
+              n_active_cars: int,
+              n_signals: int):
+        position = int(np.searchsorted(self.bin_edges, elapsed_seconds, side="right")) - 1
+        self.counts[stage][min(max(position, 0), len(self.bin_edges) - 2)] += 1
+        self.total_seconds[stage] += elapsed_seconds
+        self.max_seconds[stage] = max(self.max_seconds[stage], elapsed_seconds)
+        self.active_cars[stage] += n_active_cars
+        self.signals[stage] += n_signals
+
+    def calls(self, stage: str) -> int:
+        return int(self.counts[stage].sum()) if stage in self.counts else 0
+
+    def quantile(self, stage: str, q: float) -> float:
+        """
+        Estimates a timing quantile by interpolating (log-linearly) within the bin that
+        contains it, capped at the slowest call seen.
+        """
+        counts = self.counts[stage]
+        if not counts.sum():
+            return float("nan")
+        cumulative = np.cumsum(counts)
+        rank = q * cumulative[-1]
+        if rank > 0:
+            position = min(int(np.searchsorted(cumulative, rank, side="left")), len(counts) - 1)
+        else:
+            position = int(np.flatnonzero(counts)[0])
+        fraction = (rank - (cumulative[position] - counts[position])) / counts[position]
+        lower, upper = self.bin_edges[position], self.bin_edges[position + 1]
+        return float(min(lower * (upper / lower) ** fraction, self.max_seconds[stage]))
+
+    def summary(self) -> pd.DataFrame:
+        rows = []
+        for stage in self._stages():
+            calls = self.calls(stage)
+            rows.append({
+                "stage": stage,
+                "calls": calls,
+                "total_seconds": self.total_seconds[stage],
+                "mean_seconds": self.total_seconds[stage] / calls,
+                "p50_seconds": self.quantile(stage, 0.5),
+                "p99_seconds": self.quantile(stage, 0.99),
+                "max_seconds": self.max_seconds[stage],
+                "mean_active_cars": self.active_cars[stage] / calls,
+                "mean_signals": self.signals[stage] / calls,
+            })
+        return pd.DataFrame(rows)
+
+    def to_csv(self, path: str):
+        """Writes one row per stage and timing bin."""
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["stage", "bin_lower_seconds", "bin_upper_seconds", "count"])
+            for stage in self._stages():
+                for lower, upper, count in zip(self.bin_edges[:-1], self.bin_edges[1:], self.counts[stage]):
+                    if count:
+                        writer.writerow([stage, f"{lower:.3e}", f"{upper:.3e}", int(count)])
+
+    def dump_stats(self, path: str):
+        """
+        Writes the stage totals in the marshal format of `cProfile`, so they load with
+        `pstats.Stats(path)` and tools such as snakeviz. Stages other than "tick" are
+        reported as callees of the tick.
+        """
+        tick = ("dispatcher", 0, "tick")
+        stats = {}
+        child_seconds = 0.0
+        for stage in self._stages():
+            if stage == "tick":
+                continue
+            calls, seconds = self.calls(stage), self.total_seconds[stage]
+            callers = {tick: (calls, calls, seconds, seconds)} if "tick" in self.counts else {}
+            stats[("dispatcher", 0, stage)] = (calls, calls, seconds, seconds, callers)
+            child_seconds += seconds
+        if "tick" in self.counts:
+            calls, seconds = self.calls("tick"), self.total_seconds["tick"]
+            stats[tick] = (calls, calls, max(seconds - child_seconds, 0.0), seconds, {})
+        with open(path, "wb") as f:
+            marshal.dump(stats, f)
+
+    def _stages(self) -> list:
+        return [stage for stage in self.STAGES if stage in self.counts]
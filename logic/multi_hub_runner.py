@@ -0,0 +1,248 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from common import schemas
+from common.helper_functions import to_utc_ns, series_to_utc_ns, ns_to_utc_timestamp
+from logic.dispatcher import Dispatcher
+from logic.simulation import build_dispatcher, session_period
+
+
+class HubConfig:
+    """
+    Inputs of one charging site.
+
+    Parameters:
+        hub_id (str): Name of the site, added as `hub_id` column to the merged logs.
+        sessions (pd.DataFrame): Charging sessions of the site.
+        meter_values (pd.DataFrame): Smart meter values of the site.
+        energy_forecast (pd.DataFrame, optional): Energy forecast of the site.
+        max_gridpower_kw (float): Grid connection limit of the site.
+    """
+    def __init__(self,
+                 hub_id: str,
+                 sessions: pd.DataFrame,
+                 meter_values: pd.DataFrame,
+                 energy_forecast: pd.DataFrame = None,
+                 max_gridpower_kw: float = 100):
+        self.hub_id = hub_id
+        self.sessions = sessions
+        self.meter_values = meter_values
+        self.energy_forecast = energy_forecast
+        self.max_gridpower_kw = max_gridpower_kw
+
+
+class SharedArrays:
+    """
+    Packs named NumPy arrays into one shared memory block.
+
+    Workers attach to the block by name with `attach`, so the arrays are not pickled to
+    every process. The creating process owns the block and releases it with `unlink`.
+    """
+    ALIGNMENT = 64
+
+    def __init__(self, arrays: dict):
+        self.layout = {}
+        size = 0
+        for key, array in arrays.items():
+            self.layout[key] = (size, array.dtype.str, array.shape)
+            size += -(-array.nbytes // self.ALIGNMENT) * self.ALIGNMENT
+
+        self._shm = SharedMemory(create=True, size=max(size, 1))
+        self.name = self._shm.name
+        for key, array in arrays.items():
+            offset, dtype, shape = self.layout[key]
+            np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset)[...] = array
+
+    def unlink(self):
+        self._shm.close()
+        self._shm.unlink()
+
+    @staticmethod
+    def attach(name: str, layout: dict) -> tuple:
+        """Returns the attached block and read-only views on its arrays; close the block after use."""
+        shm = SharedMemory(name=name)
+        views = {}
+        for key, (offset, dtype, shape) in layout.items():
+            view = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            view.flags.writeable = False
+            views[key] = view
+        return shm, views
+
+    @staticmethod
+    def pack_frame(frame: pd.DataFrame, prefix: str, arrays: dict) -> list:
+        """
+        Adds the columns of `frame` to `arrays`; returns (column, kind, key) per column.
+
+        Other columns (ids) are integer-coded once here: the codes as int32 and the
+        categories as a fixed-width unicode array under `{key}/categories`, so every
+        column crosses as a plain NumPy buffer and only the layout is pickled.
+        """
+        columns = []
+        for column in frame.columns:
+            key = f"{prefix}/{column}"
+            values = frame[column]
+            if pd.api.types.is_datetime64_any_dtype(values):
+                arrays[key] = series_to_utc_ns(values)
+                columns.append((column, "datetime", key))
+            elif pd.api.types.is_numeric_dtype(values) or pd.api.types.is_bool_dtype(values):
+                arrays[key] = values.to_numpy()
+                columns.append((column, "number", key))
+            else:
+                if isinstance(values.dtype, pd.CategoricalDtype):
+                    codes, categories = values.cat.codes.to_numpy(), values.cat.categories
+                else:
+                    codes, categories = pd.factorize(values)
+                arrays[key] = codes.astype(np.int32)
+                arrays[f"{key}/categories"] = np.asarray(categories.astype(str), dtype=str)
+                columns.append((column, "category", key))
+        return columns
+
+    @staticmethod
+    def unpack_frame(columns: list, views: dict) -> pd.DataFrame:
+        """Rebuilds a frame from its shared columns; the values are copied out of the block."""
+        data = {}
+        for column, kind, key in columns:
+            if kind == "datetime":
+                data[column] = pd.to_datetime(views[key].copy(), utc=True)
+            elif kind == "number":
+                data[column] = views[key].copy()
+            else:
+                categories = pd.Index(views[f"{key}/categories"].astype(object))
+                data[column] = pd.Categorical.from_codes(views[key].copy(), categories=categories)
+        return pd.DataFrame(data)
+
+
+class MultiHubRunner:
+    """
+    Simulates many charging sites in parallel, one `Dispatcher` per site in a process pool.
+
+    The input frames of all sites are packed column by column into one shared memory
+    block: datetimes as int64 epoch nanoseconds, numbers as they are and id columns as
+    integer codes plus their categories. Only the column layout is pickled to the
+    workers. The logs of all sites are merged into one frame with a `hub_id` column.
+
+    Parameters:
+        hubs (list): `HubConfig` per site.
+        timestep (timedelta): Dispatcher timestep.
+        mode (str): Dispatcher run mode, see `Dispatcher.RUN_MODES`.
+        max_workers (int, optional): Number of worker processes, defaults to the CPU count.
+            With 1 the sites run one after the other in this process.
+    """
+    FRAMES = ("sessions", "meter_values", "energy_forecast")
+
+    def __init__(self,
+                 hubs: list,
+                 timestep: timedelta = timedelta(minutes=15),
+                 mode: str = "fixed",
+                 max_workers: int = None):
+        hub_ids = [hub.hub_id for hub in hubs]
+        if len(set(hub_ids)) != len(hub_ids):
+            raise ValueError("Error: hub ids must be unique.")
+        if mode not in Dispatcher.RUN_MODES:
+            raise ValueError(f"Error: unknown run mode '{mode}', expected one of {Dispatcher.RUN_MODES}.")
+        for hub in hubs:
+            self._validate(hub)
+        self.hubs = hubs
+        self.timestep = timestep
+        self.mode = mode
+        self.max_workers = max_workers
+
+    def run(self,
+            start_dt_utc: datetime = None,
+            end_dt_utc: datetime = None) -> pd.DataFrame:
+        """
+        Runs all sites and returns the merged logs. Without a start or end time every site
+        runs from its first session start up to its last session end.
+        """
+        arrays, specs = {}, []
+        for position, hub in enumerate(self.hubs):
+            frames = {}
+            for frame_name in self.FRAMES:
+                frame = getattr(hub, frame_name)
+                if frame is not None and not frame.empty:
+                    frames[frame_name] = SharedArrays.pack_frame(frame, f"{position}/{frame_name}", arrays)
+            specs.append((hub.hub_id, hub.max_gridpower_kw, frames))
+
+        start_ns = None if start_dt_utc is None else to_utc_ns(start_dt_utc)
+        end_ns = None if end_dt_utc is None else to_utc_ns(end_dt_utc)
+        shared = SharedArrays(arrays)
+        try:
+            args = [(shared.name, shared.layout, spec, start_ns, end_ns, self.timestep, self.mode) for spec in specs]
+            if self.max_workers == 1:
+                logs = [_run_hub(*hub_args) for hub_args in args]
+            else:
+                # Largest sites first, so a long site does not start last
+                order = sorted(range(len(args)), key=lambda i: -len(self.hubs[i].sessions))
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    futures = {i: executor.submit(_run_hub, *args[i]) for i in order}
+                    logs = [futures[i].result() for i in range(len(args))]
+        finally:
+            shared.unlink()
+        return self._merge_logs(logs)
+
+    @staticmethod
+    def _validate(hub: HubConfig):
+        """
+        Checks and casts the inputs of a site up front, so a worker does not fail halfway
+        through a run. The cast frames replace the ones on `hub`.
+        """
+        if hub.sessions is None or hub.sessions.empty:
+            return
+        if hub.meter_values is None or hub.meter_values.empty:
+            raise ValueError(f"Error: hub '{hub.hub_id}' has sessions but no meter values.")
+        hub.sessions = schemas.apply_schema(hub.sessions, schemas.session, f"hub '{hub.hub_id}' session")
+        hub.meter_values = schemas.apply_schema(hub.meter_values, schemas.meter_value, f"hub '{hub.hub_id}' meter value")
+        if hub.energy_forecast is not None and not hub.energy_forecast.empty:
+            hub.energy_forecast = schemas.apply_schema(hub.energy_forecast, schemas.energy_forecast,
+                                                       f"hub '{hub.hub_id}' energy forecast")
+
+    @staticmethod
+    def _merge_logs(logs: list) -> pd.DataFrame:
+        logs = [hub_logs for hub_logs in logs if len(hub_logs)]
+        if not logs:
+            return pd.DataFrame(columns=["hub_id", "timestamp", "car_id", "charged_energy_kwh"])
+        return pd.DataFrame({
+            "hub_id": union_categoricals([hub_logs["hub_id"] for hub_logs in logs]),
+            "timestamp": pd.concat([hub_logs["timestamp"] for hub_logs in logs], ignore_index=True),
+            "car_id": union_categoricals([hub_logs["car_id"] for hub_logs in logs]),
+            "charged_energy_kwh": np.concatenate([hub_logs["charged_energy_kwh"].to_numpy() for hub_logs in logs]),
+        })
+
+
+def _run_hub(shm_name: str,
+             layout: dict,
+             spec: tuple,
+             start_ns: int,
+             end_ns: int,
+             timestep: timedelta,
+             mode: str) -> pd.DataFrame:
+    """Worker: simulates one site from the shared inputs and returns its logs."""
+    hub_id, max_gridpower_kw, frames = spec
+    shm, views = SharedArrays.attach(shm_name, layout)
+    try:
+        data = {frame_name: SharedArrays.unpack_frame(columns, views) for frame_name, columns in frames.items()}
+    finally:
+        del views
+        shm.close()
+
+    sessions = data.get("sessions")
+    if sessions is None:
+        return pd.DataFrame()
+    energy_forecast = data.get("energy_forecast")
+
+    dispatcher = build_dispatcher(sessions, data["meter_values"], energy_forecast, timestep, max_gridpower_kw)
+    start_time, end_time = session_period(sessions, timestep)
+    if start_ns is not None:
+        start_time = ns_to_utc_timestamp(start_ns)
+    if end_ns is not None:
+        end_time = ns_to_utc_timestamp(end_ns)
+    dispatcher.run(start_time, end_time, timestep, mode=mode)
+
+    logs = dispatcher.charging_logger.get_logs()
+    logs.insert(0, "hub_id", pd.Categorical([hub_id] * len(logs)))
+    return logs
@@ -1,9 +1,248 @@
+import numpy as np
+import pandas as pd
+from collections import Counter
+from datetime import datetime, timedelta
+
+from common.helper_functions import to_utc_ns, series_to_utc_ns
+
+
 class Optimizer:
-    def __init__(self):
-        pass
+    """
+    Plans the charging of all active cars over the remaining horizon as one linear program.
+
+    Decision variables are the energy x[i, t] charged by car i in slot t (only for slots
+    before the car leaves) and the grid import g[t] per slot. The problem is built in one
+    step as sparse matrices and solved with HiGHS:
+
+        minimize    sum(-1 + earliness * t) * x[i, t] + grid_weight * sum(g[t])
+        subject to  sum_t x[i, t]          <= remaining target energy of car i
+                    sum_i x[i, t] - g[t]   <= max(surplus[t], 0)
+                    0 <= x[i, t] <= charging_speed_kw[i] * timestep
+                    0 <= g[t]    <= max(max_gridpower_kw * timestep + min(surplus[t], 0), 0)
+
+    so delivered energy is maximized first, then grid import is avoided where the forecast
+    surplus allows, and otherwise earlier slots are preferred.
+
+    Parameters:
+        energy_forecast (pd.DataFrame, optional): Forecast with `start_dt_utc`, `end_dt_utc`
+            and `energy_kwh` (solar minus office consumption). No surplus is assumed without it.
+        max_gridpower_kw (float): Grid connection limit of the hub.
+        timestep (timedelta): Length of a planning slot, equal to the dispatcher timestep.
+        grid_weight (float): Cost per kWh of grid import relative to 1 per kWh delivered.
+        earliness (float): Cost per slot of delay, keeps the schedule front-loaded.
+        incremental (bool): Reuse the previous schedule when a trigger only moved the
+            horizon or changed a few cars, instead of solving from scratch.
+        max_repair_changes (int): Most cars that may arrive or leave for a repair.
+        max_repair_cars (int): Most cars with an energy deficit the repair may reschedule.
+        max_repairs (int): Repairs in a row before a full solve is forced again.
+
+    Incremental re-optimization: the previous schedule is kept per session. On the next
+    call it is shifted to the new horizon start, rows of departed cars are dropped, every
+    row is trimmed to the car's new remaining energy and its remaining slots, and cars
+    that are short of energy (new arrivals or under-delivery) are filled greedily into
+    the residual slot capacity in order of departure. scipy's HiGHS interface has no
+    warm-start entry point, so when the change is too large for a repair the problem is
+    solved again from scratch.
+    """
+    SIGNAL_COLUMNS = ["car_id", "start_dt_utc", "end_dt_utc", "energy_kwh"]
+
+    def __init__(self,
+                 energy_forecast: pd.DataFrame = None,
+                 max_gridpower_kw: float = 100,
+                 timestep: timedelta = timedelta(minutes=15),
+                 grid_weight: float = 0.1,
+                 earliness: float = 1e-4,
+                 tolerance_kwh: float = 1e-6,
+                 incremental: bool = True,
+                 max_repair_changes: int = 4,
+                 max_repair_cars: int = 32,
+                 max_repairs: int = 12):
+        self.max_gridpower_kw = max_gridpower_kw
+        self.timestep = timestep
+        self.grid_weight = grid_weight
+        self.earliness = earliness
+        self.tolerance_kwh = tolerance_kwh
+        self.incremental = incremental
+        self.max_repair_changes = max_repair_changes
+        self.max_repair_cars = max_repair_cars
+        self.max_repairs = max_repairs
+
+        if energy_forecast is None or energy_forecast.empty:
+            self._forecast_start_ns = np.empty(0, dtype=np.int64)
+            self._forecast_cumsum_kwh = np.zeros(1)
+        else:
+            energy_forecast = energy_forecast.sort_values("start_dt_utc")
+            self._forecast_start_ns = series_to_utc_ns(energy_forecast["start_dt_utc"])
+            self._forecast_cumsum_kwh = np.concatenate(([0.0], np.cumsum(energy_forecast["energy_kwh"].to_numpy(dtype="float64"))))
+
+        self.last_schedule = None
+        self.stats = Counter()
+        self._plan_keys = None
+        self._plan_start_ns = None
+        self._repairs_since_solve = 0
 
     def optimize_sessions(self,
-                          current_time,
-                          test,
-                          ):
-        pass
\ No newline at end of file
+                          current_time: datetime,
+                          charging_cars: pd.DataFrame,
+                          ) -> pd.DataFrame:
+        """
+        Returns one signal per car: the energy to charge in the current slot, valid until the
+        planned energy of that car changes (`end_dt_utc`), so the trigger checker re-plans then.
+        """
+        if charging_cars.empty:
+            self._plan_keys = None
+            return pd.DataFrame(columns=self.SIGNAL_COLUMNS)
+
+        current_ns = to_utc_ns(current_time)
+        step_ns = int(self.timestep.total_seconds() * 1e9)
+        step_h = self.timestep.total_seconds() / 3600
+
+        remaining_kwh = np.maximum((charging_cars["target_energy_kwh"] - charging_cars["charged_energy_kwh"]).to_numpy(dtype="float64"), 0)
+        max_slot_kwh = charging_cars["charging_speed_kw"].to_numpy(dtype="float64") * step_h
+        end_ns = series_to_utc_ns(charging_cars["end_dt_utc"])
+        # Slots that start before the car leaves; at least the current one
+        n_slots = np.maximum(-((current_ns - end_ns) // step_ns), 1)
+
+        # Sessions are matched on their store slot when available, a car has one session at a time
+        keys = charging_cars["session_idx" if "session_idx" in charging_cars else "car_id"].to_numpy()
+
+        schedule = None
+        if self.incremental and self._plan_keys is not None:
+            schedule = self._repair(keys, remaining_kwh, max_slot_kwh, end_ns, n_slots, current_ns, step_ns, step_h)
+        if schedule is None:
+            schedule = self._solve(remaining_kwh, max_slot_kwh, n_slots, current_ns, step_ns, step_h)
+            self.stats["solve"] += 1
+            self._repairs_since_solve = 0
+        self.last_schedule = schedule
+        self._plan_keys = keys
+        self._plan_start_ns = current_ns
+
+        # A signal holds until the planned energy of the car changes
+        changes = np.abs(schedule - schedule[:, [0]]) > self.tolerance_kwh
+        changes[:, 0] = False
+        changes |= np.arange(schedule.shape[1]) >= n_slots[:, None]
+        first_change = np.where(changes.any(axis=1), changes.argmax(axis=1), n_slots)
+
+        return pd.DataFrame({
+            "car_id": charging_cars["car_id"].to_numpy(),
+            "start_dt_utc": pd.to_datetime(np.full(len(charging_cars), current_ns), utc=True),
+            "end_dt_utc": pd.to_datetime(current_ns + first_change * step_ns, utc=True),
+            "energy_kwh": schedule[:, 0],
+        })
+
+    def snapshot(self) -> dict:
+        """The previous schedule and repair bookkeeping, for checkpointing."""
+        return {
+            "last_schedule": self.last_schedule,
+            "plan_keys": self._plan_keys,
+            "plan_start_ns": self._plan_start_ns,
+            "repairs_since_solve": self._repairs_since_solve,
+            "stats": dict(self.stats),
+        }
+
+    def restore(self, snapshot: dict):
+        self.last_schedule = snapshot["last_schedule"]
+        self._plan_keys = snapshot["plan_keys"]
+        self._plan_start_ns = snapshot["plan_start_ns"]
+        self._repairs_since_solve = snapshot["repairs_since_solve"]
+        self.stats = Counter(snapshot["stats"])
+
+    def _solve(self,
+               remaining_kwh: np.ndarray,
+               max_slot_kwh: np.ndarray,
+               n_slots: np.ndarray,
+               current_ns: int,
+               step_ns: int,
+               step_h: float) -> np.ndarray:
+        """Builds and solves the horizon LP; returns the schedule as a dense (cars x slots) array."""
+        # scipy is imported on the first solve, it is a large share of the import time otherwise
+        from scipy import sparse
+        from scipy.optimize import linprog
+
+        n_cars = len(remaining_kwh)
+        horizon = int(n_slots.max())
+
+        # One x variable per (car, slot) pair before the car leaves, then one g per slot
+        car_of_x = np.repeat(np.arange(n_cars), n_slots)
+        slot_of_x = np.arange(len(car_of_x)) - np.repeat(np.cumsum(n_slots) - n_slots, n_slots)
+        n_x = len(car_of_x)
+
+        surplus_kwh, grid_limit_kwh = self._slot_limits(current_ns, step_ns, step_h, horizon)
+
+        cost = np.concatenate((-1 + self.earliness * slot_of_x, np.full(horizon, self.grid_weight)))
+        rows = np.concatenate((car_of_x, n_cars + slot_of_x, n_cars + np.arange(horizon)))
+        cols = np.concatenate((np.arange(n_x), np.arange(n_x), n_x + np.arange(horizon)))
+        values = np.concatenate((np.ones(2 * n_x), -np.ones(horizon)))
+        A_ub = sparse.csr_array((values, (rows, cols)), shape=(n_cars + horizon, n_x + horizon))
+        b_ub = np.concatenate((remaining_kwh, np.maximum(surplus_kwh, 0)))
+        bounds = np.column_stack((np.zeros(n_x + horizon), np.concatenate((max_slot_kwh[car_of_x], grid_limit_kwh))))
+
+        solution = linprog(cost, A_ub=A_ub, b_ub=b_ub, bounds=bounds, method="highs")
+        if solution.status != 0:
+            raise RuntimeError(f"Error: charging optimization failed ({solution.message}).")
+
+        schedule = np.zeros((n_cars, horizon))
+        schedule[car_of_x, slot_of_x] = np.maximum(solution.x[:n_x], 0)
+        return schedule
+
+    def _repair(self,
+                keys: np.ndarray,
+                remaining_kwh: np.ndarray,
+                max_slot_kwh: np.ndarray,
+                end_ns: np.ndarray,
+                n_slots: np.ndarray,
+                current_ns: int,
+                step_ns: int,
+                step_h: float) -> np.ndarray:
+        """Adapts the previous schedule to the new situation; returns None when a full solve is needed."""
+        shift_ns = current_ns - self._plan_start_ns
+        if shift_ns < 0 or shift_ns % step_ns or self._repairs_since_solve >= self.max_repairs:
+            return None
+        previous = pd.Index(self._plan_keys).get_indexer(keys)
+        kept = previous >= 0
+        n_changes = int((~kept).sum()) + len(self._plan_keys) - int(kept.sum())
+        if n_changes > self.max_repair_changes:
+            return None
+
+        # Move the horizon start and drop departed cars
+        horizon = int(n_slots.max())
+        shifted = self.last_schedule[:, shift_ns // step_ns:]
+        width = min(shifted.shape[1], horizon)
+        schedule = np.zeros((len(keys), horizon))
+        schedule[kept, :width] = shifted[previous[kept], :width]
+
+        # Respect the remaining slots, the speed cap and the remaining energy (trimmed from the end)
+        valid = np.arange(horizon) < n_slots[:, None]
+        schedule = np.minimum(np.where(valid, schedule, 0), max_slot_kwh[:, None])
+        schedule = np.diff(np.minimum(np.cumsum(schedule, axis=1), remaining_kwh[:, None]), axis=1, prepend=0)
+
+        surplus_kwh, grid_limit_kwh = self._slot_limits(current_ns, step_ns, step_h, horizon)
+        residual_kwh = np.maximum(surplus_kwh, 0) + grid_limit_kwh - schedule.sum(axis=0)
+        if (residual_kwh < -self.tolerance_kwh).any():
+            return None
+
+        deficit_kwh = remaining_kwh - schedule.sum(axis=1)
+        short = np.flatnonzero(deficit_kwh > self.tolerance_kwh)
+        if len(short) > self.max_repair_cars:
+            return None
+        for car in short[np.argsort(end_ns[short], kind="stable")].tolist():
+            headroom = np.clip(np.minimum((max_slot_kwh[car] - schedule[car]) * valid[car], residual_kwh), 0, None)
+            fill = np.diff(np.minimum(np.cumsum(headroom), deficit_kwh[car]), prepend=0)
+            schedule[car] += fill
+            residual_kwh -= fill
+
+        self.stats["repair" if n_changes or len(short) else "shift"] += 1
+        self._repairs_since_solve += 1
+        return schedule
+
+    def _slot_limits(self, current_ns: int, step_ns: int, step_h: float, horizon: int) -> tuple:
+        """Forecast surplus and grid import limit per planning slot."""
+        surplus_kwh = self._forecast_surplus(current_ns, step_ns, horizon)
+        grid_limit_kwh = np.maximum(self.max_gridpower_kw * step_h + np.minimum(surplus_kwh, 0), 0)
+        return surplus_kwh, grid_limit_kwh
+
+    def _forecast_surplus(self, current_ns: int, step_ns: int, horizon: int) -> np.ndarray:
+        """Forecast energy per planning slot; slots without forecast get 0."""
+        slot_edges_ns = current_ns + step_ns * np.arange(horizon + 1)
+        positions = np.searchsorted(self._forecast_start_ns, slot_edges_ns, side="left")
+        return np.diff(self._forecast_cumsum_kwh[positions])
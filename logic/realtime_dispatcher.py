@@ -0,0 +1,199 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+from common.helper_functions import to_utc_ns, series_to_utc_ns, ns_to_utc_timestamp
+from logic.dispatcher import Dispatcher
+
+
+class RealtimeDispatcher:
+    """
+    Runs the components of a `Dispatcher` live instead of replaying history.
+
+    The loop wakes on every timestep and on incoming events (`notify`), for example a new
+    session or a meter update. On a tick it runs the usual trigger check, optimization and
+    charge; on an event it re-optimizes right away so the next tick charges with fresh
+    signals. Every decision has a latency budget. The optimizer runs in a worker thread,
+    and when it overruns the budget (or an earlier overrun is still running) the decision
+    falls back to the last feasible signals, or to a cheap heuristic when those do not
+    cover all plugged-in cars. Fallback signals expire on the next tick, so the optimizer
+    gets another chance then.
+
+    The charging hub keeps reading its `SmartMeter`; events only wake the loop. Simulated
+    time runs `speedup` times faster than wall time, which makes local event feeds (see
+    `replay_events`) practical.
+
+    Parameters:
+        dispatcher (Dispatcher): Provides the trigger checker, optimizer, hub and logger.
+        timestep (timedelta): Length of a tick.
+        latency_budget_seconds (float): Wall time allowed per decision, that is the
+            trigger check and the optimization (or fallback). The charge and log of a
+            tick come on top and are only part of `latencies_seconds`.
+        speedup (float): Simulated seconds per wall second, 1 for live operation.
+    """
+    DECISIONS = ("optimized", "last_signals", "heuristic")
+
+    def __init__(self,
+                 dispatcher: Dispatcher,
+                 timestep: timedelta = timedelta(minutes=15),
+                 latency_budget_seconds: float = 1.0,
+                 speedup: float = 1.0):
+        self.dispatcher = dispatcher
+        self.timestep = timestep
+        self.latency_budget_seconds = latency_budget_seconds
+        self.speedup = speedup
+
+        self.events = asyncio.Queue()
+        self.latencies_seconds = []
+        self.decision_latencies_seconds = []
+        self.decisions = Counter()
+        self.event_counts = Counter()
+        self.result = pd.DataFrame()
+        self.signals = pd.DataFrame()
+        self._last_feasible_signals = None
+        self._optimization = None
+        self._origin_ns = None
+        self._wall_origin = None
+        self._started = asyncio.Event()
+
+    def now(self) -> pd.Timestamp:
+        """Current simulated time."""
+        return ns_to_utc_timestamp(self._origin_ns + int((perf_counter() - self._wall_origin) * self.speedup * 1e9))
+
+    def notify(self, kind: str, event_dt_utc: datetime = None):
+        """Queues an event; call it from the event loop of `run`."""
+        self.events.put_nowait((kind, event_dt_utc))
+
+    async def sleep_until(self, dt_utc: datetime):
+        await self._started.wait()
+        await asyncio.sleep(max(self._seconds_until(dt_utc), 0))
+
+    async def run(self,
+                  start_dt_utc: datetime,
+                  end_dt_utc: datetime):
+        """Runs the loop from `start_dt_utc` up to and including `end_dt_utc` (simulated time)."""
+        self._origin_ns = to_utc_ns(start_dt_utc)
+        self._wall_origin = perf_counter()
+        self._started.set()
+
+        tick = pd.Timestamp(start_dt_utc)
+        while tick <= end_dt_utc:
+            await self._decide_tick(tick)
+            tick += self.timestep
+            while (timeout := self._seconds_until(tick)) > 0:
+                try:
+                    kind, _ = await asyncio.wait_for(self.events.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                await self._handle_event(kind, tick - self.timestep)
+        self.dispatcher.charging_logger.flush()
+
+    def latency_summary(self) -> dict:
+        """
+        Decision latency percentiles in seconds (trigger check and optimization), the number
+        of decisions over the latency budget and the number of decisions per kind. The
+        `tick_` keys hold the latency of whole ticks and events, charge and log included.
+        """
+        decision_latencies = np.array(self.decision_latencies_seconds)
+        summary = {"decisions": len(decision_latencies),
+                   **self._percentiles(decision_latencies),
+                   "over_budget": int((decision_latencies > self.latency_budget_seconds).sum())}
+        summary.update({f"tick_{key}": value for key, value in self._percentiles(np.array(self.latencies_seconds)).items()})
+        summary.update({decision: self.decisions[decision] for decision in self.DECISIONS})
+        return summary
+
+    @staticmethod
+    def _percentiles(latencies: np.ndarray) -> dict:
+        if not len(latencies):
+            return {"p50_seconds": float("nan"), "p99_seconds": float("nan"), "max_seconds": float("nan")}
+        return {"p50_seconds": float(np.percentile(latencies, 50)),
+                "p99_seconds": float(np.percentile(latencies, 99)),
+                "max_seconds": float(latencies.max())}
+
+    async def _decide_tick(self, tick: pd.Timestamp):
+        started = perf_counter()
+        dispatcher = self.dispatcher
+        charging_cars, reoptimize = dispatcher.evaluate_trigger(tick, self.result, self.signals)
+        if reoptimize:
+            self.signals = await self._optimize(tick, charging_cars, started)
+            dispatcher.n_signals = len(self.signals)
+        self.decision_latencies_seconds.append(perf_counter() - started)
+
+        if charging_cars.empty:
+            self.result = pd.DataFrame()
+        else:
+            self.result = dispatcher.charging_hub.charge(self.signals, tick, self.timestep, charging_cars)
+        dispatcher.charging_logger.log(tick, self.result)
+        self.latencies_seconds.append(perf_counter() - started)
+
+    async def _handle_event(self, kind: str, tick: pd.Timestamp):
+        """Re-plans within the current tick; the charge of the tick itself is already booked."""
+        started = perf_counter()
+        self.event_counts[kind] += 1
+        charging_cars = self.dispatcher.charging_hub.get_charging_cars(tick)
+        if not charging_cars.empty:
+            self.signals = await self._optimize(tick, charging_cars, started)
+            self.dispatcher.n_signals = len(self.signals)
+            latency_seconds = perf_counter() - started
+            self.latencies_seconds.append(latency_seconds)
+            self.decision_latencies_seconds.append(latency_seconds)
+
+    async def _optimize(self,
+                        tick: pd.Timestamp,
+                        charging_cars: pd.DataFrame,
+                        started: float) -> pd.DataFrame:
+        if self._optimization is not None and not self._optimization.done():
+            return self._fallback(tick, charging_cars)
+        self._optimization = asyncio.ensure_future(
+            asyncio.to_thread(self.dispatcher.optimizer.optimize_sessions, tick, charging_cars))
+        remaining_seconds = self.latency_budget_seconds - (perf_counter() - started)
+        try:
+            signals = await asyncio.wait_for(asyncio.shield(self._optimization), max(remaining_seconds, 0))
+        except asyncio.TimeoutError:
+            return self._fallback(tick, charging_cars)
+        self.decisions["optimized"] += 1
+        self._last_feasible_signals = signals
+        return signals
+
+    def _fallback(self,
+                  tick: pd.Timestamp,
+                  charging_cars: pd.DataFrame) -> pd.DataFrame:
+        last = self._last_feasible_signals
+        if last is not None and not last.empty and charging_cars["car_id"].isin(last["car_id"]).all():
+            self.decisions["last_signals"] += 1
+            signals = last[last["car_id"].isin(charging_cars["car_id"])].copy()
+        else:
+            self.decisions["heuristic"] += 1
+            signals = self.heuristic_signals(tick, charging_cars)
+        signals["end_dt_utc"] = tick + self.timestep
+        return signals
+
+    def heuristic_signals(self,
+                          tick: pd.Timestamp,
+                          charging_cars: pd.DataFrame) -> pd.DataFrame:
+        """Spreads each car's remaining energy evenly over the ticks until it leaves."""
+        step_ns = int(self.timestep.total_seconds() * 1e9)
+        remaining_kwh = np.maximum((charging_cars["target_energy_kwh"] - charging_cars["charged_energy_kwh"]).to_numpy(dtype="float64"), 0)
+        ticks_left = np.maximum(-((to_utc_ns(tick) - series_to_utc_ns(charging_cars["end_dt_utc"])) // step_ns), 1)
+        return pd.DataFrame({
+            "car_id": charging_cars["car_id"].to_numpy(),
+            "start_dt_utc": tick,
+            "end_dt_utc": tick + self.timestep,
+            "energy_kwh": remaining_kwh / ticks_left,
+        })
+
+    def _seconds_until(self, dt_utc: datetime) -> float:
+        return (to_utc_ns(dt_utc) - self._origin_ns) / 1e9 / self.speedup - (perf_counter() - self._wall_origin)
+
+
+async def replay_events(realtime: RealtimeDispatcher,
+                        event_times: pd.Series,
+                        kind: str):
+    """Local event feed: notifies `realtime` of `kind` at each of the (simulated) `event_times`."""
+    for event_dt_utc in pd.to_datetime(pd.Series(event_times), utc=True).sort_values():
+        await realtime.sleep_until(event_dt_utc)
+        realtime.notify(kind, event_dt_utc)
@@ -0,0 +1,194 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from common.helper_functions import to_utc_ns, series_to_utc_ns, ns_to_utc_timestamp
+from data.energy_forecast_reader import EnergyForecastReader
+from data.meter_value_reader import MeterValueReader
+from logic.dispatcher import Dispatcher
+from logic.multi_hub_runner import SharedArrays
+from logic.simulation import build_dispatcher, session_period
+
+
+class ScenarioSweep:
+    """
+    Monte-Carlo sweep over the forecast and meter noise for one fixed set of sessions.
+
+    Every scenario draws its own forecast and meter values from a seed spawned off `seed`,
+    runs the dispatcher and returns only its KPIs (see `KPIS`). Scenarios run in batches
+    in a process pool; the sessions are shared with the workers through shared memory.
+    The sweep stops early once the confidence interval of every KPI in `stop_kpis` is
+    narrower than `rel_tolerance` times its mean.
+
+    Parameters:
+        sessions (pd.DataFrame): Charging sessions, identical in every scenario.
+        timestep (timedelta): Dispatcher timestep.
+        max_gridpower_kw (float): Grid connection limit of the hub.
+        forecast_config (dict, optional): Configuration of the `EnergyForecastReader`.
+        mode (str): Dispatcher run mode, see `Dispatcher.RUN_MODES`.
+        max_workers (int, optional): Number of worker processes, defaults to the CPU count.
+            With 1 the scenarios run in this process.
+        seed (int): Root seed; scenario i always gets the same data for the same root seed.
+    """
+    KPIS = ("delivered_energy_kwh", "unmet_energy_kwh", "unmet_share", "completed_share",
+            "grid_energy_kwh", "peak_grid_kw")
+
+    def __init__(self,
+                 sessions: pd.DataFrame,
+                 timestep: timedelta = timedelta(minutes=15),
+                 max_gridpower_kw: float = 100,
+                 forecast_config: dict = None,
+                 mode: str = "fixed",
+                 max_workers: int = None,
+                 seed: int = 0):
+        if mode not in Dispatcher.RUN_MODES:
+            raise ValueError(f"Error: unknown run mode '{mode}', expected one of {Dispatcher.RUN_MODES}.")
+        self.sessions = sessions
+        self.timestep = timestep
+        self.max_gridpower_kw = max_gridpower_kw
+        self.forecast_config = forecast_config
+        self.mode = mode
+        self.max_workers = max_workers
+        self.seed = seed
+
+    def run(self,
+            n_scenarios: int,
+            start_dt_utc: datetime = None,
+            end_dt_utc: datetime = None,
+            batch_size: int = None,
+            min_scenarios: int = 10,
+            confidence: float = 0.95,
+            rel_tolerance: float = None,
+            stop_kpis: tuple = ("unmet_energy_kwh", "peak_grid_kw")) -> pd.DataFrame:
+        """
+        Runs up to `n_scenarios` scenarios and returns one row of KPIs per scenario.
+
+        Parameters:
+            batch_size (int, optional): Scenarios per batch between convergence checks,
+                defaults to twice the number of workers.
+            min_scenarios (int): Scenarios to run before the sweep may stop early.
+            confidence (float): Confidence level of the intervals.
+            rel_tolerance (float, optional): Relative half-width of the confidence interval at
+                which a KPI counts as settled. Without it all `n_scenarios` are run.
+            stop_kpis (tuple): KPIs that must settle before the sweep stops.
+        """
+        first_start_dt_utc, last_end_dt_utc = session_period(self.sessions, self.timestep)
+        start_dt_utc = first_start_dt_utc if start_dt_utc is None else start_dt_utc
+        end_dt_utc = last_end_dt_utc if end_dt_utc is None else end_dt_utc
+        start_ns, end_ns = to_utc_ns(start_dt_utc), to_utc_ns(end_dt_utc)
+
+        arrays = {}
+        columns = SharedArrays.pack_frame(self.sessions, "sessions", arrays)
+        seeds = np.random.SeedSequence(self.seed).spawn(n_scenarios)
+        shared = SharedArrays(arrays)
+        rows = []
+        try:
+            args = [(shared.name, shared.layout, columns, scenario, seeds[scenario], start_ns, end_ns,
+                     self.timestep, self.mode, self.max_gridpower_kw, self.forecast_config)
+                    for scenario in range(n_scenarios)]
+            if self.max_workers == 1:
+                for scenario_args in args:
+                    rows.append(_run_scenario(*scenario_args))
+                    if self._settled(rows, min_scenarios, confidence, rel_tolerance, stop_kpis):
+                        break
+            else:
+                with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                    batch_size = batch_size or 2 * (self.max_workers or os.cpu_count())
+                    for batch_start in range(0, n_scenarios, batch_size):
+                        batch = args[batch_start:batch_start + batch_size]
+                        rows.extend(executor.map(_run_scenario, *zip(*batch)))
+                        if self._settled(rows, min_scenarios, confidence, rel_tolerance, stop_kpis):
+                            break
+        finally:
+            shared.unlink()
+        return pd.DataFrame(rows, columns=["scenario", *self.KPIS])
+
+    @classmethod
+    def summarize(cls,
+                  kpis: pd.DataFrame,
+                  confidence: float = 0.95) -> pd.DataFrame:
+        """Mean, confidence interval and quantiles per KPI of a sweep result."""
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        values = kpis[list(cls.KPIS)]
+        half_width = z * values.std(ddof=1) / np.sqrt(len(values))
+        return pd.DataFrame({
+            "mean": values.mean(),
+            "ci_low": values.mean() - half_width,
+            "ci_high": values.mean() + half_width,
+            "p05": values.quantile(0.05),
+            "p50": values.quantile(0.5),
+            "p95": values.quantile(0.95),
+            "max": values.max(),
+        })
+
+    @classmethod
+    def _settled(cls,
+                 rows: list,
+                 min_scenarios: int,
+                 confidence: float,
+                 rel_tolerance: float,
+                 stop_kpis: tuple) -> bool:
+        if rel_tolerance is None or len(rows) < max(min_scenarios, 2):
+            return False
+        z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        for kpi in stop_kpis:
+            values = np.array([row[1 + cls.KPIS.index(kpi)] for row in rows])
+            half_width = z * values.std(ddof=1) / np.sqrt(len(values))
+            if half_width > rel_tolerance * abs(values.mean()):
+                return False
+        return True
+
+
+def _run_scenario(shm_name: str,
+                  layout: dict,
+                  columns: list,
+                  scenario: int,
+                  seed: np.random.SeedSequence,
+                  start_ns: int,
+                  end_ns: int,
+                  timestep: timedelta,
+                  mode: str,
+                  max_gridpower_kw: float,
+                  forecast_config: dict) -> tuple:
+    """Worker: draws the forecast and meter values of one scenario, runs it and returns its KPIs."""
+    shm, views = SharedArrays.attach(shm_name, layout)
+    try:
+        sessions = SharedArrays.unpack_frame(columns, views)
+    finally:
+        del views
+        shm.close()
+
+    rng = np.random.default_rng(seed)
+    start_dt_utc, end_dt_utc = ns_to_utc_timestamp(start_ns), ns_to_utc_timestamp(end_ns)
+    energy_forecast = EnergyForecastReader(None, forecast_config, rng=rng)._generate_dummy_data(start_dt_utc, end_dt_utc + timedelta(days=1))
+    meter_values = MeterValueReader(None, rng=rng)._generate_dummy_data(energy_forecast)
+
+    dispatcher = build_dispatcher(sessions, meter_values, energy_forecast, timestep, max_gridpower_kw)
+    dispatcher.run(start_dt_utc, end_dt_utc, timestep, mode=mode)
+    session_store = dispatcher.charging_hub.session_store
+    smart_meter = dispatcher.charging_hub.smart_meter
+    charging_logger = dispatcher.charging_logger
+
+    # Grid import of the chargers per tick is whatever they charged beyond the local surplus
+    step_ns = int(timestep.total_seconds() * 1e9)
+    n_ticks = (end_ns - start_ns) // step_ns + 1
+    logs = charging_logger.get_logs()
+    tick = (series_to_utc_ns(logs["timestamp"]) - start_ns) // step_ns
+    charged_per_tick_kwh = np.bincount(tick, weights=logs["charged_energy_kwh"].to_numpy(), minlength=n_ticks)
+    surplus_kwh = np.maximum(smart_meter.get_tick_energy(start_dt_utc, n_ticks, timestep), 0)
+    grid_kwh = np.maximum(charged_per_tick_kwh - surplus_kwh, 0)
+
+    delivered_kwh = session_store.charged_energy_kwh.sum()
+    target_kwh = session_store.target_energy_kwh.sum()
+    unmet_kwh = np.maximum(session_store.target_energy_kwh - session_store.charged_energy_kwh, 0).sum()
+    return (scenario,
+            delivered_kwh,
+            unmet_kwh,
+            unmet_kwh / target_kwh if target_kwh else 0.0,
+            session_store.n_completed / len(session_store) if len(session_store) else 0.0,
+            grid_kwh.sum(),
+            grid_kwh.max() / (timestep.total_seconds() / 3600))
@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from common.helper_functions import to_utc_ns, series_to_utc_ns
+
+
+class SessionStore:
+    """
+    Array-backed store for charging sessions.
+
+    The session columns are held as NumPy arrays and the start and end times are kept
+    in sorted order. The store follows the simulation clock with two forward-only
+    cursors and maintains the set of active sessions: a session enters at its start
+    tick and leaves at its end tick or as soon as it reaches its target energy. Moving
+    the clock forward therefore only touches the sessions that changed in that tick.
+
+    Sessions are addressed by their slot, the row position in the original frame; use
+    `slots_of` to map session ids to slots. Car ids are held as int32 codes into
+    `car_ids`, the unique ids; `car_id_of` maps slots to their car ids. Charged energy is updated in place through
+    those slots, so a car with several sessions never mixes up their state. `snapshot`
+    and `restore` copy the mutable state for checkpointing.
+    """
+
+    def __init__(self, sessions: pd.DataFrame):
+        car_id = pd.Categorical(sessions["car_id"])
+        self.car_code = car_id.codes.astype(np.int32)
+        self.car_ids = car_id.categories.to_numpy(dtype=object)
+        self.session_id = sessions["session_id"].to_numpy()
+        self.start_ns = series_to_utc_ns(sessions["start_dt_utc"])
+        self.end_ns = series_to_utc_ns(sessions["end_dt_utc"])
+        self.charging_speed_kw = sessions["charging_speed_kw"].to_numpy(dtype="float64")
+        self.charged_energy_kwh = sessions["charged_energy_kwh"].to_numpy(dtype="float64", copy=True)
+        self.target_energy_kwh = sessions["target_energy_kwh"].to_numpy(dtype="float64")
+
+        self._start_order = np.argsort(self.start_ns, kind="stable")
+        self._end_order = np.argsort(self.end_ns, kind="stable")
+        self.sorted_start_ns = self.start_ns[self._start_order]
+        self.sorted_end_ns = self.end_ns[self._end_order]
+        self._slot_by_session = pd.Index(self.session_id)
+
+        self.reset()
+
+    def __len__(self) -> int:
+        return len(self.start_ns)
+
+    @property
+    def car_id(self) -> np.ndarray:
+        """Car id per slot, built from the codes on every call; prefer `car_id_of`."""
+        return self.car_ids[self.car_code]
+
+    def car_id_of(self, slots: np.ndarray) -> np.ndarray:
+        return self.car_ids[self.car_code[slots]]
+
+    def reset(self):
+        """Rewinds the clock; the active set is rebuilt on the next call to `advance`."""
+        self._start_cursor = 0
+        self._end_cursor = 0
+        self._active = {}  # dict used as an insertion-ordered set of slots
+        self._current_ns = None
+        self.n_completed = 0
+
+    def advance(self, current_dt_utc: datetime):
+        """Moves the clock forward to `current_dt_utc` and updates the active set."""
+        current_ns = to_utc_ns(current_dt_utc)
+        if self._current_ns is not None and current_ns < self._current_ns:
+            self.reset()
+        self._current_ns = current_ns
+
+        start_cursor = int(np.searchsorted(self.sorted_start_ns, current_ns, side="right"))
+        for slot in self._start_order[self._start_cursor:start_cursor].tolist():
+            if self.end_ns[slot] > current_ns and self.charged_energy_kwh[slot] < self.target_energy_kwh[slot]:
+                self._active[slot] = None
+        self._start_cursor = start_cursor
+
+        end_cursor = int(np.searchsorted(self.sorted_end_ns, current_ns, side="right"))
+        for slot in self._end_order[self._end_cursor:end_cursor].tolist():
+            self._active.pop(slot, None)
+        self._end_cursor = end_cursor
+
+    @property
+    def n_active(self) -> int:
+        return len(self._active)
+
+    def active_slots(self) -> np.ndarray:
+        return np.fromiter(self._active, dtype=np.int64, count=len(self._active))
+
+    def get_active_frame(self) -> pd.DataFrame:
+        """Returns the active sessions as a DataFrame with a `session_idx` slot column."""
+        return self.to_frame(self.active_slots())
+
+    def add_energy(self, slots: np.ndarray, energy_kwh: np.ndarray):
+        """Adds charged energy to the given slots and drops sessions that reached their target."""
+        slots = np.asarray(slots, dtype=np.int64)
+        self.set_energy(slots, self.charged_energy_kwh[slots] + energy_kwh)
+
+    def set_energy(self, slots: np.ndarray, charged_energy_kwh: np.ndarray):
+        """Sets the charged energy of the given slots and drops sessions that reached their target."""
+        slots = np.asarray(slots, dtype=np.int64)
+        self.charged_energy_kwh[slots] = charged_energy_kwh
+        for slot in slots[self.charged_energy_kwh[slots] >= self.target_energy_kwh[slots]].tolist():
+            if self._active.pop(slot, False) is None:
+                self.n_completed += 1
+
+    def slots_of(self, session_ids) -> np.ndarray:
+        """Maps session ids to their slots."""
+        slots = self._slot_by_session.get_indexer(np.atleast_1d(session_ids))
+        if (slots < 0).any():
+            raise ValueError(f"Error: unknown session ids {np.atleast_1d(session_ids)[slots < 0][:5].tolist()}.")
+        return slots.astype(np.int64)
+
+    def snapshot(self) -> dict:
+        """Copies the mutable state: charged energy, clock, cursors and active set."""
+        return {
+            "charged_energy_kwh": self.charged_energy_kwh.copy(),
+            "active_slots": self.active_slots(),
+            "start_cursor": self._start_cursor,
+            "end_cursor": self._end_cursor,
+            "current_ns": self._current_ns,
+            "n_completed": self.n_completed,
+        }
+
+    def restore(self, snapshot: dict):
+        """Restores a state taken with `snapshot` on a store of the same sessions."""
+        if len(snapshot["charged_energy_kwh"]) != len(self):
+            raise ValueError("Error: snapshot does not match the sessions of this store.")
+        self.charged_energy_kwh[:] = snapshot["charged_energy_kwh"]
+        self._active = dict.fromkeys(np.asarray(snapshot["active_slots"], dtype=np.int64).tolist())
+        self._start_cursor = int(snapshot["start_cursor"])
+        self._end_cursor = int(snapshot["end_cursor"])
+        self._current_ns = None if snapshot["current_ns"] is None else int(snapshot["current_ns"])
+        self.n_completed = int(snapshot["n_completed"])
+
+    def next_start_ns(self, after_ns: int) -> int:
+        """Start time of the first session starting after `after_ns` (None if there is none)."""
+        position = np.searchsorted(self.sorted_start_ns, after_ns, side="right")
+        return int(self.sorted_start_ns[position]) if position < len(self.sorted_start_ns) else None
+
+    def starts_at(self, current_dt_utc: datetime) -> bool:
+        return self._contains(self.sorted_start_ns, to_utc_ns(current_dt_utc))
+
+    def ends_at(self, current_dt_utc: datetime) -> bool:
+        return self._contains(self.sorted_end_ns, to_utc_ns(current_dt_utc))
+
+    def to_frame(self, slots: np.ndarray = None) -> pd.DataFrame:
+        """Builds a sessions DataFrame for the given slots (all sessions by default)."""
+        if slots is None:
+            slots = np.arange(len(self), dtype=np.int64)
+        return pd.DataFrame({
+            "session_idx": slots,
+            "car_id": self.car_id_of(slots),
+            "session_id": self.session_id[slots],
+            "start_dt_utc": pd.to_datetime(self.start_ns[slots], utc=True),
+            "end_dt_utc": pd.to_datetime(self.end_ns[slots], utc=True),
+            "charging_speed_kw": self.charging_speed_kw[slots],
+            "charged_energy_kwh": self.charged_energy_kwh[slots],
+            "target_energy_kwh": self.target_energy_kwh[slots],
+        })
+
+    @staticmethod
+    def _contains(sorted_ns: np.ndarray, value_ns: int) -> bool:
+        position = np.searchsorted(sorted_ns, value_ns, side="left")
+        return bool(position < len(sorted_ns) and sorted_ns[position] == value_ns)
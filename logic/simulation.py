@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from common import schemas
+from common.helper_functions import to_utc_ns
+
+from logic.allocation_policies import AllocationPolicy
+from logic.dispatcher import Dispatcher
+from logic.optimizer import Optimizer
+from logic.trigger_checker import TriggerChecker
+from logic.charging_hub import ChargingHub
+from logic.charging_logger import ChargingLogger
+from logic.session_store import SessionStore
+from logic.smart_meter import SmartMeter
+
+
+def build_dispatcher(sessions: pd.DataFrame,
+                     meter_values: pd.DataFrame,
+                     energy_forecast: pd.DataFrame = None,
+                     timestep: timedelta = timedelta(minutes=15),
+                     max_gridpower_kw: float = 100,
+                     optimizer: object = None,
+                     allocation_policy: AllocationPolicy = None,
+                     charging_logger: ChargingLogger = None) -> Dispatcher:
+    """
+    Wires the simulator components of one charging hub into a `Dispatcher`.
+
+    Parameters:
+        sessions (pd.DataFrame): Charging sessions of the hub.
+        meter_values (pd.DataFrame): Smart meter values of the hub.
+        energy_forecast (pd.DataFrame, optional): Energy forecast used by the optimizer.
+        timestep (timedelta): Dispatcher timestep, also the optimizer's planning slot.
+        max_gridpower_kw (float): Grid connection limit of the hub.
+        optimizer (optional): Replaces the default `Optimizer`; anything with
+            `optimize_sessions(current_time, charging_cars)`.
+        allocation_policy (AllocationPolicy, optional): Passed on to the `ChargingHub`.
+        charging_logger (ChargingLogger, optional): Logger to use, e.g. one that spills to disk.
+    """
+    session_store = SessionStore(sessions)
+    charging_hub = ChargingHub(session_store, SmartMeter(meter_values), max_gridpower_kw, allocation_policy)
+    if optimizer is None:
+        optimizer = Optimizer(energy_forecast, max_gridpower_kw, timestep)
+    if charging_logger is None:
+        charging_logger = ChargingLogger()
+    return Dispatcher(TriggerChecker(session_store), charging_hub, optimizer, charging_logger)
+
+
+def session_period(sessions: pd.DataFrame, timestep: timedelta) -> tuple:
+    """First session start and last session end, both floored to the `timestep` grid."""
+    return sessions["start_dt_utc"].min().floor(timestep), sessions["end_dt_utc"].max().floor(timestep)
+
+
+def unfinished_sessions(session_store: SessionStore, end_dt_utc: datetime) -> pd.DataFrame:
+    """
+    Sessions of `session_store` that are still plugged in at `end_dt_utc` and short of their
+    target, with their charged energy so far, to carry over into the next input window.
+    """
+    end_ns = to_utc_ns(end_dt_utc)
+    slots = np.flatnonzero((session_store.end_ns > end_ns)
+                           & (session_store.charged_energy_kwh < session_store.target_energy_kwh))
+    sessions = session_store.to_frame(slots).drop(columns="session_idx")
+    return schemas.apply_schema(sessions, schemas.session, "session")
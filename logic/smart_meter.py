@@ -1,32 +1,99 @@
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from common.helper_functions import to_utc_ns, series_to_utc_ns
 
 class SmartMeter:
+    """
+    Serves meter values per time window from an index built once at construction.
+
+    When the meter values lie on a regular, gap-free grid a datetime maps straight to
+    an array offset. Irregular or gappy feeds fall back to `searchsorted` on the sorted
+    start and end times.
+    """
     def __init__(self,
                  meter_values: pd.DataFrame):
+        if not meter_values["start_dt_utc"].is_monotonic_increasing:
+            meter_values = meter_values.sort_values("start_dt_utc", ignore_index=True)
         self.meter_values = meter_values
 
+        self.start_ns = series_to_utc_ns(meter_values["start_dt_utc"])
+        self.end_ns = series_to_utc_ns(meter_values["end_dt_utc"])
+        self.energy_kwh = meter_values["energy_kwh"].to_numpy(dtype="float64")
+
+        self._min_start_dt = meter_values["start_dt_utc"].min()
+        self._max_end_dt = meter_values["end_dt_utc"].max()
+        self._grid_origin_ns, self._grid_step_ns = self._detect_grid()
+
+    @property
+    def is_regular(self) -> bool:
+        return self._grid_step_ns is not None
+
     def get_meter_values(self, start_dt_utc: datetime,
                          end_dt_utc: datetime
                          ):
-        
-        meter_values = self.meter_values[
-            (self.meter_values["start_dt_utc"] >= start_dt_utc) 
-            & (self.meter_values["end_dt_utc"] <= end_dt_utc)
-        ]
-        if meter_values.empty:
-            min_start_dt = self.meter_values["start_dt_utc"].min()
-            max_end_dt = self.meter_values["end_dt_utc"].max()
+        lo, hi = self._locate(start_dt_utc, end_dt_utc)
+        return self.meter_values.iloc[lo:hi]
+
+    def get_range(self, start_dt_utc: datetime,
+                  end_dt_utc: datetime
+                  ) -> np.ndarray:
+        """Returns the meter energy within the window as a zero-copy view on the index."""
+        lo, hi = self._locate(start_dt_utc, end_dt_utc)
+        return self.energy_kwh[lo:hi]
+
+    def get_tick_energy(self, start_dt_utc: datetime,
+                        n_ticks: int,
+                        timestep: timedelta
+                        ) -> np.ndarray:
+        """Returns the meter energy summed per tick for `n_ticks` consecutive ticks."""
+        values = self.get_range(start_dt_utc, start_dt_utc + n_ticks * timestep)
+        step_ns = int(timestep.total_seconds() * 1e9)
+        if (self.is_regular and step_ns % self._grid_step_ns == 0
+                and (to_utc_ns(start_dt_utc) - self._grid_origin_ns) % self._grid_step_ns == 0
+                and len(values) == n_ticks * (step_ns // self._grid_step_ns)):
+            return values.reshape(n_ticks, -1).sum(axis=1)
+        return np.array([self.get_range(start_dt_utc + i * timestep, start_dt_utc + (i + 1) * timestep).sum()
+                         for i in range(n_ticks)])
+
+    def _locate(self, start_dt_utc: datetime, end_dt_utc: datetime) -> tuple:
+        """Returns the row slice of the meter values that lie fully inside the window."""
+        start_ns = to_utc_ns(start_dt_utc)
+        end_ns = to_utc_ns(end_dt_utc)
+        n = len(self.energy_kwh)
+
+        if self.is_regular:
+            origin, step = self._grid_origin_ns, self._grid_step_ns
+            lo = min(max(-((origin - start_ns) // step), 0), n)
+            hi = min(max((end_ns - origin) // step, 0), n)
+        else:
+            lo = int(np.searchsorted(self.start_ns, start_ns, side="left"))
+            hi = int(np.searchsorted(self.end_ns, end_ns, side="right"))
+
+        if hi <= lo:
+            self._raise_not_found(start_dt_utc, end_dt_utc)
+        return lo, hi
 
-            if end_dt_utc < min_start_dt:
-                raise ValueError(f"Error: end_dt_utc ({end_dt_utc}) is before the earliest meter value start datetime ({min_start_dt}).")
-            
-            if start_dt_utc > max_end_dt:
-                raise ValueError(f"Error: start_dt_utc ({start_dt_utc}) is after the latest meter value end datetime ({max_end_dt}).")
+    def _detect_grid(self) -> tuple:
+        """Returns (origin, step) in nanoseconds when the feed is a regular grid, else (None, None)."""
+        if len(self.start_ns) < 2:
+            return None, None
+        step = int(self.start_ns[1] - self.start_ns[0])
+        if step <= 0:
+            return None, None
+        if not (np.all(np.diff(self.start_ns) == step) and np.all(self.end_ns - self.start_ns == step)):
+            return None, None
+        return int(self.start_ns[0]), step
 
-            raise ValueError("Error: No meter values found for the given time range, but the reason is unknown.")
+    def _raise_not_found(self, start_dt_utc: datetime, end_dt_utc: datetime):
+        min_start_dt = self._min_start_dt
+        max_end_dt = self._max_end_dt
 
-        return meter_values
+        if to_utc_ns(end_dt_utc) < to_utc_ns(min_start_dt):
+            raise ValueError(f"Error: end_dt_utc ({end_dt_utc}) is before the earliest meter value start datetime ({min_start_dt}).")
 
+        if to_utc_ns(start_dt_utc) > to_utc_ns(max_end_dt):
+            raise ValueError(f"Error: start_dt_utc ({start_dt_utc}) is after the latest meter value end datetime ({max_end_dt}).")
 
-        
\ No newline at end of file
+        raise ValueError("Error: No meter values found for the given time range, but the reason is unknown.")
@@ -1,31 +1,123 @@
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from enum import Enum
+
+from common.helper_functions import to_utc_ns, series_to_utc_ns
+from logic.session_store import SessionStore
+
+
+class TriggerReason(Enum):
+    TARGET_REACHED = "target_reached"
+    NO_RESULT = "no_result"
+    NO_SIGNALS = "no_signals"
+    SESSION_START = "session_start"
+    SESSION_END = "session_end"
+    ZERO_CHARGE = "zero_charge"
+    SIGNAL_EXPIRY = "signal_expiry"
+
 
 class TriggerChecker:
+    """
+    Decides on which ticks the dispatcher re-optimizes.
+
+    Session start and end boundaries are precomputed as sorted int64 arrays that are
+    walked with forward-only cursors, and the result and signal conditions are cached
+    per frame, so every check costs O(1) per tick. A session start or end fires on the
+    first tick at or after it, i.e. when it lies in (previous tick, current tick].
+    """
     def __init__(self,
-                 sessions: pd.DataFrame
+                 session_store: SessionStore
                  ):
-        self.sessions = sessions
-    
+        self.session_store = session_store
+        self.start_boundaries_ns = np.unique(session_store.sorted_start_ns)
+        self.end_boundaries_ns = np.unique(session_store.sorted_end_ns)
+        self.reset()
+
+    def reset(self):
+        self._start_cursor = 0
+        self._end_cursor = 0
+        self._current_ns = None
+        self._seen_completed = self.session_store.n_completed
+        self._result = None
+        self._has_zero_charge = False
+        self._signals = None
+        self._signal_expiries_ns = frozenset()
+
+    def snapshot(self) -> dict:
+        """State that is not rebuilt from the clock: the completions already reported and the last tick."""
+        return {"seen_completed": self._seen_completed, "current_ns": self._current_ns}
+
+    def restore(self, snapshot: dict):
+        self.reset()
+        self._seen_completed = int(snapshot["seen_completed"])
+        if snapshot.get("current_ns") is not None:
+            self._advance_cursors(int(snapshot["current_ns"]))
+
     def is_triggered(self,
                      current_dt_utc: datetime,
                      result: pd.DataFrame,
-                     signals: pd.DataFrame):
+                     signals: pd.DataFrame) -> TriggerReason:
+        """Returns the reason the trigger fired, or None. Every reason is truthy."""
+        current_ns = to_utc_ns(current_dt_utc)
+        if self._current_ns is not None and current_ns < self._current_ns:
+            self.reset()
+        first_tick = self._current_ns is None
+        start_cursor, end_cursor = self._start_cursor, self._end_cursor
+        self._advance_cursors(current_ns)
+        # On the first tick nothing came before; the empty result fires anyway
+        session_started = not first_tick and self._start_cursor > start_cursor
+        session_ended = not first_tick and self._end_cursor > end_cursor
+
+        # A session that reached its target on the previous charge frees up capacity
+        if self.session_store.n_completed != self._seen_completed:
+            self._seen_completed = self.session_store.n_completed
+            return TriggerReason.TARGET_REACHED
         if result.empty:
-            return True
+            return TriggerReason.NO_RESULT
         if signals.empty:
-            return True
-        if (self.sessions['start_dt_utc'] == current_dt_utc).any():
-            return True
-        if (self.sessions['end_dt_utc'] == current_dt_utc).any():
-            return True
-        if (result['charged_energy_kwh'] == 0).any():
-            return True
-        if (signals['end_dt_utc'] == current_dt_utc).any():
-            return True
-        else:
-            return False
+            return TriggerReason.NO_SIGNALS
+        if session_started:
+            return TriggerReason.SESSION_START
+        if session_ended:
+            return TriggerReason.SESSION_END
+        if self.has_zero_charge(result):
+            return TriggerReason.ZERO_CHARGE
+        self.update_signals(signals)
+        if current_ns in self._signal_expiries_ns:
+            return TriggerReason.SIGNAL_EXPIRY
+        return None
+
+    def fires_every_tick(self,
+                         result: pd.DataFrame,
+                         signals: pd.DataFrame) -> bool:
+        """True when the result or signals alone make the trigger fire on the next tick."""
+        return result.empty or signals.empty or self.has_zero_charge(result)
+
+    def has_zero_charge(self, result: pd.DataFrame) -> bool:
+        """True when a car asked for energy but got none; zeros planned by the optimizer don't count."""
+        if result is not self._result:
+            self._result = result
+            zero_charge = result["charged_energy_kwh"].to_numpy() == 0
+            if "energy_request_kwh" in result:
+                zero_charge &= result["energy_request_kwh"].to_numpy() > 0
+            self._has_zero_charge = bool(zero_charge.any())
+        return self._has_zero_charge
 
     def update_signals(self,
                        signals: pd.DataFrame):
-        pass
+        if signals is not self._signals:
+            self._signals = signals
+            self._signal_expiries_ns = frozenset(series_to_utc_ns(signals["end_dt_utc"]).tolist())
+
+    def _advance_cursors(self, current_ns: int):
+        self._current_ns = current_ns
+        self._start_cursor = self._advance_cursor(self.start_boundaries_ns, self._start_cursor, current_ns)
+        self._end_cursor = self._advance_cursor(self.end_boundaries_ns, self._end_cursor, current_ns)
+
+    @staticmethod
+    def _advance_cursor(boundaries_ns: np.ndarray, cursor: int, current_ns: int) -> int:
+        """Moves the cursor past every boundary at or before `current_ns`."""
+        if cursor < len(boundaries_ns) and boundaries_ns[cursor] <= current_ns:
+            cursor += int(np.searchsorted(boundaries_ns[cursor:], current_ns, side="right"))
+        return cursor
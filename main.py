@@ -1,53 +1,221 @@
-from dotenv import load_dotenv
+import os
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from time import perf_counter
 
-# Load environment variables
-load_dotenv(".env", verbose = True)
+TIME_STEP = timedelta(minutes=15)
 
-import os
-from datetime import timedelta
+DEFAULT_CONFIG = {
+    "time_step": TIME_STEP,
+    "mode": "fixed",
+    "run_local": False,
+    "database_url": None,
+    "use_reader_cache": False,
+    "reader_cache_dir": ".cache/readers",
+    # Input window and dummy-data seed; reads are only cached with both window ends set
+    # and, for dummy data, a seed
+    "start_dt_utc": None,
+    "end_dt_utc": None,
+    "seed": None,
+    # Reads and simulates the window in slices of this length (whole days for dummy
+    # sessions) instead of all at once, see `run_windowed_simulation`
+    "input_window": None,
+}
 
-from logic.dispatcher import Dispatcher
-from logic.optimizer import Optimizer
-from logic.trigger_checker import TriggerChecker
-from logic.charging_hub import ChargingHub
-from logic.charging_logger import ChargingLogger
 
-from logic.smart_meter import SmartMeter
-from data.energy_forecast_reader import EnergyForecastReader
-from data.session_reader import SessionReader
-from data.meter_value_reader import MeterValueReader
-from common.helper_functions import run_local
+def _parse_utc(value: str) -> datetime:
+    """ISO datetime from the environment, naive values taken as UTC."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
 
-TIME_STEP = timedelta(minutes=15)
 
-RUN_LOCAL = os.getenv("RUN_LOCAL", "False").strip().lower() == "true"
+def load_config(env_file: str = ".env") -> dict:
+    """Builds the simulation config from the environment, after loading `env_file`."""
+    from dotenv import load_dotenv
+    load_dotenv(env_file, verbose=True)
+
+    return {
+        **DEFAULT_CONFIG,
+        "mode": os.getenv("DISPATCH_MODE", DEFAULT_CONFIG["mode"]),
+        "run_local": os.getenv("RUN_LOCAL", "False").strip().lower() == "true",
+        # e.g. sqlite:///ev.sqlite; without it the readers only serve dummy data
+        "database_url": os.getenv("DATABASE_URL"),
+        "use_reader_cache": os.getenv("USE_READER_CACHE", "False").strip().lower() == "true",
+        "reader_cache_dir": os.getenv("READER_CACHE_DIR", DEFAULT_CONFIG["reader_cache_dir"]),
+        "start_dt_utc": _parse_utc(os.getenv("START_DT_UTC")),
+        "end_dt_utc": _parse_utc(os.getenv("END_DT_UTC")),
+        "seed": int(os.getenv("DUMMY_DATA_SEED")) if os.getenv("DUMMY_DATA_SEED") else None,
+        "input_window": timedelta(days=int(os.getenv("INPUT_WINDOW_DAYS"))) if os.getenv("INPUT_WINDOW_DAYS") else None,
+    }
+
+
+def build_readers(config: dict) -> tuple:
+    """Session, energy forecast and meter value readers described by `config`."""
+    import numpy as np
+    from data.energy_forecast_reader import EnergyForecastReader
+    from data.session_reader import SessionReader
+    from data.meter_value_reader import MeterValueReader
+    from data.db_connector import DBConnector
+
+    if config["run_local"] or not config["database_url"]:
+        database_connector = None
+    else:
+        database_connector = DBConnector.from_url(config["database_url"])
+
+    # One generator per reader, since the reads run in parallel
+    if config["seed"] is None:
+        rngs = [None] * 3
+    else:
+        rngs = [np.random.default_rng(seed) for seed in np.random.SeedSequence(config["seed"]).spawn(3)]
+    return (SessionReader(database_connector, rng=rngs[0]),
+            EnergyForecastReader(database_connector, rng=rngs[1]),
+            MeterValueReader(database_connector, rng=rngs[2]))
+
+
+def read_inputs(config: dict = None) -> dict:
+    """Reads the sessions, energy forecast and meter values described by `config`."""
+    from data.reader_cache import ReaderCache
+    from data.db_connector import read_concurrently
+
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    reader_cache = ReaderCache(config["reader_cache_dir"], enabled=config["use_reader_cache"])
+    window = {"start_dt_utc": config["start_dt_utc"], "end_dt_utc": config["end_dt_utc"]}
+
+    session_reader, energy_forecast_reader, meter_value_reader = build_readers(config)
+    database_connector = session_reader.db_connector
+    reads = {"sessions": partial(reader_cache.read, session_reader, **window),
+             "energy_forecast": partial(reader_cache.read, energy_forecast_reader, **window)}
+    use_dummy_data = os.getenv("USE_DUMMY_DATA", "False").lower() == "true"
+    if database_connector is not None and not use_dummy_data:
+        reads["meter_values"] = partial(reader_cache.read, meter_value_reader, **window)
+    inputs = read_concurrently(reads)
+
+    if "meter_values" not in inputs:
+        # Dummy meter values are derived from the forecast, so they are read afterwards
+        inputs["meter_values"] = reader_cache.read(meter_value_reader, energy_forecast=inputs["energy_forecast"])
+    return inputs
+
+
+def run_simulation(config: dict = None) -> dict:
+    """
+    Reads the inputs, builds the dispatcher and simulates the full session period. With an
+    `input_window` in `config` the run streams its inputs, see `run_windowed_simulation`.
+
+    Parameters:
+        config (dict, optional): Overrides of `DEFAULT_CONFIG`, see `load_config`.
+
+    Returns:
+        dict: The `dispatcher` (its logger holds the charging log), the `inputs` and the
+            wall time in seconds of `startup` (reading the inputs and building the
+            components) and of the `run`.
+    """
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    if config["input_window"] is not None:
+        return run_windowed_simulation(config)
+
+    started = perf_counter()
+    from logic.simulation import build_dispatcher, session_period
+
+    time_step = config["time_step"]
+    inputs = read_inputs(config)
+    sessions = inputs["sessions"]
+
+    dispatcher = build_dispatcher(sessions, inputs["meter_values"], inputs["energy_forecast"], time_step)
+    start_time, end_time = session_period(sessions, time_step)
+    startup_seconds = perf_counter() - started
+
+    dispatcher.run(start_time, end_time, time_step, mode=config["mode"])
+    return {
+        "dispatcher": dispatcher,
+        "inputs": inputs,
+        "startup_seconds": startup_seconds,
+        "run_seconds": perf_counter() - started - startup_seconds,
+    }
+
+
+def run_windowed_simulation(config: dict = None) -> dict:
+    """
+    Simulates `start_dt_utc` up to `end_dt_utc` window by window, so only the inputs around
+    the current window are held in memory.
+
+    The sessions, energy forecast and meter values are streamed with the readers'
+    `iter_windows` in windows of `input_window`. Each window gets its own dispatcher,
+    which re-plans on its first tick; the sessions still plugged in at the window end
+    carry over with their charged energy, and all windows log into one `ChargingLogger`.
+    The forecast is held one window ahead, so the optimizer can plan past the window end.
+    Sessions still plugged in at `end_dt_utc` are not simulated past it.
+
+    Returns:
+        dict: As `run_simulation`, with the dispatcher of the last window (its logger holds
+            the charging log of all windows), `inputs` None and the number of `windows`.
+    """
+    started = perf_counter()
+    from collections import deque
+    import pandas as pd
+    from logic.charging_logger import ChargingLogger
+    from logic.simulation import build_dispatcher, unfinished_sessions
 
-if RUN_LOCAL:
-    database_connector = None
-else:
-    # Get DB connector specified for platform (implement later)
-    database_connector = "DB_CONNECTION_PLACEHOLDER"
+    config = {**DEFAULT_CONFIG, **(config or {})}
+    time_step, window = config["time_step"], config["input_window"]
+    start_dt_utc, end_dt_utc = config["start_dt_utc"], config["end_dt_utc"]
+    if start_dt_utc is None or end_dt_utc is None:
+        raise ValueError("Error: a windowed run needs both start_dt_utc and end_dt_utc.")
+    if window % time_step:
+        raise ValueError(f"Error: input_window ({window}) must be a multiple of the time step ({time_step}).")
 
-session_reader = SessionReader(database_connector)
-sessions = session_reader.read()
-energy_forecast_reader = EnergyForecastReader(database_connector)
-energy_forecast = energy_forecast_reader.read()
+    session_reader, energy_forecast_reader, meter_value_reader = build_readers(config)
+    use_dummy_data = os.getenv("USE_DUMMY_DATA", "False").lower() == "true"
+    session_windows = session_reader.iter_windows(start_dt_utc, end_dt_utc, window)
+    forecast_windows = energy_forecast_reader.iter_windows(start_dt_utc, end_dt_utc + window, window)
+    meter_windows = None if use_dummy_data else meter_value_reader.iter_windows(start_dt_utc, end_dt_utc, window)
 
-meter_value_reader = MeterValueReader(database_connector)
-meter_values = meter_value_reader.read(energy_forecast=energy_forecast)
+    charging_logger = ChargingLogger()
+    dispatcher, carried, n_windows = None, None, 0
+    forecasts = deque([next(forecast_windows)])
+    startup_seconds = perf_counter() - started
+    window_start = pd.Timestamp(start_dt_utc)
+    try:
+        for sessions in session_windows:
+            window_end = min(window_start + window, pd.Timestamp(end_dt_utc))
+            forecasts.append(next(forecast_windows))
+            if use_dummy_data:
+                # Dummy meter values are derived from the forecast of the same window
+                meter_values = meter_value_reader.read(energy_forecast=forecasts[0])
+            else:
+                meter_values = next(meter_windows)
+            if carried is not None and len(carried):
+                sessions = pd.concat([carried, sessions], ignore_index=True)
 
-charging_logger = ChargingLogger()
-smart_meter = SmartMeter(meter_values)
-trigger_checker = TriggerChecker(sessions)
-charging_hub = ChargingHub(sessions, smart_meter)
-optimizer = Optimizer()
+            if len(sessions):
+                dispatcher = build_dispatcher(sessions, meter_values, pd.concat(forecasts, ignore_index=True),
+                                              time_step, charging_logger=charging_logger)
+                dispatcher.run(window_start, window_end - time_step, time_step, mode=config["mode"])
+                carried = unfinished_sessions(dispatcher.charging_hub.session_store, window_end)
+            forecasts.popleft()
+            window_start = window_end
+            n_windows += 1
+    finally:
+        forecast_windows.close()
+        if meter_windows is not None:
+            meter_windows.close()
 
-dispatcher = Dispatcher(trigger_checker, charging_hub, optimizer, charging_logger)
+    return {
+        "dispatcher": dispatcher,
+        "inputs": None,
+        "windows": n_windows,
+        "startup_seconds": startup_seconds,
+        "run_seconds": perf_counter() - started - startup_seconds,
+    }
 
-start_time = sessions["start_dt_utc"].min().floor("15min")
-end_time = sessions["end_dt_utc"].max().floor("15min")
 
-dispatcher.run(start_time, end_time, TIME_STEP)
+def main():
+    config = load_config()
+    outcome = run_simulation(config)
+    print(f"Startup: {outcome['startup_seconds']:.2f} s, run: {outcome['run_seconds']:.2f} s")
+    print('klaar')
 
-print('klaar')
 
+if __name__ == "__main__":
+    main()
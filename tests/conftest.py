@@ -0,0 +1,56 @@
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from common import schemas
+
+START_DT_UTC = datetime(2024, 1, 1, tzinfo=timezone.utc)
+TIMESTEP = timedelta(minutes=15)
+
+
+def make_sessions(rows: list) -> pd.DataFrame:
+    """Sessions from (car_id, start, end, target_energy_kwh) tuples, with the times as offsets from START_DT_UTC."""
+    return schemas.apply_schema(pd.DataFrame({
+        "car_id": [car_id for car_id, _, _, _ in rows],
+        "session_id": np.arange(1, len(rows) + 1),
+        "start_dt_utc": [START_DT_UTC + start for _, start, _, _ in rows],
+        "end_dt_utc": [START_DT_UTC + end for _, _, end, _ in rows],
+        "charging_speed_kw": 11.0,
+        "charged_energy_kwh": 0.0,
+        "target_energy_kwh": [target for _, _, _, target in rows],
+    }), schemas.session, "session")
+
+
+def make_meter_values(days: int = 2, energy_kwh: float = 0.0) -> pd.DataFrame:
+    """Flat meter values on a 15-minute grid from START_DT_UTC."""
+    starts = pd.date_range(START_DT_UTC, periods=days * 96, freq=TIMESTEP)
+    return schemas.apply_schema(pd.DataFrame({
+        "start_dt_utc": starts,
+        "end_dt_utc": starts + TIMESTEP,
+        "energy_kwh": energy_kwh,
+    }), schemas.meter_value, "meter value")
+
+
+@pytest.fixture
+def dummy_inputs(monkeypatch):
+    """Seeded dummy sessions, forecast and meter values over five days."""
+    from data.energy_forecast_reader import EnergyForecastReader
+    from data.meter_value_reader import MeterValueReader
+    from data.session_reader import SessionReader
+
+    monkeypatch.setenv("USE_DUMMY_DATA", "true")
+    monkeypatch.setenv("DEBUG_MODE", "false")
+    rng = np.random.default_rng(0)
+    end_dt_utc = START_DT_UTC + timedelta(days=5)
+    sessions = SessionReader(None, number_of_sessions=40, number_of_unique_cars=10, rng=rng).read(
+        start_dt_utc=START_DT_UTC, end_dt_utc=end_dt_utc)
+    energy_forecast = EnergyForecastReader(None, rng=rng).read(start_dt_utc=START_DT_UTC,
+                                                                end_dt_utc=end_dt_utc + timedelta(days=1))
+    meter_values = MeterValueReader(None, rng=rng).read(energy_forecast=energy_forecast)
+    return sessions, energy_forecast, meter_values
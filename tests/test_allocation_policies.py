@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from logic.allocation_policies import ChargingState, get_policy
+
+STEP_NS = 15 * 60 * 10 ** 9
+
+
+def make_state(end_ticks, remaining_kwh, max_charging_kwh=2.75):
+    n_cars = len(end_ticks)
+    return ChargingState(car_id=np.array([f"CAR-{i + 1}" for i in range(n_cars)], dtype=object),
+                         end_ns=np.asarray(end_ticks, dtype=np.int64) * STEP_NS,
+                         remaining_kwh=np.asarray(remaining_kwh, dtype=np.float64),
+                         max_charging_kwh=np.full(n_cars, max_charging_kwh),
+                         current_ns=0,
+                         step_ns=STEP_NS)
+
+
+def allocate(policy, requested_kwh, available_energy_kwh, state):
+    requested_kwh = np.asarray(requested_kwh, dtype=np.float64)
+    return policy.allocate(requested_kwh, available_energy_kwh, state, np.empty_like(requested_kwh))
+
+
+@pytest.mark.parametrize("name", ["proportional", "edf", "llf", "priority", "water_filling"])
+def test_policies_never_exceed_requests_or_available_energy(name):
+    rng = np.random.default_rng(0)
+    requested_kwh = rng.uniform(0, 2.75, 50)
+    state = make_state(rng.integers(1, 40, 50), rng.uniform(0, 60, 50))
+    for available_energy_kwh in (0.0, requested_kwh.sum() / 3, requested_kwh.sum() * 2):
+        delivered_kwh = allocate(get_policy(name), requested_kwh, available_energy_kwh, state)
+        assert (delivered_kwh >= 0).all() and (delivered_kwh <= requested_kwh + 1e-12).all()
+        assert delivered_kwh.sum() == pytest.approx(min(available_energy_kwh, requested_kwh.sum()))
+
+
+def test_edf_serves_the_cars_that_leave_first():
+    state = make_state(end_ticks=[8, 2, 4], remaining_kwh=[20, 20, 20])
+    delivered_kwh = allocate(get_policy("edf"), [2.0, 2.0, 2.0], 3.0, state)
+    np.testing.assert_allclose(delivered_kwh, [0.0, 2.0, 1.0])
+
+
+def test_llf_serves_the_cars_with_the_least_slack_first():
+    # Same deadline, the first car needs 8 ticks at full speed and the second only 1
+    state = make_state(end_ticks=[10, 10], remaining_kwh=[22.0, 2.75])
+    delivered_kwh = allocate(get_policy("llf"), [2.75, 2.75], 2.75, state)
+    np.testing.assert_allclose(delivered_kwh, [2.75, 0.0])
+
+
+def test_water_filling_serves_small_requests_in_full():
+    state = make_state(end_ticks=[4, 4, 4], remaining_kwh=[20, 20, 20])
+    delivered_kwh = allocate(get_policy("water_filling"), [0.5, 2.0, 3.0], 3.5, state)
+    np.testing.assert_allclose(delivered_kwh, [0.5, 1.5, 1.5])
+
+
+def test_priority_serves_higher_tiers_first_and_scales_within_a_tier():
+    state = make_state(end_ticks=[4, 4, 4], remaining_kwh=[20, 20, 20])
+    policy = get_policy("priority", priorities={"CAR-3": 1})
+    delivered_kwh = allocate(policy, [2.0, 2.0, 2.0], 3.0, state)
+    np.testing.assert_allclose(delivered_kwh, [0.5, 0.5, 2.0])
+
+
+def test_priority_without_priorities_scales_proportionally():
+    state = make_state(end_ticks=[4, 4], remaining_kwh=[20, 20])
+    delivered_kwh = allocate(get_policy("priority"), [2.0, 1.0], 1.5, state)
+    np.testing.assert_allclose(delivered_kwh, [1.0, 0.5])
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import START_DT_UTC, TIMESTEP, make_meter_values, make_sessions
+from logic.allocation_policies import get_policy
+from logic.charging_hub import ChargingHub
+from logic.session_store import SessionStore
+from logic.smart_meter import SmartMeter
+
+
+def make_hub(allocation_policy=None) -> ChargingHub:
+    sessions = make_sessions([("CAR-1", timedelta(0), timedelta(hours=8), 80.0),
+                              ("CAR-2", timedelta(0), timedelta(hours=8), 80.0)])
+    return ChargingHub(SessionStore(sessions), SmartMeter(make_meter_values()), allocation_policy=allocation_policy)
+
+
+@pytest.mark.parametrize("allocation_policy", [None, get_policy("edf")])
+def test_charge_block_keeps_going_for_cars_planned_at_zero(allocation_policy):
+    hub = make_hub(allocation_policy)
+    charging_cars = hub.get_charging_cars(START_DT_UTC)
+    result = pd.DataFrame({"session_idx": charging_cars["session_idx"], "car_id": charging_cars["car_id"],
+                           "energy_request_kwh": [1.0, 0.0], "charged_energy_kwh": [1.0, 0.0]})
+
+    charged_kwh = hub.charge_block(result, START_DT_UTC + TIMESTEP, 4, TIMESTEP)
+    np.testing.assert_allclose(charged_kwh, [[1.0, 0.0]] * 4)
+
+
+def test_charge_block_stops_after_a_tick_without_energy_for_a_request():
+    hub = make_hub()
+    hub.max_gridpower_kw = 0
+    charging_cars = hub.get_charging_cars(START_DT_UTC)
+    result = pd.DataFrame({"session_idx": charging_cars["session_idx"], "car_id": charging_cars["car_id"],
+                           "energy_request_kwh": [1.0, 1.0], "charged_energy_kwh": [0.0, 0.0]})
+
+    assert len(hub.charge_block(result, START_DT_UTC + TIMESTEP, 4, TIMESTEP)) == 1
+
+
+def test_charge_batch_matches_one_kernel_call_per_scenario():
+    signal_kwh = np.array([[2.0, 2.0, 1.0], [2.5, 0.0, 2.0]])
+    charged_kwh = np.array([0.0, 9.0, 1.0])
+    target_kwh = np.array([10.0, 10.0, 10.0])
+    charging_speed_kw = np.array([11.0, 11.0, 4.0])
+    available_kwh = np.array([3.0, 10.0])
+
+    requested, delivered = ChargingHub.charge_batch(signal_kwh, charged_kwh, target_kwh, charging_speed_kw,
+                                                    available_kwh, TIMESTEP)
+    assert charged_kwh.tolist() == [0.0, 9.0, 1.0]
+    for scenario in range(2):
+        one_requested, one_delivered = np.empty(3), np.empty(3)
+        ChargingHub.charge_kernel(signal_kwh[scenario], charged_kwh.copy(), target_kwh, charging_speed_kw * 0.25,
+                                  available_kwh[scenario], one_requested, one_delivered, np.empty(()))
+        np.testing.assert_allclose(requested[scenario], one_requested)
+        np.testing.assert_allclose(delivered[scenario], one_delivered)
+    np.testing.assert_allclose(requested, [[2.0, 1.0, 1.0], [2.5, 0.0, 1.0]])
+    np.testing.assert_allclose(delivered.sum(axis=1), [3.0, 3.5])
+
+
+def test_charge_kernel_caps_and_scales_the_requests_in_place():
+    signal_kwh = np.array([5.0, np.nan, 1.0])
+    charged_kwh = np.array([0.0, 0.0, 9.5])
+    requested_kwh, delivered_kwh = np.empty(3), np.empty(3)
+
+    ChargingHub.charge_kernel(signal_kwh, charged_kwh, np.full(3, 10.0), np.full(3, 2.0), 2.25,
+                              requested_kwh, delivered_kwh, np.empty(()))
+    # Capped by speed, then by the remaining energy; a car without a signal takes its cap
+    np.testing.assert_allclose(requested_kwh, [2.0, 2.0, 0.5])
+    np.testing.assert_allclose(delivered_kwh, [1.0, 1.0, 0.25])
+    np.testing.assert_allclose(charged_kwh, [1.0, 1.0, 9.75])
+
+
+def test_charge_reuses_its_buffers_between_ticks():
+    hub = make_hub()
+    signals = pd.DataFrame({"car_id": ["CAR-1", "CAR-2"], "energy_kwh": [1.0, 2.0]})
+    hub.charge(signals, START_DT_UTC, TIMESTEP)
+    buffers = hub._buffers
+
+    result = hub.charge(signals, START_DT_UTC + TIMESTEP, TIMESTEP)
+    assert hub._buffers is buffers
+    assert result["charged_energy_kwh"].tolist() == [1.0, 2.0]
+    np.testing.assert_allclose(hub.session_store.charged_energy_kwh, [2.0, 4.0])
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import START_DT_UTC, TIMESTEP
+from logic.charging_logger import ChargingLogger
+
+
+def charging_data(energy_kwh: list) -> pd.DataFrame:
+    return pd.DataFrame({"car_id": [f"CAR-{i + 1}" for i in range(len(energy_kwh))], "charged_energy_kwh": energy_kwh})
+
+
+def test_flush_to_dataframe_returns_the_logs():
+    charging_logger = ChargingLogger()
+    charging_logger.log(START_DT_UTC, charging_data([1.0, 2.0]))
+
+    logs = charging_logger.flush_to_dataframe()
+    pd.testing.assert_frame_equal(logs, charging_logger.get_logs())
+    assert list(logs["charged_energy_kwh"]) == [1.0, 2.0]
+
+
+@pytest.mark.parametrize("spill_format", ChargingLogger.SPILL_FORMATS)
+def test_spilled_and_buffered_rows_read_back_in_order(spill_format, tmp_path):
+    pytest.importorskip("pyarrow")
+    # Spills every two ticks of two cars
+    charging_logger = ChargingLogger(initial_capacity=1, max_memory_bytes=4 * ChargingLogger.ROW_BYTES,
+                                     spill_dir=str(tmp_path), spill_format=spill_format)
+    for tick in range(5):
+        charging_logger.log(START_DT_UTC + tick * TIMESTEP, charging_data([tick, 10.0 + tick]))
+
+    assert len(charging_logger.spilled_chunks) == 2
+    assert len(charging_logger) == 10
+    logs = charging_logger.get_logs()
+    assert list(logs["charged_energy_kwh"]) == [value for tick in range(5) for value in (tick, 10.0 + tick)]
+    assert list(logs["car_id"]) == ["CAR-1", "CAR-2"] * 5
+    assert logs["timestamp"].is_monotonic_increasing
+
+
+def test_log_block_matches_logging_tick_by_tick():
+    timestamps = pd.date_range(START_DT_UTC, periods=3, freq=TIMESTEP)
+    energy_kwh = np.arange(6, dtype=np.float64).reshape(3, 2)
+    by_tick, by_block = ChargingLogger(), ChargingLogger()
+    for timestamp, row in zip(timestamps, energy_kwh):
+        by_tick.log(timestamp, charging_data(list(row)))
+    by_block.log_block(timestamps, charging_data([0.0, 0.0]), energy_kwh)
+
+    pd.testing.assert_frame_equal(by_block.get_logs(), by_tick.get_logs())
+
+
+def test_restore_drops_the_rows_logged_after_the_snapshot(tmp_path):
+    pytest.importorskip("pyarrow")
+    charging_logger = ChargingLogger(spill_dir=str(tmp_path))
+    charging_logger.log(START_DT_UTC, charging_data([1.0, 2.0]))
+    snapshot = charging_logger.snapshot()
+    charging_logger.log(START_DT_UTC + TIMESTEP, charging_data([3.0, 4.0, 5.0]))
+
+    charging_logger.restore(snapshot)
+    assert list(charging_logger.get_logs()["charged_energy_kwh"]) == [1.0, 2.0]
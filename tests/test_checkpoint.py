@@ -0,0 +1,17 @@
+from datetime import timedelta
+
+import pytest
+
+from logic.checkpoint import Checkpointer
+from test_dispatcher import run_dispatcher
+
+
+def test_keep_must_be_at_least_one(tmp_path):
+    with pytest.raises(ValueError):
+        Checkpointer(str(tmp_path), keep=0)
+
+
+def test_save_keeps_only_the_latest_checkpoints(dummy_inputs, tmp_path):
+    checkpointer = Checkpointer(str(tmp_path), interval=timedelta(days=1), keep=1)
+    run_dispatcher(dummy_inputs, "fixed", checkpointer=checkpointer)
+    assert len(checkpointer.checkpoints()) == 1
@@ -0,0 +1,63 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import START_DT_UTC, TIMESTEP, make_meter_values
+from logic.deviation_index import DeviationIndex
+
+
+@pytest.fixture
+def frames() -> tuple:
+    rng = np.random.default_rng(0)
+    energy_forecast = make_meter_values(days=1)
+    energy_forecast["energy_kwh"] = rng.normal(0, 5, len(energy_forecast))
+    meter_values = energy_forecast.copy()
+    meter_values["energy_kwh"] += rng.normal(0, 2, len(meter_values))
+    # A meter gap: those slots drop out of every aggregate
+    return energy_forecast, meter_values.drop(index=range(20, 24)).reset_index(drop=True)
+
+
+def test_window_queries_match_a_direct_computation(frames):
+    energy_forecast, meter_values = frames
+    index = DeviationIndex(energy_forecast, meter_values)
+    merged = energy_forecast.merge(meter_values, on="start_dt_utc", suffixes=("_forecast", "_meter"))
+    residual = (merged["energy_kwh_meter"] - merged["energy_kwh_forecast"]).to_numpy()
+    start_ns = merged["start_dt_utc"]
+
+    for lo, hi in [(0, 96), (5, 37), (18, 26), (20, 24), (40, 41)]:
+        start_dt_utc, end_dt_utc = START_DT_UTC + lo * TIMESTEP, START_DT_UTC + hi * TIMESTEP
+        window = residual[((start_ns >= start_dt_utc) & (start_ns < end_dt_utc)).to_numpy()]
+        assert index.range_sum(start_dt_utc, end_dt_utc) == pytest.approx(window.sum())
+        if len(window) == 0:
+            assert np.isnan(index.max_deviation(start_dt_utc, end_dt_utc))
+            assert np.isnan(index.mean_absolute_error(start_dt_utc, end_dt_utc))
+            continue
+        assert index.max_residual(start_dt_utc, end_dt_utc) == pytest.approx(window.max())
+        assert index.min_residual(start_dt_utc, end_dt_utc) == pytest.approx(window.min())
+        assert index.max_deviation(start_dt_utc, end_dt_utc) == pytest.approx(np.abs(window).max())
+        assert index.mean_absolute_error(start_dt_utc, end_dt_utc) == pytest.approx(np.abs(window).mean())
+        assert index.rmse(start_dt_utc, end_dt_utc) == pytest.approx(np.sqrt((window ** 2).mean()))
+
+
+def test_rolling_error_matches_a_pandas_rolling_window(frames):
+    index = DeviationIndex(*frames)
+    residual = pd.Series(np.where(index.valid, index.residual_kwh, np.nan), index=index.grid())
+
+    expected = residual.abs().rolling(4, min_periods=1).mean()
+    pd.testing.assert_series_equal(index.rolling_error(timedelta(hours=1)), expected, check_names=False)
+    expected = residual.abs().rolling(4, min_periods=1).max()
+    pd.testing.assert_series_equal(index.rolling_error(timedelta(hours=1), "max_deviation"), expected,
+                                   check_names=False)
+
+
+def test_inputs_and_arguments_are_checked(frames):
+    energy_forecast, meter_values = frames
+    with pytest.raises(ValueError, match="needs both forecast and meter values"):
+        DeviationIndex(energy_forecast, meter_values.iloc[:0])
+    index = DeviationIndex(energy_forecast, meter_values)
+    with pytest.raises(ValueError, match="unknown metric"):
+        index.rolling_error(timedelta(hours=1), "mape")
+    with pytest.raises(ValueError, match="is before start_dt_utc"):
+        index.range_sum(START_DT_UTC + timedelta(hours=2), START_DT_UTC)
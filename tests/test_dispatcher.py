@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from conftest import TIMESTEP
+from logic.dispatcher import Dispatcher
+from logic.simulation import build_dispatcher, session_period
+
+
+def make_dispatcher(inputs, max_gridpower_kw: float = 100) -> Dispatcher:
+    sessions, energy_forecast, meter_values = inputs
+    return build_dispatcher(sessions, meter_values, energy_forecast, TIMESTEP, max_gridpower_kw)
+
+
+def run_dispatcher(inputs, mode: str, max_gridpower_kw: float = 100, **run_kwargs) -> Dispatcher:
+    dispatcher = make_dispatcher(inputs, max_gridpower_kw)
+    start_dt_utc, end_dt_utc = session_period(inputs[0], TIMESTEP)
+    dispatcher.run(start_dt_utc, end_dt_utc, TIMESTEP, mode=mode, **run_kwargs)
+    return dispatcher
+
+
+@pytest.mark.parametrize("max_gridpower_kw", [100, 20])
+def test_fixed_and_event_mode_produce_the_same_logs(dummy_inputs, max_gridpower_kw):
+    fixed = run_dispatcher(dummy_inputs, "fixed", max_gridpower_kw)
+    event = run_dispatcher(dummy_inputs, "event", max_gridpower_kw)
+
+    fixed_logs = fixed.charging_logger.get_logs()
+    event_logs = event.charging_logger.get_logs()
+    assert len(fixed_logs) > 0
+    assert len(fixed_logs) == len(event_logs)
+    assert (fixed_logs["timestamp"].to_numpy() == event_logs["timestamp"].to_numpy()).all()
+    assert (fixed_logs["car_id"].astype(str).to_numpy() == event_logs["car_id"].astype(str).to_numpy()).all()
+    np.testing.assert_allclose(fixed_logs["charged_energy_kwh"], event_logs["charged_energy_kwh"], atol=1e-9)
+    np.testing.assert_allclose(fixed.charging_hub.session_store.charged_energy_kwh,
+                               event.charging_hub.session_store.charged_energy_kwh, atol=1e-9)
@@ -0,0 +1,16 @@
+import numpy as np
+
+from logic.instrumentation import HistogramCollector
+
+
+def test_quantile_stays_within_the_observed_timings():
+    collector = HistogramCollector()
+    timings = np.linspace(0.011, 0.012, 100)
+    for elapsed_seconds in timings:
+        collector.after("optimize", None, elapsed_seconds, 0, 0)
+
+    assert collector.quantile("optimize", 0.99) <= timings.max()
+    assert collector.quantile("optimize", 1.0) == timings.max()
+    assert collector.bin_edges[0] <= collector.quantile("optimize", 0.5) <= timings.max()
+    assert collector.bin_edges[0] <= collector.quantile("optimize", 0.0) <= timings.min()
+    assert np.isnan(collector.quantile("charge", 0.5))
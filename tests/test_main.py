@@ -0,0 +1,68 @@
+import subprocess
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+import pytest
+
+from conftest import START_DT_UTC
+from main import load_config, run_simulation
+
+
+@pytest.fixture
+def config(monkeypatch):
+    monkeypatch.setenv("USE_DUMMY_DATA", "true")
+    monkeypatch.setenv("DEBUG_MODE", "false")
+    return {"start_dt_utc": START_DT_UTC, "end_dt_utc": START_DT_UTC + timedelta(days=6), "seed": 3, "mode": "event"}
+
+
+def test_importing_main_loads_no_heavy_modules():
+    probe = "import sys, main; print(sorted(m for m in ('numpy', 'pandas', 'scipy', 'dotenv') if m in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", probe], capture_output=True, text=True, check=True,
+                            cwd=Path(__file__).parents[1]).stdout
+    assert output.strip() == "[]"
+
+
+def test_load_config_reads_the_environment(monkeypatch, tmp_path):
+    monkeypatch.setenv("DISPATCH_MODE", "event")
+    monkeypatch.setenv("START_DT_UTC", "2024-01-01T00:00:00")
+    monkeypatch.setenv("DUMMY_DATA_SEED", "5")
+    monkeypatch.setenv("INPUT_WINDOW_DAYS", "2")
+    config = load_config(str(tmp_path / "missing.env"))
+
+    assert config["mode"] == "event"
+    assert config["start_dt_utc"] == START_DT_UTC
+    assert config["seed"] == 5
+    assert config["input_window"] == timedelta(days=2)
+
+
+def test_run_simulation_covers_the_session_period(config):
+    outcome = run_simulation(config)
+
+    sessions = outcome["inputs"]["sessions"]
+    logs = outcome["dispatcher"].charging_logger.get_logs()
+    assert set(outcome["inputs"]) == {"sessions", "energy_forecast", "meter_values"}
+    assert outcome["startup_seconds"] > 0 and outcome["run_seconds"] > 0
+    assert logs["timestamp"].min() >= sessions["start_dt_utc"].min().floor("15min")
+    assert logs["timestamp"].max() <= sessions["end_dt_utc"].max()
+    store = outcome["dispatcher"].charging_hub.session_store
+    assert logs["charged_energy_kwh"].sum() == pytest.approx(store.charged_energy_kwh.sum())
+
+
+def test_windowed_run_streams_the_inputs_and_carries_sessions_over(config):
+    full = run_simulation(config)
+    windowed = run_simulation({**config, "input_window": timedelta(days=2)})
+
+    assert windowed["windows"] == 3
+    assert windowed["inputs"] is None
+    full_kwh = full["dispatcher"].charging_logger.get_logs()["charged_energy_kwh"].sum()
+    windowed_kwh = windowed["dispatcher"].charging_logger.get_logs()["charged_energy_kwh"].sum()
+    # Only the forecast and meter draws and the re-plan at every window start differ
+    assert windowed_kwh == pytest.approx(full_kwh, rel=0.05)
+
+
+def test_windowed_run_needs_a_bounded_window_on_the_time_step(config):
+    with pytest.raises(ValueError, match="start_dt_utc and end_dt_utc"):
+        run_simulation({**config, "end_dt_utc": None, "input_window": timedelta(days=2)})
+    with pytest.raises(ValueError, match="multiple of the time step"):
+        run_simulation({**config, "input_window": timedelta(days=1, minutes=5)})
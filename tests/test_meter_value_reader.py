@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+import numpy as np
+
+from conftest import START_DT_UTC
+from data.meter_value_reader import MeterValueReader
+
+
+def test_dummy_windows_without_a_forecast_generate_their_own(monkeypatch):
+    monkeypatch.setenv("USE_DUMMY_DATA", "true")
+    reader = MeterValueReader(None, rng=np.random.default_rng(0))
+
+    windows = list(reader.iter_windows(START_DT_UTC, START_DT_UTC + timedelta(days=2), timedelta(hours=12)))
+    assert [len(window) for window in windows] == [48] * 4
+    assert windows[0]["start_dt_utc"].min() == START_DT_UTC
+    assert windows[-1]["end_dt_utc"].max() == START_DT_UTC + timedelta(days=2)
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from logic.multi_hub_runner import HubConfig, MultiHubRunner, SharedArrays
+
+from conftest import TIMESTEP, make_meter_values, make_sessions
+
+
+def make_hub(hub_id: str) -> HubConfig:
+    sessions = make_sessions([
+        ("car-a", timedelta(hours=1), timedelta(hours=5), 20.0),
+        ("car-b", timedelta(hours=2), timedelta(hours=6), 10.0),
+        ("car-a", timedelta(hours=8), timedelta(hours=12), 15.0),
+    ])
+    return HubConfig(hub_id, sessions, make_meter_values(days=1), max_gridpower_kw=50)
+
+
+def test_pack_frame_shares_only_numeric_arrays():
+    sessions = make_hub("a").sessions
+    arrays = {}
+    columns = SharedArrays.pack_frame(sessions, "0/sessions", arrays)
+
+    assert all(array.dtype != object for array in arrays.values())
+    assert all(not isinstance(part, (np.ndarray, pd.Index)) for column in columns for part in column)
+
+    shared = SharedArrays(arrays)
+    try:
+        shm, views = SharedArrays.attach(shared.name, shared.layout)
+        try:
+            unpacked = SharedArrays.unpack_frame(columns, views)
+        finally:
+            del views
+            shm.close()
+    finally:
+        shared.unlink()
+
+    pd.testing.assert_frame_equal(unpacked, sessions, check_categorical=False)
+    assert isinstance(unpacked["car_id"].dtype, pd.CategoricalDtype)
+
+
+def test_hub_without_meter_values_is_rejected_up_front():
+    hub = make_hub("a")
+    hub.meter_values = None
+
+    with pytest.raises(ValueError, match="hub 'a' has sessions but no meter values"):
+        MultiHubRunner([hub], TIMESTEP, max_workers=1)
+
+
+def test_run_merges_the_logs_of_all_hubs():
+    logs = MultiHubRunner([make_hub("a"), make_hub("b")], TIMESTEP, max_workers=1).run()
+
+    assert set(logs["hub_id"]) == {"a", "b"}
+    per_hub = logs.groupby("hub_id", observed=True)["charged_energy_kwh"].sum()
+    assert per_hub["a"] == pytest.approx(per_hub["b"])
+    assert per_hub["a"] == pytest.approx(45.0)
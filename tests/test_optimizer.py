@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import START_DT_UTC, TIMESTEP
+from logic.optimizer import Optimizer
+
+
+def charging_cars(rows: list) -> pd.DataFrame:
+    """Active cars from (session_idx, hours until departure, remaining energy) tuples at START_DT_UTC."""
+    return pd.DataFrame({
+        "session_idx": [session_idx for session_idx, _, _ in rows],
+        "car_id": [f"CAR-{session_idx}" for session_idx, _, _ in rows],
+        "end_dt_utc": pd.to_datetime([START_DT_UTC + timedelta(hours=hours) for _, hours, _ in rows], utc=True),
+        "charging_speed_kw": 11.0,
+        "charged_energy_kwh": 0.0,
+        "target_energy_kwh": [remaining_kwh for _, _, remaining_kwh in rows],
+    })
+
+
+def test_unchanged_cars_only_shift_the_previous_schedule():
+    optimizer = Optimizer(max_gridpower_kw=20, timestep=TIMESTEP)
+    cars = charging_cars([(0, 4, 20.0), (1, 6, 30.0)])
+    optimizer.optimize_sessions(START_DT_UTC, cars)
+    first = optimizer.last_schedule
+
+    cars["charged_energy_kwh"] = first[:, 0]
+    optimizer.optimize_sessions(START_DT_UTC + TIMESTEP, cars)
+    assert optimizer.stats == {"solve": 1, "shift": 1}
+    np.testing.assert_allclose(optimizer.last_schedule[:, :first.shape[1] - 1], first[:, 1:], atol=1e-9)
+
+
+def test_repair_fills_a_new_car_within_the_limits():
+    # The repair only fills the capacity the kept cars leave, so leave room for the new one
+    optimizer = Optimizer(max_gridpower_kw=40, timestep=TIMESTEP)
+    optimizer.optimize_sessions(START_DT_UTC, charging_cars([(0, 4, 20.0), (1, 6, 30.0)]))
+
+    cars = charging_cars([(0, 4, 20.0), (1, 6, 30.0), (2, 3, 8.0)])
+    optimizer.optimize_sessions(START_DT_UTC, cars)
+    assert optimizer.stats["repair"] == 1
+    schedule = optimizer.last_schedule
+    np.testing.assert_allclose(schedule.sum(axis=1), [20.0, 30.0, 8.0])
+    assert (schedule <= 11.0 * TIMESTEP.total_seconds() / 3600 + 1e-9).all()
+    assert (schedule.sum(axis=0) <= 40 * TIMESTEP.total_seconds() / 3600 + 1e-9).all()
+    assert not schedule[2, 12:].any()
+
+
+@pytest.mark.parametrize("optimizer_kwargs, n_solves", [({"incremental": False}, 3),
+                                                        ({"max_repairs": 1}, 2),
+                                                        ({"max_repair_changes": 0}, 3)])
+def test_full_solves_when_a_repair_is_not_allowed(optimizer_kwargs, n_solves):
+    optimizer = Optimizer(max_gridpower_kw=20, timestep=TIMESTEP, **optimizer_kwargs)
+    for n_cars in (1, 2, 3):
+        optimizer.optimize_sessions(START_DT_UTC, charging_cars([(i, 4, 5.0) for i in range(n_cars)]))
+    assert optimizer.stats["solve"] == n_solves
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from conftest import START_DT_UTC, make_sessions
+from data.db_connector import SQLiteConnector
+from data.reader_cache import ReaderCache
+from data.session_reader import SessionReader
+
+END_DT_UTC = START_DT_UTC + timedelta(days=3)
+
+
+def test_dummy_reads_hit_and_restore_the_seeded_generator(monkeypatch, tmp_path):
+    monkeypatch.setenv("USE_DUMMY_DATA", "true")
+    reader_cache = ReaderCache(str(tmp_path))
+
+    first = SessionReader(None, rng=np.random.default_rng(7))
+    expected = reader_cache.read(first, start_dt_utc=START_DT_UTC, end_dt_utc=END_DT_UTC)
+    second = SessionReader(None, rng=np.random.default_rng(7))
+    cached = reader_cache.read(second, start_dt_utc=START_DT_UTC, end_dt_utc=END_DT_UTC)
+    assert (reader_cache.hits, reader_cache.misses) == (1, 1)
+    pd.testing.assert_frame_equal(cached, expected)
+    assert second.rng.random() == first.rng.random()
+
+    reader_cache.read(SessionReader(None, rng=np.random.default_rng(8)), start_dt_utc=START_DT_UTC, end_dt_utc=END_DT_UTC)
+    assert reader_cache.misses == 2
+
+
+def test_unseeded_and_open_ended_dummy_reads_are_not_cached(monkeypatch, tmp_path):
+    monkeypatch.setenv("USE_DUMMY_DATA", "true")
+    reader_cache = ReaderCache(str(tmp_path))
+
+    for _ in range(2):
+        reader_cache.read(SessionReader(None), start_dt_utc=START_DT_UTC, end_dt_utc=END_DT_UTC)
+        reader_cache.read(SessionReader(None, rng=np.random.default_rng(7)))
+    assert (reader_cache.hits, reader_cache.misses) == (0, 0)
+    assert reader_cache.size_bytes == 0
+
+
+def test_database_reads_are_keyed_on_url_table_and_time_range(monkeypatch, tmp_path):
+    monkeypatch.setenv("USE_DUMMY_DATA", "false")
+    path = str(tmp_path / "ev.sqlite")
+    SQLiteConnector(path).write_frame("sessions", make_sessions([("CAR-1", timedelta(hours=2), timedelta(hours=6), 40.0)]))
+    reader_cache = ReaderCache(str(tmp_path / "cache"))
+
+    expected = reader_cache.read(SessionReader(SQLiteConnector(path)), start_dt_utc=START_DT_UTC, end_dt_utc=END_DT_UTC)
+    cached = reader_cache.read(SessionReader(SQLiteConnector(path), rng=np.random.default_rng(1)),
+                               start_dt_utc=START_DT_UTC, end_dt_utc=END_DT_UTC)
+    assert (reader_cache.hits, reader_cache.misses) == (1, 1)
+    pd.testing.assert_frame_equal(cached, expected)
+
+    reader_cache.read(SessionReader(SQLiteConnector(path)), start_dt_utc=START_DT_UTC, end_dt_utc=END_DT_UTC + timedelta(days=1))
+    assert reader_cache.misses == 2
+
+    # Without an end the read covers whatever the table holds by then
+    reader_cache.read(SessionReader(SQLiteConnector(path)), start_dt_utc=START_DT_UTC)
+    assert (reader_cache.hits, reader_cache.misses) == (1, 2)
@@ -0,0 +1,26 @@
+import asyncio
+from time import sleep
+
+from conftest import TIMESTEP
+from logic.realtime_dispatcher import RealtimeDispatcher
+from test_dispatcher import make_dispatcher
+
+
+def test_slow_charge_does_not_count_against_the_latency_budget(dummy_inputs):
+    sessions = dummy_inputs[0]
+    dispatcher = make_dispatcher(dummy_inputs)
+    charge = dispatcher.charging_hub.charge
+
+    def slow_charge(*args, **kwargs):
+        sleep(1.1)
+        return charge(*args, **kwargs)
+
+    dispatcher.charging_hub.charge = slow_charge
+    realtime = RealtimeDispatcher(dispatcher, TIMESTEP, latency_budget_seconds=1.0, speedup=9000)
+    start_dt_utc = sessions["start_dt_utc"].min().ceil(TIMESTEP)
+    asyncio.run(realtime.run(start_dt_utc, start_dt_utc + TIMESTEP))
+
+    summary = realtime.latency_summary()
+    assert summary["tick_max_seconds"] > realtime.latency_budget_seconds
+    assert summary["max_seconds"] < realtime.latency_budget_seconds
+    assert summary["over_budget"] == 0
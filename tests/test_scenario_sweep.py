@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import TIMESTEP, make_sessions
+from logic.scenario_sweep import ScenarioSweep
+
+
+@pytest.fixture
+def sessions() -> pd.DataFrame:
+    return make_sessions([("CAR-1", timedelta(hours=8), timedelta(hours=14), 40.0),
+                          ("CAR-2", timedelta(hours=9), timedelta(hours=12), 30.0),
+                          ("CAR-3", timedelta(hours=10), timedelta(hours=18), 50.0)])
+
+
+def test_scenarios_are_reproducible_per_seed(sessions):
+    kpis = ScenarioSweep(sessions, TIMESTEP, max_gridpower_kw=10, max_workers=1, seed=7).run(3)
+    again = ScenarioSweep(sessions, TIMESTEP, max_gridpower_kw=10, max_workers=1, seed=7).run(2)
+
+    assert list(kpis.columns) == ["scenario", *ScenarioSweep.KPIS]
+    assert list(kpis["scenario"]) == [0, 1, 2]
+    pd.testing.assert_frame_equal(again, kpis.iloc[:2])
+    np.testing.assert_allclose(kpis["delivered_energy_kwh"] + kpis["unmet_energy_kwh"], 120.0)
+    assert (kpis["peak_grid_kw"] <= 10 + 1e-6).all()
+
+
+def test_sweep_stops_once_the_kpis_settle(sessions):
+    # Without grid limits every scenario delivers everything, so the intervals have no width
+    sweep = ScenarioSweep(sessions, TIMESTEP, max_gridpower_kw=1000, max_workers=1)
+    kpis = sweep.run(20, min_scenarios=3, rel_tolerance=0.5, stop_kpis=("delivered_energy_kwh",))
+
+    assert len(kpis) == 3
+    summary = ScenarioSweep.summarize(kpis)
+    assert summary.loc["delivered_energy_kwh", "ci_low"] == pytest.approx(120.0)
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from common import schemas
+from common.helper_functions import UTC_NS
+from conftest import START_DT_UTC, make_sessions
+from logic.session_store import SessionStore
+
+
+def raw_sessions() -> pd.DataFrame:
+    return pd.DataFrame({
+        "car_id": ["CAR-1", "CAR-2", "CAR-1"],
+        "session_id": ["1", "2", "3"],
+        "start_dt_utc": pd.date_range("2024-01-01", periods=3, freq="8h"),
+        "end_dt_utc": pd.date_range("2024-01-01 04:00", periods=3, freq="8h"),
+        "charging_speed_kw": [11, 11, 22],
+        "charged_energy_kwh": [0, 0, 0],
+        "target_energy_kwh": [40, 60, 20],
+    })
+
+
+def test_apply_schema_casts_ids_and_naive_datetimes():
+    sessions = schemas.apply_schema(raw_sessions(), schemas.session, "session")
+
+    assert sessions["car_id"].dtype == "category"
+    assert sessions["session_id"].dtype == np.int64
+    assert sessions["start_dt_utc"].dtype == UTC_NS
+    assert sessions["start_dt_utc"].iloc[0] == pd.Timestamp(START_DT_UTC)
+    assert sessions["charging_speed_kw"].dtype == np.float32
+
+
+@pytest.mark.parametrize("change, message", [
+    (lambda frame: frame.drop(columns="target_energy_kwh"), "missing the columns"),
+    (lambda frame: frame.assign(end_dt_utc=frame["start_dt_utc"] - timedelta(hours=1)), "end_dt_utc before"),
+    (lambda frame: frame.assign(target_energy_kwh=[40, None, 20]), "missing values"),
+])
+def test_apply_schema_rejects_bad_rows(change, message):
+    with pytest.raises(ValueError, match=message):
+        schemas.apply_schema(change(raw_sessions()), schemas.session, "session")
+
+
+def test_session_store_keeps_car_ids_as_codes():
+    sessions = make_sessions([("CAR-2", timedelta(0), timedelta(hours=4), 40.0),
+                              ("CAR-1", timedelta(0), timedelta(hours=4), 40.0),
+                              ("CAR-2", timedelta(hours=5), timedelta(hours=9), 40.0)])
+    store = SessionStore(sessions)
+
+    assert store.car_code.dtype == np.int32
+    assert list(store.car_id_of(np.array([2, 1]))) == ["CAR-2", "CAR-1"]
+    assert list(store.slots_of([3, 1])) == [2, 0]
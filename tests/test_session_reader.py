@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from conftest import START_DT_UTC, make_sessions
+from data.db_connector import SQLiteConnector
+from data.session_reader import SessionReader
+
+
+def test_iter_windows_reads_the_database_without_dummy_data(monkeypatch, tmp_path):
+    monkeypatch.setenv("USE_DUMMY_DATA", "false")
+    sessions = make_sessions([("CAR-1", timedelta(hours=2), timedelta(hours=6), 40.0),
+                              ("CAR-2", timedelta(days=2, hours=3), timedelta(days=2, hours=9), 60.0)])
+    connector = SQLiteConnector(str(tmp_path / "ev.sqlite"))
+    connector.write_frame("sessions", sessions)
+
+    windows = list(SessionReader(connector).iter_windows(START_DT_UTC, START_DT_UTC + timedelta(days=3),
+                                                         timedelta(days=1)))
+    assert [len(window) for window in windows] == [1, 0, 1]
+    assert list(pd.concat(windows)["car_id"].astype(str)) == ["CAR-1", "CAR-2"]
+
+
+def test_iter_windows_yields_empty_dummy_windows(monkeypatch):
+    monkeypatch.setenv("USE_DUMMY_DATA", "true")
+    reader = SessionReader(None, number_of_sessions=1, number_of_unique_cars=1, rng=np.random.default_rng(0))
+    end_dt_utc = START_DT_UTC + timedelta(days=6, hours=12)
+
+    windows = list(reader.iter_windows(START_DT_UTC, end_dt_utc, timedelta(days=2)))
+    assert len(windows) == 4
+    assert sum(len(window) for window in windows) <= 1
+    assert all(list(window.columns) == list(windows[0].columns) for window in windows)
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from conftest import START_DT_UTC, make_sessions
+from logic.session_store import SessionStore
+
+
+def make_store() -> SessionStore:
+    return SessionStore(make_sessions([("CAR-1", timedelta(hours=2), timedelta(hours=6), 20.0),
+                                       ("CAR-2", timedelta(hours=1), timedelta(hours=4), 10.0),
+                                       ("CAR-1", timedelta(hours=7), timedelta(hours=9), 5.0)]))
+
+
+def test_advance_follows_session_starts_and_ends():
+    store = make_store()
+    active = []
+    for hours in (0, 1, 2, 4, 7, 9):
+        store.advance(START_DT_UTC + timedelta(hours=hours))
+        active.append(sorted(store.active_slots().tolist()))
+    assert active == [[], [1], [0, 1], [0], [2], []]
+
+
+def test_reaching_the_target_leaves_the_active_set():
+    store = make_store()
+    store.advance(START_DT_UTC + timedelta(hours=2))
+    store.add_energy(np.array([1]), np.array([10.0]))
+
+    assert store.active_slots().tolist() == [0]
+    assert store.n_completed == 1
+    # A session that reached its target does not re-enter when the clock moves back
+    store.advance(START_DT_UTC + timedelta(hours=1))
+    assert store.n_active == 0
+
+
+def test_restore_continues_from_a_snapshot():
+    store = make_store()
+    store.advance(START_DT_UTC + timedelta(hours=2))
+    store.add_energy(np.array([0]), np.array([3.0]))
+    snapshot = store.snapshot()
+    store.add_energy(np.array([0, 1]), np.array([5.0, 10.0]))
+
+    store.restore(snapshot)
+    assert store.charged_energy_kwh.tolist() == [3.0, 0.0, 0.0]
+    assert sorted(store.active_slots().tolist()) == [0, 1]
+    store.advance(START_DT_UTC + timedelta(hours=4))
+    assert store.active_slots().tolist() == [0]
+
+
+def test_slots_of_rejects_unknown_sessions():
+    with pytest.raises(ValueError, match="unknown session ids"):
+        make_store().slots_of([1, 42])
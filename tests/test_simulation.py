@@ -0,0 +1,32 @@
+from benchmarks.dispatcher_benchmark import UncontrolledOptimizer
+from logic.allocation_policies import get_policy
+from logic.optimizer import Optimizer
+from logic.simulation import build_dispatcher, session_period
+
+from conftest import TIMESTEP
+
+
+def test_build_dispatcher_shares_one_session_store(dummy_inputs):
+    sessions, energy_forecast, meter_values = dummy_inputs
+    dispatcher = build_dispatcher(sessions, meter_values, energy_forecast, TIMESTEP, max_gridpower_kw=50)
+
+    assert dispatcher.trigger_checker.session_store is dispatcher.charging_hub.session_store
+    assert isinstance(dispatcher.optimizer, Optimizer)
+    assert dispatcher.optimizer.max_gridpower_kw == dispatcher.charging_hub.max_gridpower_kw == 50
+
+
+def test_build_dispatcher_takes_another_optimizer_and_policy(dummy_inputs):
+    sessions, energy_forecast, meter_values = dummy_inputs
+    optimizer, policy = UncontrolledOptimizer(), get_policy("edf")
+    dispatcher = build_dispatcher(sessions, meter_values, optimizer=optimizer, allocation_policy=policy)
+
+    assert dispatcher.optimizer is optimizer
+    assert dispatcher.charging_hub.allocation_policy is policy
+
+
+def test_session_period_is_on_the_timestep_grid(dummy_inputs):
+    sessions = dummy_inputs[0]
+    start_dt_utc, end_dt_utc = session_period(sessions, TIMESTEP)
+
+    assert start_dt_utc <= sessions["start_dt_utc"].min() < start_dt_utc + TIMESTEP
+    assert end_dt_utc <= sessions["end_dt_utc"].max() < end_dt_utc + TIMESTEP
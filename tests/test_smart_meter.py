@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import START_DT_UTC, TIMESTEP, make_meter_values
+from logic.smart_meter import SmartMeter
+
+
+def numbered_meter_values(drop: list = ()) -> pd.DataFrame:
+    meter_values = make_meter_values(days=1)
+    meter_values["energy_kwh"] = np.arange(len(meter_values), dtype=np.float64)
+    return meter_values.drop(index=list(drop)).reset_index(drop=True)
+
+
+def test_regular_and_gappy_feeds_return_the_same_values():
+    regular = SmartMeter(numbered_meter_values())
+    gappy = SmartMeter(numbered_meter_values(drop=[10]))
+    assert regular.is_regular and not gappy.is_regular
+
+    start_dt_utc = START_DT_UTC + 4 * TIMESTEP
+    np.testing.assert_array_equal(regular.get_range(start_dt_utc, start_dt_utc + 4 * TIMESTEP), [4, 5, 6, 7])
+    np.testing.assert_array_equal(gappy.get_range(start_dt_utc, start_dt_utc + 4 * TIMESTEP), [4, 5, 6, 7])
+    np.testing.assert_array_equal(gappy.get_range(start_dt_utc + 5 * TIMESTEP, start_dt_utc + 8 * TIMESTEP), [9, 11])
+
+
+def test_only_rows_fully_inside_the_window_count():
+    smart_meter = SmartMeter(numbered_meter_values())
+    start_dt_utc = START_DT_UTC + timedelta(minutes=5)
+    np.testing.assert_array_equal(smart_meter.get_range(start_dt_utc, start_dt_utc + 2 * TIMESTEP), [1])
+
+
+def test_get_tick_energy_sums_the_rows_per_tick():
+    smart_meter = SmartMeter(numbered_meter_values())
+    np.testing.assert_array_equal(smart_meter.get_tick_energy(START_DT_UTC, 3, 2 * TIMESTEP), [1, 5, 9])
+    # Ticks off the meter grid take the per-tick fallback
+    np.testing.assert_array_equal(smart_meter.get_tick_energy(START_DT_UTC + timedelta(minutes=5), 2, 2 * TIMESTEP),
+                                  [1, 3])
+
+
+def test_windows_outside_the_feed_raise():
+    smart_meter = SmartMeter(numbered_meter_values())
+    with pytest.raises(ValueError, match="before the earliest meter value"):
+        smart_meter.get_range(START_DT_UTC - timedelta(days=1), START_DT_UTC - timedelta(hours=1))
+    with pytest.raises(ValueError, match="after the latest meter value"):
+        smart_meter.get_range(START_DT_UTC + timedelta(days=2), START_DT_UTC + timedelta(days=3))
@@ -0,0 +1,65 @@
+from datetime import timedelta
+
+import pandas as pd
+
+from conftest import START_DT_UTC, TIMESTEP, make_sessions
+from logic.session_store import SessionStore
+from logic.trigger_checker import TriggerChecker, TriggerReason
+
+
+def _result_and_signals():
+    result = pd.DataFrame({"session_idx": [0], "car_id": ["CAR-1"], "energy_request_kwh": [1.0], "charged_energy_kwh": [1.0]})
+    signals = pd.DataFrame({"car_id": ["CAR-1"], "start_dt_utc": [START_DT_UTC],
+                            "end_dt_utc": [START_DT_UTC + timedelta(days=1)], "energy_kwh": [1.0]})
+    return result, signals
+
+
+def test_session_start_between_ticks_fires_on_the_next_tick():
+    sessions = make_sessions([("CAR-1", timedelta(0), timedelta(hours=8), 80.0),
+                              ("CAR-2", timedelta(minutes=22), timedelta(hours=8), 80.0)])
+    trigger_checker = TriggerChecker(SessionStore(sessions))
+    result, signals = _result_and_signals()
+
+    assert trigger_checker.is_triggered(START_DT_UTC, pd.DataFrame(), pd.DataFrame()) == TriggerReason.NO_RESULT
+    assert trigger_checker.is_triggered(START_DT_UTC + TIMESTEP, result, signals) is None
+    assert trigger_checker.is_triggered(START_DT_UTC + 2 * TIMESTEP, result, signals) == TriggerReason.SESSION_START
+    assert trigger_checker.is_triggered(START_DT_UTC + 3 * TIMESTEP, result, signals) is None
+
+
+def test_session_end_between_ticks_fires_on_the_next_tick():
+    sessions = make_sessions([("CAR-1", timedelta(0), timedelta(hours=8), 80.0),
+                              ("CAR-2", timedelta(0), timedelta(hours=1, minutes=5), 80.0)])
+    trigger_checker = TriggerChecker(SessionStore(sessions))
+    result, signals = _result_and_signals()
+
+    trigger_checker.is_triggered(START_DT_UTC, pd.DataFrame(), pd.DataFrame())
+    reasons = [trigger_checker.is_triggered(START_DT_UTC + tick * TIMESTEP, result, signals) for tick in range(1, 7)]
+    assert reasons == [None, None, None, None, TriggerReason.SESSION_END, None]
+
+
+def test_restore_does_not_fire_for_boundaries_before_the_snapshot():
+    sessions = make_sessions([("CAR-1", timedelta(0), timedelta(hours=8), 80.0),
+                              ("CAR-2", timedelta(minutes=22), timedelta(hours=8), 80.0)])
+    trigger_checker = TriggerChecker(SessionStore(sessions))
+    result, signals = _result_and_signals()
+    for tick in range(4):
+        trigger_checker.is_triggered(START_DT_UTC + tick * TIMESTEP, result, signals)
+
+    restored = TriggerChecker(SessionStore(sessions))
+    restored.restore(trigger_checker.snapshot())
+    assert restored.is_triggered(START_DT_UTC + 4 * TIMESTEP, result, signals) is None
+
+
+def test_zero_charge_fires_only_when_a_request_gets_no_energy():
+    sessions = make_sessions([("CAR-1", timedelta(0), timedelta(hours=8), 80.0),
+                              ("CAR-2", timedelta(0), timedelta(hours=8), 80.0)])
+    trigger_checker = TriggerChecker(SessionStore(sessions))
+    _, signals = _result_and_signals()
+    planned_zero = pd.DataFrame({"session_idx": [0, 1], "car_id": ["CAR-1", "CAR-2"],
+                                 "energy_request_kwh": [1.0, 0.0], "charged_energy_kwh": [1.0, 0.0]})
+    starved = planned_zero.assign(energy_request_kwh=[1.0, 1.0])
+
+    trigger_checker.is_triggered(START_DT_UTC, pd.DataFrame(), pd.DataFrame())
+    assert trigger_checker.is_triggered(START_DT_UTC + TIMESTEP, planned_zero, signals) is None
+    assert not trigger_checker.fires_every_tick(planned_zero, signals)
+    assert trigger_checker.is_triggered(START_DT_UTC + 2 * TIMESTEP, starved, signals) == TriggerReason.ZERO_CHARGE